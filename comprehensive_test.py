@@ -1,33 +1,32 @@
-import requests
-import json
+import os
+import sys
 import time
 from datetime import datetime
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "server"))
+from debug_client import DebugClient, DebugClientError
+
 def comprehensive_test():
     """Comprehensive test of the VS Code Debug MCP setup"""
     
     server_url = "http://localhost:8001"
-    debug_endpoint = f"{server_url}/debug-data"
-    health_endpoint = f"{server_url}/health"
+    # wait=True: flush() returns once the server has applied the events
+    client = DebugClient(server_url, max_retries=2, wait=True)
     
     print("🧪 VS Code Debug MCP Setup - Comprehensive Test")
     print("=" * 50)
     
     # Test 1: Server Health
     try:
-        response = requests.get(health_endpoint)
-        if response.status_code == 200:
-            print("✅ Server is healthy and running")
-        else:
-            print(f"❌ Server health check failed: {response.status_code}")
-            return False
-    except Exception as e:
+        client.health()
+        print("✅ Server is healthy and running")
+    except DebugClientError as e:
         print(f"❌ Cannot reach server: {e}")
+        client.close()
         return False
     
     # Test 2: Current state
-    response = requests.get(debug_endpoint)
-    current_data = response.json()
+    current_data = client.query()
     print(f"📊 Current debug data state:")
     print(f"   Variables: {len(current_data.get('variables', {})) if current_data.get('variables') else 0} items")
     print(f"   Stack frames: {len(current_data.get('stack', [])) if current_data.get('stack') else 0} items")
@@ -47,7 +46,7 @@ def comprehensive_test():
             "timestamp": datetime.now().isoformat()
         }
     }
-    requests.post(debug_endpoint, json=session_start)
+    client.send(session_start)
     print("   ✅ Session started")
     
     # Variables captured
@@ -61,7 +60,7 @@ def comprehensive_test():
             "test_dict": {"name": "test", "value": 42}
         }
     }
-    requests.post(debug_endpoint, json=variables)
+    client.send(variables)
     print("   ✅ Variables captured")
     
     # Console output
@@ -85,7 +84,7 @@ def comprehensive_test():
                 "sessionId": session_id
             }
         }
-        requests.post(debug_endpoint, json=console_data)
+        client.send(console_data)
     print("   ✅ Console output captured")
     
     # Stack trace
@@ -95,7 +94,7 @@ def comprehensive_test():
             {"id": 2, "name": "calculate_sum", "line": 7, "source": "test_debug.py"}
         ]
     }
-    requests.post(debug_endpoint, json=stack)
+    client.send(stack)
     print("   ✅ Stack trace captured")
     
     # Breakpoints
@@ -110,7 +109,7 @@ def comprehensive_test():
             }
         ]
     }
-    requests.post(debug_endpoint, json=breakpoints)
+    client.send(breakpoints)
     print("   ✅ Breakpoints captured")
     
     # Session end
@@ -121,13 +120,14 @@ def comprehensive_test():
             "timestamp": datetime.now().isoformat()
         }
     }
-    requests.post(debug_endpoint, json=session_end)
+    client.send(session_end)
     print("   ✅ Session terminated")
     
     # Test 4: Verify final state
     print("\n📈 Final verification...")
-    response = requests.get(debug_endpoint)
-    final_data = response.json()
+    client.flush()
+    final_data = client.query()
+    client.close()
     
     success_checks = []
     
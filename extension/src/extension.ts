@@ -1,5 +1,6 @@
 import fetch from 'node-fetch';
 import * as vscode from 'vscode';
+import * as zlib from 'zlib';
 
 // Helper function to get server URL from configuration
 function getServerUrl(): string {
@@ -13,6 +14,21 @@ function isForwardingEnabled(): boolean {
     return config.get('enabled', true);
 }
 
+// Payloads at least this large are gzipped when posted to the ingest routes
+const COMPRESS_MIN_BYTES = 1024;
+
+// Helper function to build a JSON request body, gzipped when it is large and
+// the URL is one of the server's ingest routes (which accept Content-Encoding)
+function jsonRequest(url: string, data: any) {
+    const json = JSON.stringify(data);
+    const headers: { [name: string]: string } = { 'Content-Type': 'application/json' };
+    if (json.length >= COMPRESS_MIN_BYTES && /\/debug-data(\/batch)?\/?$/i.test(url)) {
+        headers['Content-Encoding'] = 'gzip';
+        return { body: zlib.gzipSync(json), headers };
+    }
+    return { body: json, headers };
+}
+
 // Helper function to send data to MCP server
 async function sendToMCPServer(data: any) {
     if (!isForwardingEnabled()) {
@@ -23,8 +39,7 @@ async function sendToMCPServer(data: any) {
         const serverUrl = getServerUrl();
         const response = await fetch(serverUrl, {
             method: 'POST',
-            body: JSON.stringify(data),
-            headers: { 'Content-Type': 'application/json' },
+            ...jsonRequest(serverUrl, data),
         });
 
         if (!response.ok) {
@@ -48,8 +63,7 @@ async function sendToMCPServer(data: any) {
                 console.warn(`Attempting fallback POST to ${fallback}`);
                 const fbResp = await fetch(fallback, {
                     method: 'POST',
-                    body: JSON.stringify(data),
-                    headers: { 'Content-Type': 'application/json' },
+                    ...jsonRequest(fallback, data),
                 });
                 if (fbResp.ok) {
                     console.log(
@@ -74,6 +88,136 @@ async function sendToMCPServer(data: any) {
     }
 }
 
+// Every envelope (session start/end, variables, stack, breakpoints and custom
+// debug events, mostly `output` lines) is queued, coalesced and POSTed to the
+// batch endpoint so a chatty debuggee doesn't cost one request per line.
+// Batches are sent one at a time, in order, on a single promise chain, so the
+// server never sees a session's events out of order or after its end.
+const BATCH_FLUSH_MS = 50;
+const BATCH_MAX_EVENTS = 200;
+let _pendingEvents: any[] = [];
+let _flushTimer: NodeJS.Timeout | null = null;
+let _flushChain: Promise<void> = Promise.resolve();
+
+function getBatchUrl(): string {
+    return getServerUrl().replace(/\/debug-data\/?$/i, '/debug-data/batch');
+}
+
+function queueForMCPServer(data: any) {
+    if (!isForwardingEnabled()) {
+        return;
+    }
+
+    _pendingEvents.push(data);
+    if (_pendingEvents.length >= BATCH_MAX_EVENTS) {
+        flushQueuedEvents();
+    } else if (!_flushTimer) {
+        _flushTimer = setTimeout(flushQueuedEvents, BATCH_FLUSH_MS);
+    }
+}
+
+// Sends what is queued after every batch already being sent; the returned
+// promise settles once all of it has been delivered (or has failed)
+function flushQueuedEvents(): Promise<void> {
+    if (_flushTimer) {
+        clearTimeout(_flushTimer);
+        _flushTimer = null;
+    }
+    if (_pendingEvents.length > 0) {
+        const batch = _pendingEvents;
+        _pendingEvents = [];
+        _flushChain = _flushChain.then(() => sendBatch(batch));
+    }
+    return _flushChain;
+}
+
+// A batch is sent up to this many times while the server can't be reached
+// or answers 429 (queue full; the batch was not queued), waiting
+// BATCH_RETRY_MS, doubled on each attempt, or the server's Retry-After
+const BATCH_MAX_ATTEMPTS = 4;
+const BATCH_RETRY_MS = 500;
+// Connection errors raised before the request was sent: resending can't
+// store a batch twice
+const NOT_SENT_ERRORS = new Set(['ECONNREFUSED', 'ENOTFOUND', 'EAI_AGAIN', 'EHOSTUNREACH', 'ENETUNREACH']);
+
+function sleep(ms: number): Promise<void> {
+    return new Promise((resolve) => setTimeout(resolve, ms));
+}
+
+async function sendBatch(batch: any[]) {
+    const batchUrl = getBatchUrl();
+    if (batchUrl === getServerUrl()) {
+        // Not pointed at /debug-data (e.g. an /sse URL): keep the per-event
+        // path so the existing fallback logic still applies.
+        for (const data of batch) {
+            await sendToMCPServer(data);
+        }
+        return;
+    }
+
+    let delay = BATCH_RETRY_MS;
+    for (let attempt = 1; ; attempt++) {
+        let retryAfter: number | null = null;
+        try {
+            const response = await fetch(batchUrl, {
+                method: 'POST',
+                ...jsonRequest(batchUrl, batch),
+            });
+
+            if (response.status === 429) {
+                const seconds = Number(response.headers.get('retry-after'));
+                retryAfter = seconds > 0 ? seconds * 1000 : delay;
+                throw new Error('HTTP 429: ingest queue is full');
+            }
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+            }
+
+            logBatchResults(batch.length, await response.json().catch(() => null));
+            return;
+        } catch (error: any) {
+            if (retryAfter === null && NOT_SENT_ERRORS.has(error?.code)) {
+                retryAfter = delay;
+            }
+            if (retryAfter !== null && attempt < BATCH_MAX_ATTEMPTS) {
+                console.warn(`Debug event batch not delivered (${error?.message || error}); retrying in ${retryAfter} ms`);
+                await sleep(retryAfter);
+                delay *= 2;
+                continue;
+            }
+            console.error(`Failed to send debug event batch of ${batch.length} events to MCP server:`, error);
+            vscode.window.showWarningMessage(
+                `Failed to send debug data: ${error?.message || error}`
+            );
+            return;
+        }
+    }
+}
+
+// Logs the items of a batch response that the server did not store:
+// malformed (`error`), over the rate limit (`dropped`) or for no session
+// (`ignored`)
+function logBatchResults(sent: number, body: any) {
+    const counts: { [status: string]: number } = {};
+    for (const result of Array.isArray(body?.results) ? body.results : []) {
+        if (result?.status !== 'ok' && result?.status !== 'accepted') {
+            counts[result?.status] = (counts[result?.status] || 0) + 1;
+        }
+    }
+    const statuses = Object.keys(counts);
+    if (statuses.length === 0) {
+        console.log(`Debug event batch sent successfully: ${sent} events`);
+        return;
+    }
+    const notStored = statuses.reduce((total, status) => total + counts[status], 0);
+    const detail = statuses.map((status) => `${counts[status]} ${status}`).join(', ');
+    console.warn(`Debug event batch sent: ${notStored} of ${sent} events not stored (${detail})`);
+    if (counts.error) {
+        const first = body.results.find((result: any) => result?.status === 'error');
+        console.warn('First rejected debug event:', first?.error);
+    }
+}
+
 // TODO: understand this better
 // Minimal MCP streaming client helper. If the configured server URL points to
 // an SSE/streamable endpoint (for example ends with /sse or contains /sse),
@@ -206,7 +350,7 @@ export function activate(context: vscode.ExtensionContext) {
             console.info('Debug session started:', session.name);
 
             // Send initial session info
-            sendToMCPServer({
+            queueForMCPServer({
                 sessionStarted: {
                     name: session.name,
                     type: session.type,
@@ -218,7 +362,11 @@ export function activate(context: vscode.ExtensionContext) {
             // Get initial variables
             try {
                 const variables = await session.customRequest('variables');
-                sendToMCPServer({ variables });
+                queueForMCPServer({
+                    variables,
+                    sessionId: session.id,
+                    timestamp: new Date().toISOString(),
+                });
             } catch (error: any) {
                 console.error('Failed to get variables:', error);
             }
@@ -230,7 +378,7 @@ export function activate(context: vscode.ExtensionContext) {
         (event: vscode.DebugSessionCustomEvent) => {
             console.info('%cDebug session custom event received:', 'color: blue;background:white;font-weight:bold;font-size:14px', event);
             // Capture various debug events
-            sendToMCPServer({
+            queueForMCPServer({
                 debugEvent: {
                     event: event.event,
                     body: event.body,
@@ -245,13 +393,15 @@ export function activate(context: vscode.ExtensionContext) {
     // Monitor debug session termination
     vscode.debug.onDidTerminateDebugSession((session: vscode.DebugSession) => {
         console.log('Debug session terminated:', session.name);
-        sendToMCPServer({
+        // Queued behind the session's buffered events, and sent right away
+        queueForMCPServer({
             sessionTerminated: {
                 name: session.name,
                 id: session.id,
                 timestamp: new Date().toISOString(),
             },
         });
+        return flushQueuedEvents();
     });
 
     // Also listen for stack trace and breakpoint changes
@@ -261,11 +411,13 @@ export function activate(context: vscode.ExtensionContext) {
         ) => {
             if (stackItem && vscode.debug.activeDebugSession) {
                 try {
-                    const stack =
-                        await vscode.debug.activeDebugSession.customRequest(
-                            'stackTrace'
-                        );
-                    sendToMCPServer({ stack });
+                    const session = vscode.debug.activeDebugSession;
+                    const stack = await session.customRequest('stackTrace');
+                    queueForMCPServer({
+                        stack,
+                        sessionId: session.id,
+                        timestamp: new Date().toISOString(),
+                    });
                 } catch (error: any) {
                     console.error('Failed to get stack trace:', error);
                 }
@@ -285,11 +437,16 @@ export function activate(context: vscode.ExtensionContext) {
                 })
             );
 
-            sendToMCPServer({ breakpoints });
+            queueForMCPServer({
+                breakpoints,
+                sessionId: vscode.debug.activeDebugSession?.id,
+                timestamp: new Date().toISOString(),
+            });
         }
     );
 }
 
 export function deactivate() {
     console.log('VS Code Debug MCP Extension deactivated');
+    return flushQueuedEvents();
 }
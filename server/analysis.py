@@ -0,0 +1,266 @@
+# Off-loop analysis
+# Comparing sessions or variable snapshots walks whole scopes and stacks,
+# which would stall ingest if it ran on the event loop. Tools capture the
+# snapshots they need (shared, never mutated objects, so this is cheap), then
+# run the comparison in a worker pool with a deadline. Results are cached by
+# the versions of the sessions involved, so repeated questions about
+# unchanged sessions are answered without recomputing.
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from frames import FRAMES_KEY
+from variable_changes import leaves, render_path
+
+# "thread" shares the snapshots with the workers; "process" copies them to
+# worker processes but keeps the analysis off the GIL ingest needs, which
+# pays off on multi-core hosts with large sessions
+ANALYSIS_POOL = os.environ.get("MCP_DEBUG_ANALYSIS_POOL", "thread")
+ANALYSIS_WORKERS = int(os.environ.get("MCP_DEBUG_ANALYSIS_WORKERS", 2))
+# Seconds an analysis may run before it is abandoned
+ANALYSIS_TIMEOUT = float(os.environ.get("MCP_DEBUG_ANALYSIS_TIMEOUT", 30))
+# Results kept for repeated requests against unchanged sessions
+ANALYSIS_CACHE_SIZE = 64
+# Work items between deadline checks
+_CHECK_EVERY = 1024
+
+
+class AnalysisTimeout(TimeoutError):
+    """The analysis did not finish before its deadline."""
+
+
+class _Deadline:
+    def __init__(self, deadline):
+        self.deadline = deadline
+        self.count = 0
+
+    def tick(self):
+        self.count += 1
+        if self.count % _CHECK_EVERY == 0 and time.time() > self.deadline:
+            raise AnalysisTimeout("Analysis took longer than its time limit")
+
+
+# -- analyses (run in the pool; arguments and results are plain data) -------
+
+def _diff_variables(a, b, limit, deadline):
+    a_leaves = {}
+    for path, value in leaves(a):
+        deadline.tick()
+        a_leaves[path] = value
+    differences = []
+    counts = {"changed": 0, "added": 0, "removed": 0}
+    for path, value in leaves(b):
+        deadline.tick()
+        if path in a_leaves:
+            old = a_leaves.pop(path)
+            if old == value and type(old) is type(value):
+                continue
+            status, difference = "changed", {"a": old, "b": value}
+        else:
+            status, difference = "added", {"b": value}
+        counts[status] += 1
+        if len(differences) < limit:
+            differences.append({"path": render_path(path), "status": status, **difference})
+    for path, value in a_leaves.items():
+        deadline.tick()
+        counts["removed"] += 1
+        if len(differences) < limit:
+            differences.append({"path": render_path(path), "status": "removed", "a": value})
+    return {"differences": differences, **counts, "truncated": sum(counts.values()) > len(differences)}
+
+
+def _frames(stack):
+    frames = stack.get(FRAMES_KEY) if isinstance(stack, dict) else stack
+    return [frame for frame in frames if isinstance(frame, dict)] if isinstance(frames, list) else []
+
+
+def _frame_label(frame):
+    source = frame.get("source")
+    path = (source.get("path") or source.get("name")) if isinstance(source, dict) else None
+    return f"{frame.get('name')} ({path}:{frame.get('line')})" if path else f"{frame.get('name')} (line {frame.get('line')})"
+
+
+def _diff_stacks(a, b, limit, deadline):
+    # Compare outermost first: runs usually share their outer frames
+    a_frames = [_frame_label(frame) for frame in reversed(_frames(a))]
+    b_frames = [_frame_label(frame) for frame in reversed(_frames(b))]
+    common = 0
+    for a_frame, b_frame in zip(a_frames, b_frames):
+        deadline.tick()
+        if a_frame != b_frame:
+            break
+        common += 1
+    return {
+        "depthA": len(a_frames),
+        "depthB": len(b_frames),
+        "commonOuterFrames": common,
+        # Innermost first, as in a stack trace
+        "onlyA": a_frames[common:][::-1][:limit],
+        "onlyB": b_frames[common:][::-1][:limit]
+    }
+
+
+def _breakpoint_key(breakpoint):
+    # Ids are assigned per run; compare everything else
+    if isinstance(breakpoint, dict):
+        breakpoint = {key: value for key, value in breakpoint.items() if key != "id"}
+    return json.dumps(breakpoint, sort_keys=True, default=str)
+
+
+def _diff_breakpoints(a, b, limit):
+    a_keys = {_breakpoint_key(item): item for item in a or []}
+    b_keys = {_breakpoint_key(item): item for item in b or []}
+    return {
+        "onlyA": [item for key, item in a_keys.items() if key not in b_keys][:limit],
+        "onlyB": [item for key, item in b_keys.items() if key not in a_keys][:limit]
+    }
+
+
+_SUMMARY_METRICS = {
+    "stops": lambda summary: summary["stops"],
+    "exceptions": lambda summary: summary["exceptions"]["count"],
+    "outputBytes": lambda summary: summary["output"]["bytes"],
+    "outputLines": lambda summary: summary["output"]["lines"],
+    "durationSeconds": lambda summary: summary["durationSeconds"],
+    "exitCode": lambda summary: summary["exitCode"]
+}
+
+
+def _diff_summaries(a, b):
+    metrics = {name: {"a": metric(a), "b": metric(b)} for name, metric in _SUMMARY_METRICS.items()}
+    reasons = sorted(set(a["stopReasons"]) | set(b["stopReasons"]))
+    metrics["stopReasons"] = {
+        reason: {"a": a["stopReasons"].get(reason, 0), "b": b["stopReasons"].get(reason, 0)} for reason in reasons
+    }
+    return metrics
+
+
+def compare_snapshots(a, b, limit, deadline):
+    """Differences between two session snapshots (see `capture`)."""
+    deadline = _Deadline(deadline)
+    return {
+        "a": {"sessionId": a["sessionId"], "atSeq": a["atSeq"]},
+        "b": {"sessionId": b["sessionId"], "atSeq": b["atSeq"]},
+        "summary": _diff_summaries(a["summary"], b["summary"]),
+        "variables": _diff_variables(a["variables"], b["variables"], limit, deadline),
+        "stack": _diff_stacks(a["stack"], b["stack"], limit, deadline),
+        "breakpoints": _diff_breakpoints(a["breakpoints"], b["breakpoints"], limit)
+    }
+
+
+def diff_variables(a, b, limit, deadline):
+    """Leaf-level differences between two variables snapshots."""
+    return _diff_variables(a, b, limit, _Deadline(deadline))
+
+
+# -- pool -------------------------------------------------------------------
+
+def capture(store, session_id, at_seq=None):
+    """What the analyses need of a session, read on the caller's thread.
+    Variables snapshots are shared, not copied: they are never mutated."""
+    summary = store.get_session_summary(session_id)
+    session_id = summary["id"]
+    return {
+        "sessionId": session_id,
+        "atSeq": at_seq,
+        "version": summary["version"],
+        "summary": summary,
+        "variables": store.get_variables(session_id, at_seq=at_seq),
+        "stack": store.get_stack(session_id),
+        "breakpoints": store.get_breakpoints(session_id)
+    }
+
+
+class AnalysisPool:
+    """Runs analyses in worker threads or processes, with a time limit per
+    analysis and a cache of results.
+
+    Identical requests already running share one computation. A request
+    whose caller gives up (timeout or cancellation) is dropped if it hasn't
+    started; a started one stops at its deadline.
+    """
+
+    def __init__(self, kind=ANALYSIS_POOL, workers=ANALYSIS_WORKERS, timeout=ANALYSIS_TIMEOUT,
+                 cache_size=ANALYSIS_CACHE_SIZE):
+        if kind not in ("process", "thread"):
+            raise ValueError(f"Unknown MCP_DEBUG_ANALYSIS_POOL: {kind}")
+        self.kind = kind
+        self.workers = max(workers, 1)
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self._executor = None
+        self._cache = OrderedDict()
+        self._running = {}          # key -> [asyncio future, waiters, concurrent future]
+        self.counters = {"completed": 0, "cacheHits": 0, "timeouts": 0, "cancelled": 0, "failed": 0}
+
+    def _pool(self):
+        if self._executor is None:
+            if self.kind == "process":
+                # Spawned workers don't inherit the server's threads and sockets
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            else:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="analysis")
+        return self._executor
+
+    async def run(self, key, function, *args, timeout=None):
+        """`function(*args, deadline)` in the pool; cached under `key`, which
+        must identify the inputs (include the versions of the sessions)."""
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            self.counters["cacheHits"] += 1
+            return self._cache[key]
+        timeout = self.timeout if timeout is None else timeout
+        entry = self._running.get(key)
+        if entry is None:
+            try:
+                future = self._pool().submit(function, *args, time.time() + timeout)
+            except BrokenProcessPool:
+                # A worker died; start a fresh pool
+                self._executor = None
+                future = self._pool().submit(function, *args, time.time() + timeout)
+            entry = self._running[key] = [asyncio.wrap_future(future), 0, future]
+            entry[0].add_done_callback(lambda done: self._finished(key, done))
+        entry[1] += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(entry[0]), timeout)
+        except (asyncio.TimeoutError, AnalysisTimeout):
+            self.counters["timeouts"] += 1
+            raise AnalysisTimeout(f"Analysis took longer than {timeout:g}s")
+        except asyncio.CancelledError:
+            self.counters["cancelled"] += 1
+            raise
+        finally:
+            entry[1] -= 1
+            if not entry[1] and not entry[0].done():
+                # Nobody waits for it any more; drop it unless already running
+                entry[2].cancel()
+
+    def _finished(self, key, done):
+        self._running.pop(key, None)
+        if done.cancelled():
+            return
+        if done.exception() is not None:
+            if not isinstance(done.exception(), AnalysisTimeout):
+                self.counters["failed"] += 1
+            return
+        self.counters["completed"] += 1
+        self._cache[key] = done.result()
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def stats(self):
+        return {"pool": self.kind, "workers": self.workers, "running": len(self._running),
+                "cached": len(self._cache), **self.counters}
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+analysis_pool = AnalysisPool()
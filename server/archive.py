@@ -0,0 +1,519 @@
+#!/usr/bin/env python3
+"""
+Session archives: export, lazy import and replay.
+
+An archive holds one or more sessions in a compact binary file:
+
+    magic | event records ... | per-session record offsets ... | footer JSON | trailer
+
+Each event record is a fixed header (payload length, seq, epoch time, type
+code, flags, DAP event name code) followed by its JSON payload, zlib
+compressed when that pays off. The footer lists the sessions with the
+position of their offset tables; the trailer points at the footer.
+
+Importing memory-maps the file and only reads record headers: payloads are
+decoded when an event is read, so large historical sessions cost a few
+dozen bytes per event in memory.
+
+    python archive.py export --url http://localhost:8001 --session run-1 -o run-1.mcparchive
+    python archive.py import run-1.mcparchive --url http://localhost:8001
+    python archive.py info run-1.mcparchive
+    python archive.py replay run-1.mcparchive --url http://localhost:8001 --speed 10
+"""
+import argparse
+import bisect
+import copy
+import heapq
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import time
+import weakref
+import zlib
+from array import array
+
+from event_log import EVENT_TYPES, TYPE_CODES, format_timestamp
+from fast_json import dumps, loads
+from output_buffer import OutputLog
+from store import DebugSession
+from summary import SessionSummary
+from variable_changes import VariableChanges
+
+MAGIC = b"MCPARCH1"
+# payload length, seq, epoch time, type code, flags, DAP event name code
+_RECORD = struct.Struct("<IqdBBH")
+# footer offset, footer length, magic
+_TRAILER = struct.Struct("<QQ8s")
+COMPRESSED = 1
+_MAX_NAME_CODE = 0xFFFF
+# Payloads at least this long are stored zlib compressed if that is smaller
+COMPRESS_MIN_BYTES = 256
+# Where archives uploaded to POST /debug-data/archive are kept
+ARCHIVE_DIR = os.environ.get("MCP_DEBUG_ARCHIVE_DIR", "archives")
+# Largest archive upload accepted, in bytes; 0 means unlimited
+MAX_ARCHIVE_BYTES = int(os.environ.get("MCP_DEBUG_MAX_ARCHIVE_BYTES", 1024 * 1024 * 1024))
+# In-memory cost charged per archived event (columns only; payloads stay on disk)
+ARCHIVED_EVENT_BYTES = 48
+
+
+class ArchiveError(ValueError):
+    """The file is not a readable session archive."""
+
+
+# Footer keys every session entry has
+_ENTRY_KEYS = ("name", "type", "startTime", "endTime", "terminated", "endedAt", "events", "offsets")
+
+
+def _is_count(value):
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 0
+
+
+# -- export -----------------------------------------------------------------
+
+class SessionSnapshot:
+    """What `write_archive` needs of a session, copied so that the file can
+    be written while the store goes on changing the session."""
+
+    def __init__(self, session):
+        log = session.log
+        self.id = session.id
+        self.name = session.name
+        self.type = session.type
+        self.start_time = session.start_time
+        self.end_time = session.end_time
+        self.terminated = session.terminated
+        self.ended_at = session.ended_at
+        self.summary = copy.deepcopy(session.summary.state())
+        # (event, time) pairs, oldest first
+        self.events = [(session.event_at(position), log.time(position)) for position in range(len(log))]
+
+
+def write_archive(path, sessions):
+    """Write `sessions` (SessionSnapshot objects) to an archive at `path`.
+
+    The file is written next to `path` and moved into place when complete.
+    Returns a summary with the session ids, event count and file size.
+    """
+    names = {None: 0}
+    entries = []
+    events = 0
+    partial = f"{path}.partial"
+    with open(partial, "wb") as f:
+        f.write(MAGIC)
+        offset = len(MAGIC)
+        for session in sessions:
+            offsets = array("Q")
+            for event, timestamp in session.events:
+                data = event["data"]
+                name = data.get("event") if event["type"] == "debugEvent" and isinstance(data, dict) else None
+                if not isinstance(name, str):
+                    name = None
+                code = names.get(name)
+                if code is None:
+                    # Names past the code range are archived without one
+                    code = names[name] = len(names) if len(names) <= _MAX_NAME_CODE else 0
+                payload = dumps(data)
+                flags = 0
+                if len(payload) >= COMPRESS_MIN_BYTES:
+                    compressed = zlib.compress(payload, 6)
+                    if len(compressed) < len(payload):
+                        payload, flags = compressed, COMPRESSED
+                f.write(_RECORD.pack(len(payload), event["seq"], timestamp, TYPE_CODES[event["type"]],
+                                     flags, code))
+                f.write(payload)
+                offsets.append(offset)
+                offset += _RECORD.size + len(payload)
+            entries.append({
+                "id": session.id,
+                "name": session.name,
+                "type": session.type,
+                "startTime": session.start_time,
+                "endTime": session.end_time,
+                "terminated": session.terminated,
+                "endedAt": session.ended_at,
+                "events": len(offsets),
+                "offsets": offset,
+                "summary": session.summary
+            })
+            f.write(offsets.tobytes())
+            offset += len(offsets) * offsets.itemsize
+            events += len(offsets)
+        footer = dumps({
+            "version": 1,
+            "byteorder": sys.byteorder,
+            "names": [name for name, code in sorted(names.items(), key=lambda item: item[1]) if code],
+            "sessions": entries
+        })
+        f.write(footer)
+        f.write(_TRAILER.pack(offset, len(footer), MAGIC))
+    os.replace(partial, path)
+    return {
+        "path": str(path),
+        "sessions": [entry["id"] for entry in entries],
+        "events": events,
+        "bytes": os.path.getsize(path)
+    }
+
+
+# -- import -----------------------------------------------------------------
+
+class Archive:
+    """A memory-mapped archive file. Payloads are decoded on demand.
+
+    With `owned`, the file is deleted once the archive is garbage collected,
+    i.e. when every session loaded from it has been evicted.
+    """
+
+    def __init__(self, path, owned=False):
+        self.path = str(path)
+        with open(self.path, "rb") as f:
+            try:
+                self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise ArchiveError(f"{self.path} is empty")
+        if len(self.buffer) < len(MAGIC) + _TRAILER.size or self.buffer[:len(MAGIC)] != MAGIC:
+            raise ArchiveError(f"{self.path} is not a session archive")
+        footer_offset, footer_length, magic = _TRAILER.unpack_from(self.buffer, len(self.buffer) - _TRAILER.size)
+        if magic != MAGIC or footer_offset + footer_length > len(self.buffer) - _TRAILER.size:
+            raise ArchiveError(f"{self.path} is truncated")
+        try:
+            self.footer = loads(self.buffer[footer_offset:footer_offset + footer_length])
+        except ValueError as e:
+            raise ArchiveError(f"{self.path} has a corrupt footer: {e}")
+        # Records and offset tables end where the footer starts
+        self._end = footer_offset
+        self._check_footer()
+        if self.footer.get("byteorder", sys.byteorder) != sys.byteorder:
+            raise ArchiveError(f"{self.path} was written on a machine with a different byte order")
+        self.names = [None] + self.footer["names"]
+        if owned:
+            weakref.finalize(self, _discard, self.buffer, self.path)
+
+    def _check_footer(self):
+        footer = self.footer
+        if not isinstance(footer, dict):
+            raise ArchiveError(f"{self.path} has a corrupt footer")
+        names = footer.get("names")
+        if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+            raise ArchiveError(f"{self.path} has a corrupt list of event names")
+        sessions = footer.get("sessions")
+        if not isinstance(sessions, list):
+            raise ArchiveError(f"{self.path} has a corrupt list of sessions")
+        for entry in sessions:
+            if not (isinstance(entry, dict) and isinstance(entry.get("id"), str)
+                    and all(key in entry for key in _ENTRY_KEYS)):
+                raise ArchiveError(f"{self.path} has a corrupt session entry")
+            events, start = entry["events"], entry["offsets"]
+            if not (_is_count(events) and _is_count(start)
+                    and len(MAGIC) <= start <= self._end - events * 8):
+                raise ArchiveError(f"{self.path} has a corrupt offset table for session {entry['id']}")
+
+    @property
+    def entries(self):
+        return self.footer["sessions"]
+
+    def offsets(self, entry):
+        offsets = array("Q")
+        start = entry["offsets"]
+        offsets.frombytes(self.buffer[start:start + entry["events"] * offsets.itemsize])
+        return offsets
+
+    def _record(self, offset):
+        if not len(MAGIC) <= offset <= self._end - _RECORD.size:
+            raise ArchiveError(f"{self.path} has a record offset out of range: {offset}")
+        record = _RECORD.unpack_from(self.buffer, offset)
+        if offset + _RECORD.size + record[0] > self._end:
+            raise ArchiveError(f"{self.path} has a truncated record at {offset}")
+        return record
+
+    def header(self, offset):
+        """(seq, time, type, DAP event name) of the record at `offset`."""
+        _, seq, timestamp, code, _, name = self._record(offset)
+        if code >= len(EVENT_TYPES) or name >= len(self.names):
+            raise ArchiveError(f"{self.path} has a corrupt record header at {offset}")
+        return seq, timestamp, EVENT_TYPES[code], self.names[name]
+
+    def payload(self, offset):
+        length, _, _, _, flags, _ = self._record(offset)
+        start = offset + _RECORD.size
+        payload = self.buffer[start:start + length]
+        try:
+            if flags & COMPRESSED:
+                payload = zlib.decompress(payload)
+            return loads(payload)
+        except (zlib.error, ValueError) as e:
+            raise ArchiveError(f"{self.path} has a corrupt payload at {offset}: {e}")
+
+    def events(self, entry):
+        """(seq, time, type, data) of one session's events, oldest first."""
+        for offset in self.offsets(entry):
+            seq, timestamp, event_type, _ = self.header(offset)
+            yield seq, timestamp, event_type, self.payload(offset)
+
+    def sessions(self, next_seq=None):
+        """The archived sessions. With `next_seq`, a function returning
+        ascending sequence numbers, their events are renumbered with it in
+        their original ingest order, so that they sort after everything
+        the importing store already holds."""
+        if next_seq is None:
+            return [ArchivedSession(self, entry) for entry in self.entries]
+        seqs = [[self.header(offset)[0] for offset in self.offsets(entry)] for entry in self.entries]
+        renumbered = [[0] * len(entry_seqs) for entry_seqs in seqs]
+        streams = [
+            [(seq, index, position) for position, seq in enumerate(entry_seqs)]
+            for index, entry_seqs in enumerate(seqs)
+        ]
+        for _, index, position in heapq.merge(*streams):
+            renumbered[index][position] = next_seq()
+        return [
+            ArchivedSession(self, entry, (original, new))
+            for entry, original, new in zip(self.entries, seqs, renumbered)
+        ]
+
+
+def _discard(buffer, path):
+    buffer.close()
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+class ArchivedSession(DebugSession):
+    """A terminated session whose events stay in a memory-mapped archive.
+
+    The log's payload column holds record offsets. Events, the latest
+    variables/stack/breakpoints and the console output are decoded from the
+    archive when first read. Archived sessions don't accept new events.
+    """
+
+    read_only = True
+
+    def __init__(self, archive, entry, renumbered=None):
+        self._latest = {}
+        self._output = None
+        self._variable_changes = None
+        super().__init__({
+            "id": entry["id"], "name": entry["name"], "type": entry["type"], "timestamp": entry["startTime"]
+        })
+        self.archive = archive
+        self.end_time = entry["endTime"]
+        for position, offset in enumerate(archive.offsets(entry)):
+            seq, timestamp, event_type, name = archive.header(offset)
+            if renumbered is not None:
+                seq = renumbered[1][position]
+            self.log.append(seq, event_type, name, timestamp, ARCHIVED_EVENT_BYTES, offset)
+        if "summary" in entry:
+            try:
+                self.summary = SessionSummary.from_state(entry["summary"])
+                if renumbered is not None:
+                    # (archived seqs, new seqs), both ascending
+                    original, new = renumbered
+                    for exception in self.summary.recent_exceptions:
+                        index = bisect.bisect_left(original, exception["seq"])
+                        if index < len(original) and original[index] == exception["seq"]:
+                            exception["seq"] = new[index]
+            except (AttributeError, KeyError, TypeError, ValueError) as e:
+                raise ArchiveError(f"{archive.path} has a corrupt summary for session {self.id}: {e!r}")
+        # Sessions archived while still running end with their last event
+        self.terminated = True
+        self.ended_at = entry["endedAt"]
+        if self.ended_at is None and self.log.max_time > -math.inf:
+            self.ended_at = self.log.max_time
+        self.bytes = len(self.log) * ARCHIVED_EVENT_BYTES
+
+    def add_event(self, event, size, received=None, timestamp=None):
+        raise ValueError(f"Session {self.id} is archived and read-only")
+
+    def event_at(self, position):
+        log = self.log
+        return {"type": log.type(position), "data": self.archive.payload(log.payload(position)), "seq": log.seq(position)}
+
+    def _released(self, evicted):
+        self._latest.clear()
+        self._output = None
+        self._variable_changes = None
+
+    def _latest_data(self, event_type, default, at_most=None):
+        seq = self.log.last_seq_of(event_type, at_most)
+        if seq is None:
+            return default
+        return self.event_at(self.log.position(seq))["data"]
+
+    def _cached_latest(self, event_type, default):
+        if event_type not in self._latest:
+            self._latest[event_type] = self._latest_data(event_type, default)
+        return self._latest[event_type]
+
+    @property
+    def variable_changes(self):
+        # Built from the archived snapshots on first use
+        if self._variable_changes is None:
+            changes = VariableChanges()
+            previous = None
+            for position in self.log.positions(event_types={"variables"}):
+                snapshot = self.event_at(position)["data"]
+                changes.record(self.log.seq(position), self.log.time(position), previous, snapshot)
+                previous = snapshot
+            self._variable_changes = changes
+        return self._variable_changes
+
+    @variable_changes.setter
+    def variable_changes(self, value):
+        pass
+
+    # DebugSession.__init__ assigns these; archived sessions derive them instead
+    variables = property(lambda self: self._cached_latest("variables", {}), lambda self, value: None)
+    stack = property(lambda self: self._cached_latest("stack", []), lambda self, value: None)
+    breakpoints = property(lambda self: self._cached_latest("breakpoints", []), lambda self, value: None)
+
+    @property
+    def output(self):
+        if self._output is None:
+            output = OutputLog()
+            for position in self.log.positions(event_types={"output"}):
+                event = self.event_at(position)
+                body = event["data"].get("body")
+                if isinstance(body, dict) and isinstance(body.get("output"), str):
+                    output.append(body.get("category") or "console", body["output"], event["seq"])
+            self._output = output
+        return self._output
+
+    @output.setter
+    def output(self, value):
+        pass
+
+    def variables_at(self, seq):
+        return self._latest_data("variables", {}, at_most=seq)
+
+
+# -- replay -----------------------------------------------------------------
+
+def _stream(archive, entry):
+    for seq, timestamp, event_type, data in archive.events(entry):
+        yield seq, timestamp, entry["id"], event_type, data
+
+
+def envelope(session_id, event_type, data, timestamp=None):
+    """The ingest envelope an archived event was received as, addressed to
+    `session_id`. Envelopes whose payload has no place for it carry the
+    recorded `timestamp` (epoch seconds) at the top level."""
+    if event_type in ("sessionStarted", "sessionTerminated") and isinstance(data, dict):
+        return {event_type: {**data, "id": session_id}}
+    if event_type == "debugEvent" and isinstance(data, dict):
+        return {event_type: {**data, "sessionId": session_id}}
+    item = {"sessionId": session_id, event_type: data}
+    if timestamp is not None and timestamp == timestamp:
+        item["timestamp"] = format_timestamp(timestamp)
+    return item
+
+
+def replay_events(archive, session_ids=None, prefix=""):
+    """(time, envelope) pairs of the archive's events in original ingest order.
+
+    Each session's events are already in seq order, so they are merged as
+    they are decoded; only one event per session is held at a time.
+    """
+    streams = [
+        _stream(archive, entry) for entry in archive.entries
+        if not session_ids or entry["id"] in session_ids
+    ]
+    # Seqs are unique, so the tuples never compare past them
+    for _, timestamp, session_id, event_type, data in heapq.merge(*streams):
+        yield timestamp, envelope(prefix + session_id, event_type, data, timestamp)
+
+
+def replay(path, url, speed=1.0, session_ids=None, prefix="", batch_size=200):
+    """Send an archive's events to a server, spaced as originally recorded
+    divided by `speed` (0 sends as fast as possible). Returns client stats."""
+    from debug_client import DebugClient
+
+    archive = Archive(path)
+    started = time.monotonic()
+    first = None
+    with DebugClient(url, batch_size=batch_size, drop_policy="block") as client:
+        for timestamp, item in replay_events(archive, session_ids, prefix):
+            if speed and timestamp == timestamp:
+                if first is None:
+                    first = timestamp
+                delay = (timestamp - first) / speed - (time.monotonic() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            client.send(item)
+        client.flush()
+        return dict(client.stats)
+
+
+# -- command line -----------------------------------------------------------
+
+def _info(path):
+    archive = Archive(path)
+    return {
+        "path": archive.path,
+        "bytes": len(archive.buffer),
+        "sessions": [
+            {key: entry[key] for key in ("id", "name", "type", "startTime", "endTime", "events")}
+            for entry in archive.entries
+        ]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export, import, inspect and replay session archives")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="Download sessions from a server into an archive")
+    export.add_argument("--url", default="http://localhost:8001")
+    export.add_argument("--session", action="append", help="Session id to export (repeatable; default all)")
+    export.add_argument("-o", "--output", required=True, help="Archive file to write")
+
+    upload = commands.add_parser("import", help="Load an archive into a server")
+    upload.add_argument("archive")
+    upload.add_argument("--url", default="http://localhost:8001")
+
+    info = commands.add_parser("info", help="List the sessions in an archive")
+    info.add_argument("archive")
+
+    play = commands.add_parser("replay", help="Feed an archive into a server's ingest endpoints")
+    play.add_argument("archive")
+    play.add_argument("--url", default="http://localhost:8001")
+    play.add_argument("--speed", type=float, default=1.0,
+                      help="Time acceleration (default 1 = original pace, 0 = as fast as possible)")
+    play.add_argument("--session", action="append", help="Only replay this session id (repeatable)")
+    play.add_argument("--id-prefix", default="", help="Prefix for replayed session ids, to avoid clashes")
+    args = parser.parse_args()
+
+    if args.command == "info":
+        print(json.dumps(_info(args.archive), indent=2))
+        return 0
+    if args.command == "replay":
+        stats = replay(args.archive, args.url, args.speed, set(args.session or ()), args.id_prefix)
+        print(json.dumps(stats, indent=2))
+        return 0
+
+    import httpx
+    if args.command == "export":
+        params = {"session_id": ",".join(args.session)} if args.session else None
+        with httpx.stream("GET", f"{args.url.rstrip('/')}/debug-data/archive", params=params, timeout=None) as response:
+            if response.is_error:
+                response.read()
+                print(f"Export failed: HTTP {response.status_code} {response.text[:200]}", file=sys.stderr)
+                return 1
+            with open(args.output, "wb") as f:
+                for chunk in response.iter_bytes():
+                    f.write(chunk)
+        print(json.dumps(_info(args.output), indent=2))
+        return 0
+
+    with open(args.archive, "rb") as f:
+        response = httpx.post(f"{args.url.rstrip('/')}/debug-data/archive", content=f, timeout=None,
+                              headers={"Content-Type": "application/octet-stream"})
+    print(response.text)
+    return 0 if response.is_success else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+In-process benchmarks for the debug data server.
+
+Drives main.app through httpx's ASGI transport (no network, no live server)
+with synthetic workloads and reports ingest throughput, request latency,
+GET latency against the number of retained sessions and RSS per stored event.
+
+Every scenario runs in a fresh interpreter so stores and RSS don't leak
+between them. Results are printed as JSON; with --baseline they are compared
+against a previous run and the script exits non-zero on regressions.
+
+    python benchmark.py --output results.json
+    python benchmark.py --save-baseline benchmark_baseline.json
+    python benchmark.py --baseline benchmark_baseline.json --tolerance 0.25
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+# Metrics where a larger value is better; all others are better when smaller
+HIGHER_IS_BETTER = {"events_per_sec"}
+# Counts reported for context, not compared against the baseline
+COUNTS = {"events", "dropped", "throttled"}
+
+SCENARIOS = {}
+
+
+def scenario(function):
+    SCENARIOS[function.__name__] = function
+    return function
+
+
+# -- measurement helpers ----------------------------------------------------
+
+def rss_bytes():
+    """Current resident set size (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def latency_metrics(prefix, seconds):
+    return {
+        f"{prefix}_p50_ms": round(percentile(seconds, 0.50) * 1000, 3),
+        f"{prefix}_p99_ms": round(percentile(seconds, 0.99) * 1000, 3)
+    }
+
+
+class Runner:
+    """Posts envelopes to the app and records per-request latency."""
+
+    def __init__(self, client):
+        self.client = client
+        self.latencies = []
+        self.events = 0
+        self.dropped = 0
+        self.throttled = 0
+        self.elapsed = 0.0
+
+    async def post(self, envelope):
+        await self._send("/debug-data", json.dumps(envelope).encode(), 1)
+
+    async def post_batch(self, envelopes):
+        await self._send("/debug-data/batch", json.dumps(envelopes).encode(), len(envelopes))
+
+    async def _send(self, url, body, count):
+        # A full ingest queue answers 429; like a real client, wait as told
+        # and resend. The wait counts towards latency and throughput.
+        started = time.perf_counter()
+        while True:
+            response = await self.client.post(url, content=body, headers={"content-type": "application/json"})
+            if response.status_code != 429:
+                break
+            self.throttled += 1
+            await asyncio.sleep(float(response.headers.get("retry-after", 1)))
+        took = time.perf_counter() - started
+        response.raise_for_status()
+        self.latencies.append(took)
+        self.elapsed += took
+        self.events += count
+        self.dropped += self._dropped(response.json())
+
+    @staticmethod
+    def _dropped(reply):
+        """Envelopes of a request that were not stored (rate limited); the
+        scenarios run with sampling off, so this should stay 0."""
+        if "results" in reply:
+            return sum(result["status"] == "dropped" for result in reply["results"])
+        return int(reply.get("status") == "dropped")
+
+    async def drain(self):
+        """Wait until everything posted so far has been applied to the store."""
+        (await self.client.post("/debug-data", params={"wait": "true"}, json={})).raise_for_status()
+
+    async def metrics(self, store, rss_before):
+        # Queued envelopes count towards throughput only once applied
+        started = time.perf_counter()
+        await self.drain()
+        self.elapsed += time.perf_counter() - started
+        gc.collect()
+        stored = store.stats()["events"]
+        return {
+            "events": self.events,
+            "dropped": self.dropped,
+            "throttled": self.throttled,
+            "events_per_sec": round(self.events / self.elapsed, 1) if self.elapsed else 0.0,
+            **latency_metrics("ingest", self.latencies),
+            "rss_bytes_per_event": round(max(rss_bytes() - rss_before, 0) / stored, 1) if stored else 0.0
+        }
+
+
+def _session(session_id):
+    return {"sessionStarted": {"id": session_id, "name": f"{session_id}.py", "type": "debugpy",
+                               "timestamp": "2025-01-01T00:00:00.000Z"}}
+
+
+def _terminated(session_id):
+    return {"sessionTerminated": {"id": session_id, "timestamp": "2025-01-01T00:05:00.000Z"}}
+
+
+def _output(session_id, index):
+    return {"debugEvent": {"sessionId": session_id, "event": "output",
+                           "body": {"category": "stdout", "output": f"iteration {index}: value={index * 7}\n"},
+                           "timestamp": "2025-01-01T00:00:01.000Z"}}
+
+
+def _stack(session_id, depth, step):
+    return {"sessionId": session_id, "stack": [
+        {"id": frame, "name": f"function_{frame}", "line": (step + frame) % 500, "column": 1,
+         "source": {"name": f"module_{frame % 20}.py", "path": f"/src/app/module_{frame % 20}.py"}}
+        for frame in range(depth)
+    ]}
+
+
+def _variables(session_id, size, step):
+    scope = {f"var_{index}": index for index in range(size)}
+    scope["counter"] = step
+    scope["items"] = list(range(step % 10, step % 10 + 20))
+    return {"sessionId": session_id, "variables": {"locals": scope, "globals": {"__name__": "__main__"}}}
+
+
+# -- scenarios --------------------------------------------------------------
+
+@scenario
+async def output_flood(client, store, scale):
+    """One session printing many lines, sent in extension-sized batches."""
+    runner = Runner(client)
+    await runner.post(_session("flood"))
+    rss_before = rss_bytes()
+    runner = Runner(client)
+    batch = [_output("flood", index) for index in range(200)]
+    for _ in range(int(100 * scale)):
+        await runner.post_batch(batch)
+    return await runner.metrics(store, rss_before)
+
+
+@scenario
+async def single_events(client, store, scale):
+    """One envelope per request, as the extension sends stack/variables."""
+    runner = Runner(client)
+    await runner.post(_session("single"))
+    rss_before = rss_bytes()
+    runner = Runner(client)
+    for index in range(int(5000 * scale)):
+        await runner.post(_output("single", index))
+    return await runner.metrics(store, rss_before)
+
+
+@scenario
+async def deep_stacks(client, store, scale):
+    """Stack traces 200 frames deep on every step."""
+    runner = Runner(client)
+    await runner.post(_session("stacks"))
+    rss_before = rss_bytes()
+    runner = Runner(client)
+    for step in range(int(1000 * scale)):
+        await runner.post(_stack("stacks", 200, step))
+    return await runner.metrics(store, rss_before)
+
+
+@scenario
+async def deep_recursion(client, store, scale):
+    """A 200-deep recursion stepped through its innermost frame, with the
+    adapter renumbering frame ids on every stop."""
+    runner = Runner(client)
+    await runner.post(_session("recursion"))
+    rss_before = rss_bytes()
+    runner = Runner(client)
+    for step in range(int(1000 * scale)):
+        stack = _stack("recursion", 200, 0)
+        for index, frame in enumerate(stack["stack"]):
+            frame["id"] = step * 200 + index
+            frame["line"] = 40 + step % 25 if index == 0 else 12
+        await runner.post(stack)
+    return await runner.metrics(store, rss_before)
+
+
+@scenario
+async def large_scopes(client, store, scale):
+    """2000-variable scopes where only a few values change per step."""
+    runner = Runner(client)
+    await runner.post(_session("scopes"))
+    rss_before = rss_bytes()
+    runner = Runner(client)
+    for step in range(int(500 * scale)):
+        await runner.post(_variables("scopes", 2000, step))
+    return await runner.metrics(store, rss_before)
+
+
+@scenario
+async def concurrent_sessions(client, store, scale):
+    """Many sessions ingesting at the same time."""
+    runner = Runner(client)
+    sessions = [f"worker-{index}" for index in range(50)]
+    for session_id in sessions:
+        await runner.post(_session(session_id))
+    rss_before = rss_bytes()
+    runner = Runner(client)
+
+    async def produce(session_id):
+        for step in range(int(100 * scale)):
+            await runner.post(_output(session_id, step))
+            if step % 10 == 0:
+                await runner.post(_stack(session_id, 20, step))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(produce(session_id) for session_id in sessions))
+    # Requests overlap, so throughput is measured against wall-clock time
+    runner.elapsed = time.perf_counter() - started
+    return await runner.metrics(store, rss_before)
+
+
+@scenario
+async def query_latency(client, store, scale):
+    """GET /debug-data latency as the number of retained sessions grows."""
+    runner = Runner(client)
+    metrics = {}
+    created = 0
+    for checkpoint in (10, 50, 100):
+        while created < checkpoint:
+            session_id = f"session-{created}"
+            await runner.post(_session(session_id))
+            await runner.post_batch([_output(session_id, index) for index in range(int(100 * scale))])
+            await runner.post(_variables(session_id, 50, created))
+            await runner.post(_terminated(session_id))
+            created += 1
+        await runner.drain()
+        full, poll = [], []
+        for _ in range(20):
+            started = time.perf_counter()
+            (await client.get("/debug-data")).raise_for_status()
+            full.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            (await client.get("/debug-data", params={"since": max(store.last_seq - 100, 0), "limit": 100})).raise_for_status()
+            poll.append(time.perf_counter() - started)
+        metrics.update(latency_metrics(f"get_full_{checkpoint}_sessions", full))
+        metrics.update(latency_metrics(f"get_poll_{checkpoint}_sessions", poll))
+    return metrics
+
+
+# -- driver -----------------------------------------------------------------
+
+async def run_scenario(name, scale):
+    import httpx
+    from main import app
+    from store import debug_store
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        return await SCENARIOS[name](client, debug_store, scale)
+
+
+def run_isolated(name, scale):
+    """Run one scenario in a fresh interpreter and return its metrics."""
+    env = {
+        **os.environ,
+        "MCP_DEBUG_STORE": "memory",
+        "MCP_DEBUG_MAX_SESSIONS": "1000",
+        "MCP_DEBUG_MAX_BYTES": "0",
+        # Every posted event must be stored for the throughput and RSS
+        # figures to mean anything
+        "MCP_DEBUG_SAMPLING": "0"
+    }
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--run-scenario", name, "--scale", str(scale)],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Scenario {name} failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of `results` against `baseline`, as readable strings."""
+    regressions = []
+    for name, metrics in baseline.get("scenarios", {}).items():
+        for metric, expected in metrics.items():
+            actual = results["scenarios"].get(name, {}).get(metric)
+            if actual is None or metric in COUNTS or not expected:
+                continue
+            if metric in HIGHER_IS_BETTER:
+                worse = actual < expected * (1 - tolerance)
+            else:
+                worse = actual > expected * (1 + tolerance)
+            if worse:
+                change = (actual - expected) / expected * 100
+                regressions.append(f"{name}.{metric}: {actual} vs baseline {expected} ({change:+.1f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="In-process benchmarks for the debug data server")
+    parser.add_argument("scenarios", nargs="*", help=f"Scenarios to run (default: all of {', '.join(SCENARIOS)})")
+    parser.add_argument("--scale", type=float, default=1.0, help="Workload size multiplier")
+    parser.add_argument("--output", help="Also write the results JSON to this file")
+    parser.add_argument("--baseline", help="Compare against this results file and fail on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative regression (default 0.25)")
+    parser.add_argument("--save-baseline", help="Write the results as a new baseline file")
+    parser.add_argument("--run-scenario", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_scenario:
+        print(json.dumps(asyncio.run(run_scenario(args.run_scenario, args.scale))))
+        return 0
+
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(unknown)}")
+
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "scale": args.scale,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        },
+        "scenarios": {}
+    }
+    for name in args.scenarios or SCENARIOS:
+        print(f"Running {name}...", file=sys.stderr)
+        results["scenarios"][name] = run_isolated(name, args.scale)
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                f.write(output + "\n")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("scale") != args.scale:
+            print("Warning: baseline was recorded with a different --scale", file=sys.stderr)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s) beyond {args.tolerance:.0%}:", file=sys.stderr)
+            for regression in regressions:
+                print(f"  {regression}", file=sys.stderr)
+            return 1
+        print(f"✅ No regressions beyond {args.tolerance:.0%} against {args.baseline}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
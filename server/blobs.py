@@ -0,0 +1,273 @@
+# Content-addressed blob spill
+# A `variables` snapshot with a 5 MB string repr, or a collection of 100k
+# numbers, would otherwise sit in the heap for as long as its event is
+# retained. Strings and collections above SPILL_MIN_BYTES are written once to
+# a file named by the hash of their content and replaced in the stored
+# payload by a BlobRef: digest, length and a short preview. Identical content
+# shares one file and one BlobRef, so snapshots that repeat a value cost
+# nothing extra and still compare as unchanged. Values are read back through
+# mmap, only a prefix when that is all a reader needs. A blob's file is
+# deleted once the last BlobRef to it is garbage collected, i.e. when every
+# event holding it has been evicted.
+import atexit
+import hashlib
+import mmap
+import os
+import shutil
+import tempfile
+import weakref
+
+from fast_json import dumps, loads
+
+# Strings and collections at least this large (in characters / approximate
+# JSON bytes) are spilled; 0 keeps everything in memory
+SPILL_MIN_BYTES = int(os.environ.get("MCP_DEBUG_SPILL_MIN_BYTES", 16 * 1024))
+# Each process spills into its own directory under this one
+BLOB_DIR = os.environ.get("MCP_DEBUG_BLOB_DIR") or tempfile.gettempdir()
+# Leading characters of a spilled value kept in memory
+PREVIEW_CHARS = 256
+
+TEXT = "text"
+JSON = "json"
+
+_SPILL = "spill"
+_DESCEND = "descend"
+# Approximate in-memory cost of a spilled value, for deciding whether its
+# parent collection is still large
+_REF_BYTES = PREVIEW_CHARS + 64
+
+
+class BlobRef:
+    """A spilled value: a string (TEXT) or an encoded collection (JSON).
+
+    Refs are equal when their content is, and hash by digest. Diffs
+    compare them with raw values through `same_value`, so that a repeated
+    value is unchanged whether or not it has been spilled yet. `length` is
+    the string's length in characters, or the collection's number of items.
+    """
+
+    __slots__ = ("digest", "kind", "length", "size", "preview", "__weakref__")
+
+    def __init__(self, digest, kind, length, size, preview):
+        self.digest = digest
+        self.kind = kind
+        self.length = length
+        self.size = size
+        self.preview = preview
+
+    def __eq__(self, other):
+        if isinstance(other, BlobRef):
+            return other.digest == self.digest
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.digest)
+
+    def __str__(self):
+        # What JSON encoders fall back to if a ref is ever encoded unresolved
+        return f"{self.preview}... <{self.size} bytes spilled>"
+
+    def __repr__(self):
+        return f"BlobRef({self.kind}, {self.digest[:12]}, {self.size} bytes)"
+
+
+def _digest(kind, encoded):
+    return hashlib.blake2b(encoded, digest_size=20, person=kind.encode()).hexdigest()
+
+
+def same_value(a, b):
+    """Whether `a` and `b` hold the same value, either of them possibly a
+    BlobRef standing for it."""
+    if isinstance(b, BlobRef) and not isinstance(a, BlobRef):
+        a, b = b, a
+    if not isinstance(a, BlobRef) or isinstance(b, BlobRef):
+        return a == b
+    # Only values of the same kind and length are hashed
+    if a.kind == TEXT:
+        return (isinstance(b, str) and len(b) == a.length
+                and _digest(TEXT, b.encode("utf-8", "surrogatepass")) == a.digest)
+    return isinstance(b, (dict, list)) and len(b) == a.length and _digest(JSON, dumps(b)) == a.digest
+
+
+def _is_variable(value):
+    return isinstance(value, dict) and isinstance(value.get("name"), str) and "value" in value
+
+
+def _spillable(container):
+    """Collections may be spilled whole unless they hold DAP variables, which
+    stay addressable by name."""
+    if isinstance(container, list):
+        return not any(_is_variable(item) for item in container)
+    return not _is_variable(container)
+
+
+class BlobStore:
+    """Spills large values to content-addressed files and reads them back.
+
+    Files are written by `spill` in the caller's thread. Ingest applies
+    envelopes in its own thread (or the threadpool), never on the loop.
+    """
+
+    def __init__(self, min_bytes=SPILL_MIN_BYTES, directory=BLOB_DIR):
+        self.min_bytes = min_bytes
+        self.directory = directory
+        self._path = None
+        self._refs = weakref.WeakValueDictionary()  # digest -> live BlobRef
+        self.counters = {"spilled": 0, "deduplicated": 0, "reads": 0, "bytesWritten": 0, "bytesRead": 0}
+        self._stored_bytes = 0
+
+    def _root(self):
+        if self._path is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._path = tempfile.mkdtemp(prefix="mcp-debug-blobs-", dir=self.directory)
+            atexit.register(shutil.rmtree, self._path, True)
+        return self._path
+
+    def _file(self, digest):
+        return os.path.join(self._root(), digest[:2], digest[2:])
+
+    # -- writing ------------------------------------------------------------
+
+    def _put(self, kind, encoded, length, preview):
+        digest = _digest(kind, encoded)
+        ref = self._refs.get(digest)
+        if ref is not None:
+            self.counters["deduplicated"] += 1
+            return ref
+        path = self._file(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial = f"{path}.partial"
+        with open(partial, "wb") as f:
+            f.write(encoded)
+        os.replace(partial, path)
+        ref = BlobRef(digest, kind, length, len(encoded), preview)
+        self._refs[digest] = ref
+        weakref.finalize(ref, self._discard, path, len(encoded))
+        self.counters["spilled"] += 1
+        self.counters["bytesWritten"] += len(encoded)
+        self._stored_bytes += len(encoded)
+        return ref
+
+    def _discard(self, path, size):
+        self._stored_bytes -= size
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    def spill(self, value, top=True):
+        """`value` with its large strings and collections replaced by
+        BlobRefs. With `top`, `value` itself is never replaced. Nothing is
+        copied unless something was spilled."""
+        if not self.min_bytes:
+            return value
+        plan = {}
+        self._plan(value, plan, top=top)
+        return self._apply(value, plan) if plan else value
+
+    def _plan(self, value, plan, top=False):
+        """Approximate JSON size of `value` once spilled. Values to spill are
+        marked SPILL in `plan` (by id) and containers holding them DESCEND.
+
+        Decided bottom-up, so a collection only goes whole when what's left
+        of it after spilling its large parts is still large; nothing is
+        written before the plan is complete.
+        """
+        if isinstance(value, str):
+            if top or len(value) < self.min_bytes:
+                return len(value) + 2
+            plan[id(value)] = _SPILL
+            return _REF_BYTES
+        if isinstance(value, dict):
+            items = value.items()
+        elif isinstance(value, list):
+            items = enumerate(value)
+        else:
+            return 8
+        size = 2
+        marked = len(plan)
+        for key, item in items:
+            size += self._plan(item, plan) + (len(key) + 4 if isinstance(key, str) else 1)
+        if not top and size >= self.min_bytes and _spillable(value):
+            plan[id(value)] = _SPILL
+            return _REF_BYTES
+        if len(plan) > marked:
+            plan[id(value)] = _DESCEND
+        return size
+
+    def _apply(self, value, plan):
+        action = plan.get(id(value))
+        if action is _SPILL:
+            if isinstance(value, str):
+                return self._put(TEXT, value.encode("utf-8", "surrogatepass"), len(value), value[:PREVIEW_CHARS])
+            encoded = dumps(value)
+            return self._put(JSON, encoded, len(value), encoded[:PREVIEW_CHARS].decode("utf-8", "ignore"))
+        if action is None:
+            return value
+        copy = dict(value) if isinstance(value, dict) else list(value)
+        for key, item in (value.items() if isinstance(value, dict) else enumerate(value)):
+            stored = self._apply(item, plan)
+            if stored is not item:
+                copy[key] = stored
+        return copy
+
+    # -- reading ------------------------------------------------------------
+
+    def read(self, ref, max_bytes=None):
+        """The stored bytes of `ref`, or their first `max_bytes`."""
+        self.counters["reads"] += 1
+        with open(self._file(ref.digest), "rb") as f:
+            if not ref.size:
+                return b""
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                data = view[:max_bytes] if max_bytes is not None else view[:]
+        self.counters["bytesRead"] += len(data)
+        return data
+
+    def text(self, ref, max_chars=None):
+        """A TEXT blob's string, or its first `max_chars` characters."""
+        if max_chars is not None and max_chars <= len(ref.preview):
+            return ref.preview[:max_chars]
+        if max_chars is not None and max_chars < ref.length:
+            # UTF-8 takes at most 4 bytes per character; a character cut at
+            # the end is dropped
+            return self.read(ref, 4 * max_chars).decode("utf-8", "ignore")[:max_chars]
+        return self.read(ref).decode("utf-8", "surrogatepass")
+
+    def load(self, ref):
+        """The value `ref` stands for."""
+        if ref.kind == TEXT:
+            return self.text(ref)
+        return loads(self.read(ref))
+
+    def materialize(self, value):
+        """`value` with every BlobRef in it loaded. Containers are only
+        copied along the paths that lead to a ref, and nothing is walked
+        while no ref is alive."""
+        return self._materialize(value) if len(self._refs) else value
+
+    def _materialize(self, value):
+        if isinstance(value, BlobRef):
+            return self.load(value)
+        if isinstance(value, dict):
+            items = value.items()
+        elif isinstance(value, list):
+            items = enumerate(value)
+        else:
+            return value
+        copy = None
+        for key, item in items:
+            loaded = self._materialize(item)
+            if loaded is not item:
+                if copy is None:
+                    copy = dict(value) if isinstance(value, dict) else list(value)
+                copy[key] = loaded
+        return copy if copy is not None else value
+
+    def stats(self):
+        return {"minBytes": self.min_bytes, "blobs": len(self._refs), "storedBytes": self._stored_bytes,
+                **self.counters}
+
+
+blob_store = BlobStore()
+
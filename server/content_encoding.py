@@ -0,0 +1,140 @@
+# Compressed transport
+# Ingest routes accept gzip/deflate (and zstd when the `zstandard` package is
+# installed) request bodies, decoded chunk by chunk as the body is received.
+# Query routes gzip their responses for clients that send Accept-Encoding.
+import os
+import zlib
+
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.middleware.gzip import GZipMiddleware
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - depends on the environment
+    zstandard = None
+
+# Responses smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = int(os.environ.get("MCP_DEBUG_COMPRESS_MIN_BYTES", 1024))
+# Upper bound on a decompressed request body, against decompression bombs
+MAX_BODY_BYTES = int(os.environ.get("MCP_DEBUG_MAX_BODY_BYTES", 64 * 1024 * 1024))
+
+
+class _ZlibDecoder:
+    def __init__(self, wbits):
+        self._decoder = zlib.decompressobj(wbits)
+
+    def decompress(self, data, max_length):
+        try:
+            if max_length is None:
+                return self._decoder.decompress(data)
+            output = self._decoder.decompress(data, max_length + 1)
+        except zlib.error as e:
+            raise HTTPException(status_code=400, detail=f"Invalid compressed body: {e}")
+        if len(output) > max_length or self._decoder.unconsumed_tail:
+            raise HTTPException(status_code=413, detail="Decompressed body too large")
+        return output
+
+    def finish(self):
+        if not self._decoder.eof:
+            raise HTTPException(status_code=400, detail="Truncated compressed body")
+        return b""
+
+
+class _ZstdDecoder:
+    def __init__(self):
+        self._decoder = zstandard.ZstdDecompressor().decompressobj()
+
+    def decompress(self, data, max_length):
+        try:
+            output = self._decoder.decompress(data)
+        except zstandard.ZstdError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid compressed body: {e}")
+        if max_length is not None and len(output) > max_length:
+            raise HTTPException(status_code=413, detail="Decompressed body too large")
+        return output
+
+    def finish(self):
+        if not self._decoder.eof:
+            raise HTTPException(status_code=400, detail="Truncated compressed body")
+        return b""
+
+
+def supported_encodings():
+    encodings = ["gzip", "deflate"]
+    if zstandard is not None:
+        encodings.append("zstd")
+    return encodings
+
+
+def _decoder(encoding):
+    if encoding in ("gzip", "x-gzip"):
+        return _ZlibDecoder(16 + zlib.MAX_WBITS)
+    if encoding == "deflate":
+        return _ZlibDecoder(zlib.MAX_WBITS)
+    if encoding == "zstd" and zstandard is not None:
+        return _ZstdDecoder()
+    raise HTTPException(
+        status_code=415,
+        detail=f"Unsupported Content-Encoding {encoding!r}; use one of {', '.join(supported_encodings())}"
+    )
+
+
+class CompressionMiddleware:
+    """Decode compressed request bodies on `ingest_paths` (POST) and gzip
+    responses on `query_paths` (GET).
+
+    Decoding wraps `receive`, so bodies are decompressed chunk by chunk as the
+    route reads them and never buffered in compressed form. Decoding errors
+    surface as HTTP errors: 400 for corrupt data, 413 past
+    `max_body_bytes` and 415 for unknown encodings.
+    """
+
+    def __init__(self, app, ingest_paths=(), query_paths=(), minimum_size=COMPRESS_MIN_BYTES,
+                 max_body_bytes=MAX_BODY_BYTES):
+        self.app = app
+        self.ingest_paths = set(ingest_paths)
+        self.query_paths = set(query_paths)
+        self.max_body_bytes = max_body_bytes
+        self.gzip = GZipMiddleware(app, minimum_size=minimum_size, compresslevel=6)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        path = scope["path"].rstrip("/") or "/"
+        method = scope["method"]
+        if method == "POST" and path in self.ingest_paths:
+            encoding = Headers(scope=scope).get("content-encoding", "identity").strip().lower()
+            if encoding != "identity":
+                scope, receive = self._decoding(scope, receive, encoding)
+            await self.app(scope, receive, send)
+        elif method in ("GET", "HEAD") and path in self.query_paths:
+            await self.gzip(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+    def _decoding(self, scope, receive, encoding):
+        # Updated in place so outer middleware sees what the router adds to scope
+        scope["headers"] = [
+            (name, value) for name, value in scope["headers"]
+            if name not in (b"content-encoding", b"content-length")
+        ]
+        decoder = None
+        remaining = self.max_body_bytes or None
+
+        async def receive_decoded():
+            nonlocal decoder, remaining
+            message = await receive()
+            if message["type"] != "http.request":
+                return message
+            if decoder is None:
+                decoder = _decoder(encoding)
+            body = decoder.decompress(message.get("body", b""), remaining)
+            if not message.get("more_body", False):
+                body += decoder.finish()
+            if remaining is not None:
+                remaining -= len(body)
+            return {**message, "body": body}
+
+        return scope, receive_decoded
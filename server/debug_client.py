@@ -0,0 +1,396 @@
+"""
+Python client for the debug data server.
+
+    from debug_client import DebugClient
+
+    with DebugClient("http://localhost:8001") as client:
+        client.send({"sessionStarted": {"id": "run-1", "name": "job.py"}})
+        for line in lines:
+            client.send({"debugEvent": {"sessionId": "run-1", "event": "output",
+                                        "body": {"category": "stdout", "output": line}}})
+        client.flush()
+        print(client.query(session_id="run-1", event_type="output"))
+
+`send()` only enqueues: a background worker coalesces envelopes into
+POST /debug-data/batch requests of up to `batch_size` envelopes, or whatever
+arrived within `flush_interval` seconds, over one pooled keep-alive
+connection. Queries are retried with exponential backoff. POSTs are not
+idempotent, so they are only resent when the server cannot have stored
+them: the connection was refused, or it answered 429. With `wait=True`
+posts return once the server has applied them, so a query that follows
+sees them. The buffer holds at most `max_buffer` envelopes; when it is
+full, `drop_policy` decides what happens: drop the oldest queued envelope
+("drop_oldest", default), drop the new one ("drop_newest") or wait for room
+("block"). Session lifecycle envelopes are never dropped. AsyncDebugClient is the asyncio equivalent;
+pass `transport=httpx.ASGITransport(app=app)` to drive an app in-process.
+"""
+import asyncio
+import gzip
+import json
+import random
+import threading
+import time
+from collections import deque
+
+import httpx
+
+DEFAULT_URL = "http://localhost:8001"
+DROP_POLICIES = ("drop_oldest", "drop_newest", "block")
+# Envelopes that are kept even when the buffer is full
+LIFECYCLE_KEYS = ("sessionStarted", "sessionTerminated")
+# Request bodies at least this large are gzipped
+COMPRESS_MIN_BYTES = 1024
+
+
+class DebugClientError(Exception):
+    """A request failed for good: a client error or retries exhausted."""
+
+
+def _is_lifecycle(envelope):
+    return any(key in envelope for key in LIFECYCLE_KEYS)
+
+
+def _encode(payload, compress):
+    body = json.dumps(payload).encode("utf-8")
+    headers = {"Content-Type": "application/json"}
+    if compress and len(body) >= COMPRESS_MIN_BYTES:
+        body = gzip.compress(body, compresslevel=5)
+        headers["Content-Encoding"] = "gzip"
+    return body, headers
+
+
+# Failures before the request reached the server
+_NOT_SENT = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+def _retryable(method, response=None, error=None):
+    """Whether a failed request may be sent again. A POST that may have been
+    processed (5xx, timeouts, dropped connections) is not: resending it
+    would store its events twice."""
+    if method == "POST":
+        return isinstance(error, _NOT_SENT) or (response is not None and response.status_code == 429)
+    return error is not None or response.status_code == 429 or response.status_code >= 500
+
+
+def _retry_after(response):
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class _BatchingClient:
+    """Settings and counters shared by both clients."""
+
+    def __init__(self, base_url, batch_size, flush_interval, max_buffer, drop_policy, max_retries,
+                 backoff, max_backoff, timeout, compress, wait):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"drop_policy must be one of {', '.join(DROP_POLICIES)}")
+        self.base_url = base_url.rstrip("/")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.drop_policy = drop_policy
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.compress = compress
+        self.wait = wait
+        self.buffer = deque()
+        self.stats = {"sent": 0, "rejected": 0, "dropped": 0, "retries": 0, "failedBatches": 0}
+
+    def _delay(self, attempt, response=None):
+        """Backoff before retry `attempt` (1-based), honouring Retry-After."""
+        if response is not None:
+            retry_after = _retry_after(response)
+            if retry_after is not None:
+                return min(retry_after, self.max_backoff)
+        delay = min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+        return delay * random.uniform(0.5, 1.0)
+
+    def _make_room(self):
+        """Drop one queued envelope under drop_oldest; False if none can go."""
+        for index, queued in enumerate(self.buffer):
+            if not _is_lifecycle(queued):
+                del self.buffer[index]
+                self.stats["dropped"] += 1
+                return True
+        return False
+
+    def _post_params(self):
+        return {"wait": "true"} if self.wait else None
+
+    def _count(self, result):
+        self.stats["sent"] += result.get("accepted", 0)
+        self.stats["rejected"] += result.get("rejected", 0)
+
+
+class DebugClient(_BatchingClient):
+    """Thread-safe, batching client backed by a pooled httpx.Client."""
+
+    def __init__(self, base_url=DEFAULT_URL, batch_size=200, flush_interval=0.05, max_buffer=10000,
+                 drop_policy="drop_oldest", max_retries=5, backoff=0.1, max_backoff=5.0, timeout=10.0,
+                 compress=True, transport=None, wait=False):
+        super().__init__(base_url, batch_size, flush_interval, max_buffer, drop_policy, max_retries,
+                         backoff, max_backoff, timeout, compress, wait)
+        self.http = httpx.Client(
+            base_url=self.base_url, timeout=timeout, transport=transport,
+            limits=httpx.Limits(max_keepalive_connections=4, keepalive_expiry=60)
+        )
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name="debug-client-flush", daemon=True)
+        self._worker.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # -- queued ingest ---------------------------------------------------
+
+    def send(self, envelope):
+        """Queue an envelope for batched delivery; False if it was dropped."""
+        with self._condition:
+            if self._closed:
+                raise DebugClientError("Client is closed")
+            while self.max_buffer and len(self.buffer) >= self.max_buffer and not _is_lifecycle(envelope):
+                if self.drop_policy == "block":
+                    self._condition.wait()
+                elif self.drop_policy == "drop_newest" or not self._make_room():
+                    self.stats["dropped"] += 1
+                    return False
+            self.buffer.append(envelope)
+            self._condition.notify_all()
+        return True
+
+    def flush(self, timeout=None):
+        """Wait until everything queued so far has been delivered (or given up on)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            self._condition.notify_all()
+            while self.buffer or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def close(self, timeout=10.0):
+        """Flush, stop the worker and release the connection pool."""
+        if self._closed:
+            return
+        self.flush(timeout)
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._worker.join(timeout)
+        self.http.close()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self.buffer and not self._closed:
+                    self._condition.wait()
+                if not self.buffer:
+                    return
+                # Give a partial batch a moment to fill up
+                deadline = time.monotonic() + self.flush_interval
+                while len(self.buffer) < self.batch_size and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch = [self.buffer.popleft() for _ in range(min(self.batch_size, len(self.buffer)))]
+                self._in_flight = len(batch)
+                self._condition.notify_all()
+            try:
+                self._count(self._request("POST", "/debug-data/batch", batch, self._post_params()))
+            except DebugClientError:
+                self.stats["failedBatches"] += 1
+            finally:
+                with self._condition:
+                    self._in_flight = 0
+                    self._condition.notify_all()
+
+    # -- direct requests ---------------------------------------------------
+
+    def post(self, envelope):
+        """POST one envelope right away (bypassing the queue) and return the reply."""
+        return self._request("POST", "/debug-data", envelope, self._post_params())
+
+    def query(self, **params):
+        """GET /debug-data with the given query parameters."""
+        params = {key: ",".join(value) if isinstance(value, (list, tuple, set)) else value
+                  for key, value in params.items() if value is not None}
+        return self._request("GET", "/debug-data", params=params)
+
+    def health(self):
+        return self._request("GET", "/health")
+
+    def _request(self, method, url, payload=None, params=None):
+        content, headers = _encode(payload, self.compress) if payload is not None else (None, None)
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                response = self.http.request(method, url, content=content, headers=headers, params=params)
+                if not _retryable(method, response):
+                    break
+            except httpx.TransportError as e:
+                error = e
+                if not _retryable(method, error=e):
+                    break
+            if attempt == self.max_retries:
+                break
+            self.stats["retries"] += 1
+            time.sleep(self._delay(attempt + 1, response))
+        if response is None:
+            raise DebugClientError(f"{method} {url} failed: {error}")
+        if response.is_error:
+            raise DebugClientError(f"{method} {url} failed: HTTP {response.status_code} {response.text[:200]}")
+        return response.json()
+
+
+class AsyncDebugClient(_BatchingClient):
+    """asyncio variant of DebugClient backed by a pooled httpx.AsyncClient.
+
+    Use it as `async with AsyncDebugClient(...) as client:`; the flushing
+    task runs on the loop that entered it.
+    """
+
+    def __init__(self, base_url=DEFAULT_URL, batch_size=200, flush_interval=0.05, max_buffer=10000,
+                 drop_policy="drop_oldest", max_retries=5, backoff=0.1, max_backoff=5.0, timeout=10.0,
+                 compress=True, transport=None, wait=False):
+        super().__init__(base_url, batch_size, flush_interval, max_buffer, drop_policy, max_retries,
+                         backoff, max_backoff, timeout, compress, wait)
+        self.http = httpx.AsyncClient(
+            base_url=self.base_url, timeout=timeout, transport=transport,
+            limits=httpx.Limits(max_keepalive_connections=4, keepalive_expiry=60)
+        )
+        self._changed = None
+        self._in_flight = 0
+        self._closed = False
+        self._worker = None
+
+    async def __aenter__(self):
+        self._start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def _start(self):
+        if self._worker is None:
+            self._changed = asyncio.Condition()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def send(self, envelope):
+        """Queue an envelope for batched delivery; False if it was dropped."""
+        self._start()
+        async with self._changed:
+            if self._closed:
+                raise DebugClientError("Client is closed")
+            while self.max_buffer and len(self.buffer) >= self.max_buffer and not _is_lifecycle(envelope):
+                if self.drop_policy == "block":
+                    await self._changed.wait()
+                elif self.drop_policy == "drop_newest" or not self._make_room():
+                    self.stats["dropped"] += 1
+                    return False
+            self.buffer.append(envelope)
+            self._changed.notify_all()
+        return True
+
+    async def flush(self, timeout=None):
+        """Wait until everything queued so far has been delivered (or given up on)."""
+        self._start()
+
+        async def drained():
+            async with self._changed:
+                self._changed.notify_all()
+                await self._changed.wait_for(lambda: not self.buffer and not self._in_flight)
+
+        try:
+            await asyncio.wait_for(drained(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def close(self, timeout=10.0):
+        """Flush, stop the worker and release the connection pool."""
+        if self._closed:
+            return
+        if self._worker is not None:
+            await self.flush(timeout)
+            async with self._changed:
+                self._closed = True
+                self._changed.notify_all()
+            try:
+                await asyncio.wait_for(self._worker, timeout)
+            except asyncio.TimeoutError:
+                self._worker.cancel()
+        self._closed = True
+        await self.http.aclose()
+
+    async def _run(self):
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: self.buffer or self._closed)
+                if not self.buffer:
+                    return
+                # Give a partial batch a moment to fill up
+                try:
+                    await asyncio.wait_for(
+                        self._changed.wait_for(lambda: len(self.buffer) >= self.batch_size or self._closed),
+                        self.flush_interval
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                batch = [self.buffer.popleft() for _ in range(min(self.batch_size, len(self.buffer)))]
+                self._in_flight = len(batch)
+                self._changed.notify_all()
+            try:
+                self._count(await self._request("POST", "/debug-data/batch", batch, self._post_params()))
+            except DebugClientError:
+                self.stats["failedBatches"] += 1
+            finally:
+                async with self._changed:
+                    self._in_flight = 0
+                    self._changed.notify_all()
+
+    async def post(self, envelope):
+        """POST one envelope right away (bypassing the queue) and return the reply."""
+        return await self._request("POST", "/debug-data", envelope, self._post_params())
+
+    async def query(self, **params):
+        """GET /debug-data with the given query parameters."""
+        params = {key: ",".join(value) if isinstance(value, (list, tuple, set)) else value
+                  for key, value in params.items() if value is not None}
+        return await self._request("GET", "/debug-data", params=params)
+
+    async def health(self):
+        return await self._request("GET", "/health")
+
+    async def _request(self, method, url, payload=None, params=None):
+        content, headers = _encode(payload, self.compress) if payload is not None else (None, None)
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                response = await self.http.request(method, url, content=content, headers=headers, params=params)
+                if not _retryable(method, response):
+                    break
+            except httpx.TransportError as e:
+                error = e
+                if not _retryable(method, error=e):
+                    break
+            if attempt == self.max_retries:
+                break
+            self.stats["retries"] += 1
+            await asyncio.sleep(self._delay(attempt + 1, response))
+        if response is None:
+            raise DebugClientError(f"{method} {url} failed: {error}")
+        if response.is_error:
+            raise DebugClientError(f"{method} {url} failed: HTTP {response.status_code} {response.text[:200]}")
+        return response.json()
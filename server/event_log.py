@@ -0,0 +1,282 @@
+# Columnar event log
+# A session's events are kept column by column instead of as one dict each:
+# sequence numbers, type codes, parsed timestamps and sizes in typed arrays,
+# payloads in a plain list. Filtering by type uses a per-type index of
+# sequence numbers, and filtering by seq or time is a binary search. Events
+# that arrive out of time order are also kept in a time-sorted index.
+import bisect
+import heapq
+import math
+from array import array
+from datetime import datetime, timezone
+
+# Envelope type of each event, by type code
+EVENT_TYPES = ("sessionStarted", "sessionTerminated", "debugEvent", "variables", "stack", "breakpoints")
+TYPE_CODES = {name: code for code, name in enumerate(EVENT_TYPES)}
+
+# Evicted slots at the front of the columns are reclaimed once there are this
+# many of them and they make up half of the columns
+COMPACT_MIN_EVICTED = 1024
+
+NO_TIME = math.nan
+
+
+def parse_timestamp(value):
+    """Seconds since the epoch for an ISO 8601 timestamp, or None.
+
+    Timestamps without an offset are taken as local time, like the clocks
+    that produced them.
+    """
+    if not isinstance(value, str) or not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def _tail(values, start):
+    """Iterate `values[start:]` without copying it."""
+    for index in range(start, len(values)):
+        yield values[index]
+
+
+def format_timestamp(seconds):
+    """ISO 8601 UTC timestamp (as the extension sends them) for epoch seconds."""
+    moment = datetime.fromtimestamp(seconds, timezone.utc)
+    return moment.isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def to_epoch(value):
+    """Epoch seconds for a number or an ISO 8601 string; ValueError otherwise."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            seconds = parse_timestamp(value)
+            if seconds is not None:
+                return seconds
+    raise ValueError(f"Not an ISO 8601 timestamp or epoch seconds: {value!r}")
+
+
+class EventLog:
+    """Bounded, append-only log of one session's events.
+
+    Positions (0 = oldest retained event) index the columns. Appending past
+    `maxlen` evicts the oldest event. Sequence numbers must be appended in
+    ascending order; timestamps may arrive in any order.
+    """
+
+    def __init__(self, maxlen=None):
+        self.maxlen = maxlen or None
+        self.seqs = array("q")
+        self.types = array("B")
+        self.times = array("d")
+        self.sizes = array("q")
+        self.payloads = []
+        self._head = 0                  # columns before this index were evicted
+        self._index = {}                # envelope type or DAP event name -> array of seqs
+        self._times_sorted = True
+        # (times, seqs) sorted by time, kept only once times are out of order
+        self._time_index = None
+        self.min_time = math.inf
+        self.max_time = -math.inf
+
+    def __len__(self):
+        return len(self.seqs) - self._head
+
+    @property
+    def first_seq(self):
+        return self.seqs[self._head] if len(self) else None
+
+    def seq(self, position):
+        return self.seqs[self._head + position]
+
+    def type(self, position):
+        return EVENT_TYPES[self.types[self._head + position]]
+
+    def time(self, position):
+        return self.times[self._head + position]
+
+    def payload(self, position):
+        return self.payloads[self._head + position]
+
+    def append(self, seq, event_type, name, timestamp, size, payload):
+        """Add an event; returns the evicted (type, payload, size) when the
+        log was full, else None. `name` is a debugEvent's DAP event name."""
+        evicted = self.popleft() if self.maxlen is not None and len(self) == self.maxlen else None
+        out_of_order = timestamp != timestamp or (len(self) and timestamp < self.times[-1])
+        self.seqs.append(seq)
+        self.types.append(TYPE_CODES[event_type])
+        self.times.append(timestamp)
+        self.sizes.append(size)
+        self.payloads.append(payload)
+        if out_of_order and self._times_sorted:
+            self._times_sorted = False
+            self._build_time_index()
+        elif self._time_index is not None and timestamp == timestamp:
+            times, seqs = self._time_index
+            index = bisect.bisect_right(times, timestamp)
+            times.insert(index, timestamp)
+            seqs.insert(index, seq)
+        if timestamp == timestamp:
+            self.min_time = min(self.min_time, timestamp)
+            self.max_time = max(self.max_time, timestamp)
+        self._indexed(event_type).append(seq)
+        if name is not None and name != event_type:
+            self._indexed(name).append(seq)
+        return evicted
+
+    def _indexed(self, key):
+        seqs = self._index.get(key)
+        if seqs is None:
+            seqs = self._index[key] = array("q")
+        return seqs
+
+    def popleft(self):
+        """Evict the oldest event and return its (type, payload, size)."""
+        head = self._head
+        evicted = (EVENT_TYPES[self.types[head]], self.payloads[head], self.sizes[head])
+        self.payloads[head] = None
+        self._head += 1
+        if self._head >= COMPACT_MIN_EVICTED and self._head * 2 >= len(self.seqs):
+            self._compact()
+        return evicted
+
+    def _compact(self):
+        head = self._head
+        for column in (self.seqs, self.types, self.times, self.sizes, self.payloads):
+            del column[:head]
+        self._head = 0
+        first = self.first_seq
+        for key, seqs in list(self._index.items()):
+            stale = bisect.bisect_left(seqs, first) if first is not None else len(seqs)
+            if stale == len(seqs):
+                del self._index[key]
+            elif stale:
+                del seqs[:stale]
+        if not self._times_sorted:
+            times = self.times
+            self._times_sorted = all(a <= b for a, b in zip(times, times[1:]))
+            if self._times_sorted:
+                self._time_index = None
+            else:
+                self._build_time_index()
+
+    def _build_time_index(self):
+        head = self._head
+        entries = sorted(
+            (time, seq) for time, seq in zip(self.times[head:], self.seqs[head:]) if time == time
+        )
+        self._time_index = (array("d", [time for time, _ in entries]), array("q", [seq for _, seq in entries]))
+
+    def last_seq_of(self, key, at_most=None):
+        """Seq of the newest retained event of type (or DAP event name) `key`,
+        optionally no newer than `at_most`; None if there is none."""
+        seqs = self._index.get(key)
+        if not seqs:
+            return None
+        index = len(seqs) if at_most is None else bisect.bisect_right(seqs, at_most)
+        if not index or not len(self) or seqs[index - 1] < self.first_seq:
+            return None
+        return seqs[index - 1]
+
+    def position(self, seq):
+        """Position of the event with sequence number `seq`."""
+        return bisect.bisect_left(self.seqs, seq, self._head) - self._head
+
+    def positions(self, since=0, event_types=None, limit=None, start_time=None, end_time=None):
+        """Positions of events with seq > `since`, oldest first.
+
+        `event_types` matches either the envelope type (`debugEvent`, `stack`,
+        ...) or the DAP event name of a debugEvent (`output`, `stopped`, ...).
+        `start_time`/`end_time` (epoch seconds, inclusive) bound the events'
+        timestamps.
+        """
+        timed = start_time is not None or end_time is not None
+        low = self.position(since + 1) if since else 0
+        high = len(self)
+        if timed and self._times_sorted:
+            head = self._head
+            if start_time is not None:
+                low = max(low, bisect.bisect_left(self.times, start_time, head) - head)
+            if end_time is not None:
+                high = bisect.bisect_right(self.times, end_time, head) - head
+            timed = False
+        if low >= high:
+            return []
+
+        if event_types:
+            # Merge the per-type seq indexes from the first candidate seq on
+            first = self.seq(low)
+            streams = []
+            for key in event_types:
+                seqs = self._index.get(key)
+                if seqs:
+                    streams.append(_tail(seqs, bisect.bisect_left(seqs, first)))
+            candidates = self._merged_positions(streams, high)
+        else:
+            candidates = range(low, high)
+
+        if timed:
+            start = -math.inf if start_time is None else start_time
+            end = math.inf if end_time is None else end_time
+            times, head = self.times, self._head
+            candidates = (position for position in candidates if start <= times[head + position] <= end)
+
+        selected = []
+        for position in candidates:
+            if limit is not None and len(selected) >= limit:
+                break
+            selected.append(position)
+        return selected
+
+    def _merged_positions(self, streams, high):
+        seqs, head = self.seqs, self._head
+        previous = None
+        hint = head
+        for seq in heapq.merge(*streams) if len(streams) > 1 else (streams[0] if streams else ()):
+            if seq == previous:
+                continue
+            previous = seq
+            hint = bisect.bisect_left(seqs, seq, hint)
+            position = hint - head
+            if position >= high:
+                return
+            yield position
+
+    def window(self, start_time=None, end_time=None, event_types=None, limit=None):
+        """Positions of events timestamped within [start_time, end_time]
+        (epoch seconds, inclusive, either may be None), in time order."""
+        start = -math.inf if start_time is None else start_time
+        end = math.inf if end_time is None else end_time
+        if not len(self) or start > self.max_time or end < self.min_time:
+            return []
+        if self._times_sorted:
+            # Time order is position order
+            return self.positions(event_types=event_types, limit=limit, start_time=start_time, end_time=end_time)
+
+        times, seqs = self._time_index
+        low = bisect.bisect_left(times, start)
+        high = bisect.bisect_right(times, end)
+        first = self.first_seq
+        selected = []
+        for index in range(low, high):
+            if limit is not None and len(selected) >= limit:
+                break
+            seq = seqs[index]
+            if seq < first or (event_types and not self._matches(seq, event_types)):
+                continue
+            selected.append(self.position(seq))
+        return selected
+
+    def _matches(self, seq, event_types):
+        for key in event_types:
+            seqs = self._index.get(key)
+            if seqs:
+                index = bisect.bisect_left(seqs, seq)
+                if index < len(seqs) and seqs[index] == seq:
+                    return True
+        return False
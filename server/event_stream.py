@@ -0,0 +1,128 @@
+# Live event stream
+# Fans newly stored events out to Server-Sent Events subscribers and keeps a
+# bounded replay buffer so clients can resume after a disconnect.
+import asyncio
+import os
+from collections import deque
+
+from blobs import blob_store
+from fast_json import dumps
+from store import event_matches
+
+REPLAY_BUFFER_SIZE = int(os.environ.get("MCP_DEBUG_STREAM_REPLAY", 5000))
+SUBSCRIBER_QUEUE_SIZE = 1000
+HEARTBEAT_SECONDS = 15
+
+
+class Subscription:
+    """One connected stream client and its pending events."""
+
+    def __init__(self, session_id=None, event_types=None):
+        self.session_id = session_id
+        self.event_types = event_types
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def wants(self, session_id, event):
+        if self.session_id is not None and session_id != self.session_id:
+            return False
+        return not self.event_types or event_matches(event, self.event_types)
+
+
+class EventStream:
+    """Broadcast stored events to live subscribers.
+
+    Event ids are the store's sequence numbers, so they increase
+    monotonically. A subscriber that falls more than SUBSCRIBER_QUEUE_SIZE
+    events behind is disconnected; it can reconnect with Last-Event-ID and
+    catch up from the replay buffer.
+    """
+
+    def __init__(self, replay_size=REPLAY_BUFFER_SIZE):
+        self.replay = deque(maxlen=replay_size)   # (session_id, event), oldest first
+        self.subscribers = set()
+        self.loop = None                          # event loop the subscribers run on
+
+    def publish(self, session_id, event):
+        """Record and fan out an event; safe to call from any thread."""
+        loop = self.loop
+        if loop is not None and not loop.is_closed() and _running_loop() is not loop:
+            loop.call_soon_threadsafe(self._publish, session_id, event)
+        else:
+            self._publish(session_id, event)
+
+    def _publish(self, session_id, event):
+        self.replay.append((session_id, event))
+        for subscription in self.subscribers:
+            if subscription.overflowed or not subscription.wants(session_id, event):
+                continue
+            try:
+                subscription.queue.put_nowait((session_id, event))
+            except asyncio.QueueFull:
+                # The consumer is busy draining a full queue; it will see the
+                # flag on its next iteration and close the stream
+                subscription.overflowed = True
+
+    def backlog(self, subscription, last_event_id):
+        """Buffered events after `last_event_id`, and whether some were lost."""
+        missed = bool(self.replay) and self.replay[0][1]["seq"] > last_event_id + 1
+        events = [
+            (session_id, event) for session_id, event in self.replay
+            if event["seq"] > last_event_id and subscription.wants(session_id, event)
+        ]
+        return events, missed
+
+    async def stream(self, request, session_id=None, event_types=None, last_event_id=None):
+        """Yield SSE frames for new events, replaying after `last_event_id` first."""
+        self.loop = asyncio.get_running_loop()
+        subscription = Subscription(session_id, event_types)
+        # Subscribe before replaying so nothing published in between is lost
+        self.subscribers.add(subscription)
+        try:
+            sent = 0
+            if last_event_id is not None:
+                events, missed = self.backlog(subscription, last_event_id)
+                if missed:
+                    yield _frame("gap", {"lastEventId": last_event_id, "oldestAvailable": self.replay[0][1]["seq"]})
+                for item in events:
+                    yield _event_frame(*item)
+                    sent = item[1]["seq"]
+
+            while not subscription.overflowed:
+                try:
+                    item = await asyncio.wait_for(subscription.queue.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                if item[1]["seq"] <= sent:
+                    continue
+                yield _event_frame(*item)
+        finally:
+            self.subscribers.discard(subscription)
+
+
+def _running_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def _frame(event_name, payload, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_name}")
+    lines.append(f"data: {dumps(payload).decode()}")
+    return "\n".join(lines) + "\n\n"
+
+
+def _event_frame(session_id, event):
+    data = blob_store.materialize(event["data"])
+    payload = {"seq": event["seq"], "sessionId": session_id, "type": event["type"], "data": data}
+    return _frame(event["type"], payload, event_id=event["seq"])
+
+
+event_stream = EventStream()
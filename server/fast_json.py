@@ -0,0 +1,31 @@
+# JSON encoding for hot paths
+# Uses orjson when it is installed and falls back to the standard library, so
+# the server works either way; the output is compact JSON in both cases.
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(value):
+        """Encode `value` as compact JSON bytes."""
+        return orjson.dumps(value, default=str, option=_OPTIONS)
+
+    def loads(data):
+        return orjson.loads(data)
+
+    JSONDecodeError = orjson.JSONDecodeError
+else:
+    def dumps(value):
+        """Encode `value` as compact JSON bytes."""
+        return json.dumps(value, separators=(",", ":"), default=str).encode("utf-8")
+
+    def loads(data):
+        return json.loads(data)
+
+    JSONDecodeError = json.JSONDecodeError
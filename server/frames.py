@@ -0,0 +1,232 @@
+# Interned stack frames
+# Stepping through deep recursion sends nearly the same stack on every stop:
+# the outer frames repeat and only the innermost ones change. StackTable keeps
+# each distinct frame once as a compact record and stores stacks as nodes of a
+# trie built from the outermost frame inwards, so stacks that share their
+# outer frames share their storage. The JSON stack is rebuilt on read.
+from array import array
+
+# The table is rebuilt from the live stacks whenever it has doubled in size
+# since the last rebuild, and never below this many nodes
+COMPACT_MIN_NODES = 4096
+
+# Frames of a DAP `stackTrace` response body, as sent by the extension
+FRAMES_KEY = "stackFrames"
+
+# Approximate bytes for one trie node and its index entry
+NODE_BYTES = 16
+
+_ROOT = -1
+
+
+def _simple(value):
+    return value is None or type(value) is str or type(value) is int
+
+
+def freeze(value):
+    """Hashable equivalent of a JSON value, used as an interning key."""
+    if isinstance(value, dict):
+        return (dict,) + tuple(
+            (key, item if _simple(item) else freeze(item)) for key, item in value.items()
+        )
+    if isinstance(value, list):
+        return (list,) + tuple(item if _simple(item) else freeze(item) for item in value)
+    if _simple(value):
+        return value
+    # Keep True, 1 and 1.0 apart
+    return (type(value), value)
+
+
+def _compact_ids(ids):
+    """Per-frame DAP ids as a range when they are evenly spaced (adapters
+    usually number frames consecutively), otherwise as an array."""
+    if len(ids) < 2:
+        return range(ids[0], ids[0] + 1) if ids else range(0)
+    step = ids[1] - ids[0]
+    if step and all(b - a == step for a, b in zip(ids, ids[1:])):
+        return range(ids[0], ids[-1] + step, step)
+    try:
+        return array("q", ids)
+    except OverflowError:
+        return tuple(ids)
+
+
+class Frame:
+    """One interned frame: its key tuple (shared by frames of the same shape)
+    and its values, with nested objects such as `source` replaced by their
+    shared frozen form. Frames compare by content so they can key the table."""
+
+    __slots__ = ("keys", "values")
+
+    def __init__(self, keys, values):
+        self.keys = keys
+        self.values = values
+
+    def __eq__(self, other):
+        return self.keys is other.keys and self.values == other.values
+
+    def __hash__(self):
+        return hash(self.values)
+
+
+class StackRef:
+    """A stored stack: its innermost trie node, the frames' DAP ids (None when
+    they are part of the interned frames) and, for a `stackTrace` response
+    body, the body's other keys and values."""
+
+    __slots__ = ("node", "ids", "envelope")
+
+    def __init__(self, node, ids, envelope):
+        self.node = node
+        self.ids = ids
+        self.envelope = envelope
+
+
+class StackTable:
+    """Per-session table of interned frames and stack trie nodes."""
+
+    def __init__(self):
+        self.frames = []                # Frame records by frame number
+        self._frame_numbers = {}        # Frame -> frame number
+        self._values = {}               # frozen value -> (canonical frozen value, value)
+        self._shapes = {}               # key tuple -> shared key tuple
+        self.parents = array("l")       # node -> parent node (_ROOT for outermost frames)
+        self.node_frames = array("l")   # node -> frame number
+        self._nodes = {}                # (parent + 1) << 32 | frame number -> node
+        self._compact_at = COMPACT_MIN_NODES
+
+    def intern(self, stack, size):
+        """Store `stack` and return (StackRef, approx bytes added), or
+        (None, 0) when it isn't a list of frame objects (or a response body
+        holding one). `size` is the payload's encoded size; new frames are
+        charged their share of it."""
+        envelope = None
+        if isinstance(stack, dict) and isinstance(stack.get(FRAMES_KEY), list):
+            frames = stack[FRAMES_KEY]
+            envelope = (
+                self._shape(tuple(stack)),
+                tuple(None if key == FRAMES_KEY else value for key, value in stack.items())
+            )
+        elif isinstance(stack, list):
+            frames = stack
+        else:
+            return None, 0
+        if not all(isinstance(frame, dict) for frame in frames):
+            return None, 0
+
+        ids = [frame.get("id") for frame in frames]
+        separate_ids = all(type(frame_id) is int for frame_id in ids)
+        new_frames = new_nodes = 0
+        node = _ROOT
+        for frame in reversed(frames):
+            number, created = self._frame(frame, separate_ids)
+            new_frames += created
+            node, created = self._node(node, number)
+            new_nodes += created
+        ref = StackRef(node, _compact_ids(ids) if separate_ids else None, envelope)
+        added = size * new_frames // len(frames) if frames else 0
+        return ref, added + new_nodes * NODE_BYTES
+
+    def rebuild(self, ref):
+        """The stack `ref` was interned from, as JSON-compatible data."""
+        frames = []
+        node = ref.node
+        while node != _ROOT:
+            frames.append(self.frames[self.node_frames[node]])
+            node = self.parents[node]
+        # Walking from the innermost node restores DAP order (innermost first)
+        if ref.ids is None:
+            stack = [self._thaw(frame) for frame in frames]
+        else:
+            stack = []
+            for frame, frame_id in zip(frames, ref.ids):
+                frame = self._thaw(frame)
+                frame["id"] = frame_id
+                stack.append(frame)
+        if ref.envelope is None:
+            return stack
+        keys, values = ref.envelope
+        body = dict(zip(keys, values))
+        body[FRAMES_KEY] = stack
+        return body
+
+    def _shape(self, keys):
+        return self._shapes.setdefault(keys, keys)
+
+    def _share(self, value):
+        """The canonical frozen form of a value that isn't a str, int or None."""
+        frozen = freeze(value)
+        entry = self._values.get(frozen)
+        if entry is None:
+            entry = self._values[frozen] = (frozen, value)
+        return entry[0]
+
+    def _thaw(self, frame):
+        values = self._values
+        return {
+            key: values[value][1] if type(value) is tuple else value
+            for key, value in zip(frame.keys, frame.values)
+        }
+
+    def _frame(self, frame, separate_ids):
+        values = []
+        for key, value in frame.items():
+            if separate_ids and key == "id":
+                value = None
+            elif not _simple(value):
+                value = self._share(value)
+            values.append(value)
+        record = Frame(self._shape(tuple(frame)), tuple(values))
+        number = self._frame_numbers.get(record)
+        if number is not None:
+            return number, False
+        number = self._frame_numbers[record] = len(self.frames)
+        self.frames.append(record)
+        return number, True
+
+    def _node(self, parent, number):
+        key = (parent + 1) << 32 | number
+        node = self._nodes.get(key)
+        if node is not None:
+            return node, False
+        node = len(self.parents)
+        self.parents.append(parent)
+        self.node_frames.append(number)
+        self._nodes[key] = node
+        return node, True
+
+    @property
+    def needs_compaction(self):
+        return len(self.parents) >= self._compact_at
+
+    def compact(self, refs):
+        """Drop frames and nodes not reachable from `refs` (the stacks still
+        stored), renumbering the refs in place."""
+        old_frames, old_parents, old_node_frames = self.frames, self.parents, self.node_frames
+        old_values = self._values
+        self.frames, self._frame_numbers, self._values = [], {}, {}
+        self.parents, self.node_frames, self._nodes = array("l"), array("l"), {}
+
+        renumbered_frames = {}
+        renumbered_nodes = {_ROOT: _ROOT}
+        for ref in refs:
+            path = []
+            node = ref.node
+            while node not in renumbered_nodes:
+                path.append(node)
+                node = old_parents[node]
+            parent = renumbered_nodes[node]
+            for old_node in reversed(path):
+                old_number = old_node_frames[old_node]
+                number = renumbered_frames.get(old_number)
+                if number is None:
+                    frame = old_frames[old_number]
+                    number = renumbered_frames[old_number] = self._frame_numbers[frame] = len(self.frames)
+                    self.frames.append(frame)
+                    for value in frame.values:
+                        if type(value) is tuple:
+                            self._values[value] = old_values[value]
+                parent, _ = self._node(parent, number)
+                renumbered_nodes[old_node] = parent
+            ref.node = renumbered_nodes[ref.node]
+        self._compact_at = max(COMPACT_MIN_NODES, 2 * len(self.parents))
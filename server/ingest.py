@@ -0,0 +1,131 @@
+# Asynchronous ingest
+# POST handlers validate envelopes, reserve their sequence numbers and hand
+# them to a bounded queue; a worker task applies them to the store in arrival
+# order, from a dedicated thread so that the event loop never waits for the
+# store's lock. Clients get an answer as soon as their data is queued, and a
+# full queue turns into 429 responses instead of growing latency.
+import asyncio
+import logging
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+ASYNC_INGEST = os.environ.get("MCP_DEBUG_ASYNC_INGEST", "1") not in ("0", "false", "no")
+# Envelopes waiting to be applied before ingest answers 429
+INGEST_QUEUE_SIZE = int(os.environ.get("MCP_DEBUG_INGEST_QUEUE", 10000))
+# Envelopes applied per trip to the ingest thread
+APPLY_BATCH = 500
+RETRY_AFTER_SECONDS = 1
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """The ingest queue cannot take the submitted envelopes right now."""
+
+    def __init__(self, retry_after=RETRY_AFTER_SECONDS):
+        super().__init__("Ingest queue is full")
+        self.retry_after = retry_after
+
+
+class IngestPipeline:
+    """Bounded FIFO of envelopes applied to `store` by a background task.
+
+    Sequence numbers are reserved when an envelope is queued, and the queue
+    is applied strictly in order, so events keep ascending sequence numbers
+    within every session. An envelope that turns out to belong to no session
+    leaves its number unused.
+    """
+
+    def __init__(self, store, capacity=INGEST_QUEUE_SIZE):
+        self.store = store
+        self.capacity = capacity
+        self._queue = deque()     # (data, size, seq, future or None)
+        self._ready = None
+        self._worker = None
+        self._stopping = False
+        # One thread, so envelopes are applied in queue order
+        self._thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest")
+        self.stats_counters = {"applied": 0, "rejectedFull": 0, "failed": 0}
+
+    def submit(self, items, wait=False):
+        """Queue (data, size) pairs as one unit; return [(seq, future)].
+
+        All items are queued or none: QueueFull is raised when they don't fit.
+        Items must be valid envelopes (see store.envelope_error). With `wait`,
+        each future resolves once the envelope has been applied, to the seq
+        `apply` returned (None if the envelope was ignored) or to the
+        exception it raised.
+        """
+        if self.capacity and len(self._queue) + len(items) > self.capacity:
+            self.stats_counters["rejectedFull"] += len(items)
+            raise QueueFull()
+        self._start()
+        loop = asyncio.get_running_loop()
+        accepted = []
+        for data, size in items:
+            seq = self.store.reserve_seq()
+            future = loop.create_future() if wait else None
+            self._queue.append((data, size, seq, future))
+            accepted.append((seq, future))
+        self._ready.set()
+        return accepted
+
+    def _start(self):
+        if self._worker is None or self._worker.done():
+            self._ready = asyncio.Event()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._ready.wait()
+            if not self._queue:
+                if self._stopping:
+                    return
+                self._ready.clear()
+                continue
+            _resolve(await loop.run_in_executor(self._thread, self._apply, APPLY_BATCH))
+
+    def _apply(self, limit=None):
+        """Apply up to `limit` queued envelopes (in the ingest thread); returns
+        (future, seq or exception) for those submitted with `wait`."""
+        applied = 0
+        done = []
+        while self._queue and (limit is None or applied < limit):
+            data, size, seq, future = self._queue.popleft()
+            try:
+                result = self.store.apply(data, size=size, seq=seq)
+            except Exception as e:
+                self.stats_counters["failed"] += 1
+                logger.exception("Failed to apply queued envelope (seq %s)", seq)
+                result = e
+            if future is not None:
+                done.append((future, result))
+            applied += 1
+        self.stats_counters["applied"] += applied
+        return done
+
+    async def stop(self):
+        """Apply whatever is still queued and stop the worker."""
+        if self._worker is not None and not self._worker.done():
+            self._stopping = True
+            self._ready.set()
+            await self._worker
+        self._worker = None
+        self._stopping = False
+        _resolve(self._apply())
+
+    def load(self):
+        """How full the queue is, 0 to 1 (0 when unbounded)."""
+        return len(self._queue) / self.capacity if self.capacity else 0.0
+
+    def stats(self):
+        return {"queued": len(self._queue), "capacity": self.capacity, **self.stats_counters}
+
+
+def _resolve(done):
+    """Settle the futures of applied envelopes, on the event loop."""
+    for future, result in done:
+        if not future.done():
+            future.set_result(result)
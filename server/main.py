@@ -1,4 +1,19 @@
-from fastapi import FastAPI, Request
+import logging
+import os
+import tempfile
+import uuid
+from contextlib import asynccontextmanager
+
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from analysis import analysis_pool
+from archive import ARCHIVE_DIR, MAX_ARCHIVE_BYTES
+from content_encoding import CompressionMiddleware
+from fast_json import loads
+from ingest import ASYNC_INGEST, IngestPipeline, QueueFull
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, METRICS_ENABLED, REGISTRY, MetricsMiddleware, instrument_ingest, instrument_store
+from sampling import WORKERS as SAMPLER_WORKERS, sampler
 from tools import mcp
 
 # NOTE about mounting FastMCP http_app:
@@ -14,8 +29,10 @@ from tools import mcp
 # parent `FastAPI(lifespan=...)` so the inner lifecycle starts/stops with the
 # parent app. This prevents runtime errors that would otherwise result in 500
 # responses on SSE connection attempts.
-from store import debug_data, debug_sessions, current_session
-from datetime import datetime
+from store import STORE_BACKEND, debug_store, envelope_error
+from event_stream import event_stream
+
+logger = logging.getLogger(__name__)
 
 # Create a FastAPI app
 app = FastAPI()
@@ -26,70 +43,398 @@ app = FastAPI()
 # errors which resulted in 500 responses on SSE requests.
 mcp_app = mcp.http_app(path="/")
 
+# Ingest is applied by a background task in arrival order. With the remote
+# backend every worker would reserve its own sequence numbers, so workers
+# apply synchronously and let the daemon order events instead.
+ingest = IngestPipeline(debug_store) if ASYNC_INGEST and STORE_BACKEND != "remote" else None
+if sampler is not None and ingest is not None:
+    # Sample harder as the queue fills
+    sampler.load = ingest.load
+if sampler is not None and STORE_BACKEND == "remote":
+    # Every worker keeps its own buckets for the sessions they all share
+    sampler.workers = SAMPLER_WORKERS
+
+@asynccontextmanager
+async def lifespan(app):
+    async with mcp_app.lifespan(app):
+        try:
+            yield
+        finally:
+            if ingest is not None:
+                await ingest.stop()
+            analysis_pool.shutdown()
+
 # Pass the subapp lifespan into the parent app so subapp lifespan runs.
-app = FastAPI(lifespan=mcp_app.lifespan)
+app = FastAPI(lifespan=lifespan)
 
 # Mount the MCP HTTP server at /sse (supports SSE protocol)
 app.mount("/sse", mcp_app)
 
+# Compressed request bodies on the ingest routes, gzip responses on queries.
+# Streaming routes (/events, /sse) are left alone.
+app.add_middleware(
+    CompressionMiddleware,
+    ingest_paths=("/debug-data", "/debug-data/batch"),
+    query_paths=("/debug-data", "/debug-data/window")
+)
+
+# Request/event/tool metrics for /metrics; outermost so latency includes compression
+if METRICS_ENABLED:
+    instrument_store(debug_store)
+    if ingest is not None:
+        instrument_ingest(ingest)
+    app.add_middleware(MetricsMiddleware)
+
+# Newly stored debug events are pushed to /events subscribers
+debug_store.add_listener(event_stream.publish)
+
+@app.get("/events")
+async def stream_events(
+    request: Request,
+    session_id: str | None = None,
+    event_type: str | None = None,
+    last_event_id: int | None = Query(None, ge=0),
+):
+    """Server-Sent Events stream of debug events as they are ingested.
+
+    Each SSE `id` is the event's sequence number. Reconnecting clients send
+    `Last-Event-ID` (or `?last_event_id=`) to replay what they missed from a
+    bounded buffer; a `gap` event signals that older events were already
+    dropped.
+    """
+    header = request.headers.get("last-event-id")
+    if last_event_id is None and header:
+        try:
+            last_event_id = int(header)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Last-Event-ID must be an integer")
+    return StreamingResponse(
+        event_stream.stream(request, session_id, _csv(event_type), last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/debug-data")
-async def receive_debug_data(request: Request):
-    global current_session
-    data = await request.json()
-    
-    # Check if this is a new session starting
-    if "sessionStarted" in data:
-        # Create a new session object
-        session_info = data["sessionStarted"]
-        current_session = {
-            "id": session_info.get("id"),
-            "name": session_info.get("name"),
-            "type": session_info.get("type"),
-            "startTime": session_info.get("timestamp"),
-            "endTime": None,
-            "events": [],
-            "variables": {},
-            "stack": [],
-            "breakpoints": []
+async def receive_debug_data(request: Request, wait: bool = False):
+    """Store one envelope.
+
+    The envelope is queued and answered with 202 and its reserved `seq`;
+    pass `?wait=true` to get the usual 200 once it has been applied (and
+    is visible to queries). A malformed envelope is refused with 400
+    before it is queued. 429 with Retry-After means the queue is full.
+    An envelope over its session's rate limit is answered with status
+    `dropped` and no seq.
+    """
+    body = await request.body()
+    try:
+        data = loads(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON: {e}")
+    if not isinstance(data, dict):
+        raise HTTPException(status_code=400, detail="Body must be a JSON object")
+    error = envelope_error(data)
+    if error is not None:
+        raise HTTPException(status_code=400, detail=error)
+    items = _sample([(0, data, len(body))])
+    if not items or items[-1][0] is None:
+        return {"status": "dropped", "seq": None, "sessionsCount": debug_store.session_count}
+    if ingest is None:
+        seq = _raise_failed((await run_in_threadpool(_apply_now, items))[-1])
+        return {"status": "ok", "seq": seq, "sessionsCount": debug_store.session_count}
+
+    seq, applied = _enqueue([(item, size) for _, item, size in items], wait)[-1]
+    if applied is None:
+        return JSONResponse(
+            status_code=202,
+            content={"status": "accepted", "seq": seq, "sessionsCount": debug_store.session_count}
+        )
+    seq = _raise_failed(await applied)
+    return {"status": "ok", "seq": seq, "sessionsCount": debug_store.session_count}
+
+@app.post("/debug-data/batch")
+async def receive_debug_data_batch(request: Request, wait: bool = False):
+    """Apply many envelopes in one request.
+
+    Accepts either a JSON array of envelopes or newline-delimited JSON
+    (one envelope per line). Envelopes are applied in order; a bad item is
+    reported in its result slot without aborting the rest of the batch.
+    Valid envelopes are queued like single posts (202, per-item `accepted`
+    with the reserved `seq`) unless `?wait=true` is passed. Envelopes over
+    their session's rate limit are reported as `dropped`.
+    """
+    body = await request.body()
+    content_type = request.headers.get("content-type", "")
+    items = _parse_batch(body, ndjson="ndjson" in content_type)
+
+    results = []
+    valid = []
+    for item, size in items:
+        error = str(item) if isinstance(item, Exception) else envelope_error(item)
+        if error is not None:
+            results.append({"status": "error", "error": error})
+        else:
+            valid.append((len(results), item, size))
+            results.append({"status": "dropped"})
+    valid = _sample(valid)
+
+    if ingest is None:
+        applied = await run_in_threadpool(_apply_now, valid)
+    else:
+        queued = _enqueue([(item, size) for _, item, size in valid], wait)
+        if not wait:
+            for (index, _, _), (seq, _) in zip(valid, queued):
+                if index is not None:
+                    results[index] = {"status": "accepted", "seq": seq}
+        applied = [await future for _, future in queued] if wait else []
+
+    for (index, _, _), seq in zip(valid, applied):
+        if index is None:
+            continue
+        if isinstance(seq, Exception):
+            results[index] = {"status": "error", "error": f"could not be applied: {seq}"}
+        elif seq is None:
+            results[index] = {"status": "ignored", "error": "no active session"}
+        else:
+            results[index] = {"status": "ok", "seq": seq}
+
+    # Dropped envelopes were handled as configured; don't have clients retry them
+    accepted = sum(result["status"] in ("ok", "accepted", "dropped") for result in results)
+    return JSONResponse(
+        status_code=202 if ingest is not None and not wait else 200,
+        content={
+            "status": "accepted" if ingest is not None and not wait else "ok",
+            "accepted": accepted,
+            "rejected": len(results) - accepted,
+            "results": results,
+            "sessionsCount": debug_store.session_count
         }
-        debug_sessions.append(current_session)
-        current_session["events"].append({"type": "sessionStarted", "data": session_info})
-    
-    # If we have a current session, add events to it
-    elif current_session:
-        if "sessionTerminated" in data:
-            current_session["endTime"] = data["sessionTerminated"].get("timestamp")
-            current_session["events"].append({"type": "sessionTerminated", "data": data["sessionTerminated"]})
-            current_session = None
-        elif "debugEvent" in data:
-            current_session["events"].append({"type": "debugEvent", "data": data["debugEvent"]})
-        elif "variables" in data:
-            current_session["variables"] = data["variables"]
-            current_session["events"].append({"type": "variables", "data": data["variables"]})
-        elif "stack" in data:
-            current_session["stack"] = data["stack"]
-            current_session["events"].append({"type": "stack", "data": data["stack"]})
-        elif "breakpoints" in data:
-            current_session["breakpoints"] = data["breakpoints"]
-            current_session["events"].append({"type": "breakpoints", "data": data["breakpoints"]})
-    
-    # Also update the legacy debug_data structure with latest values
-    debug_data.update(data)
-    debug_data["sessions"] = debug_sessions
-    
-    return {"status": "ok", "sessionsCount": len(debug_sessions)}
+    )
+
+def _sample(items: list) -> list:
+    """Apply the ingest rate limits to (index, envelope, size) triples. Dropped
+    envelopes are left out; summaries of dropped output are inserted with
+    index and size None."""
+    if sampler is None:
+        return items
+    sampled = []
+    for index, item, size in items:
+        for kept in sampler.filter(item):
+            sampled.append((index, item, size) if kept is item else (None, kept, None))
+    return sampled
+
+def _apply_now(items: list) -> list:
+    """Apply (index, envelope, size) triples synchronously, in a worker
+    thread: the remote store blocks on its socket. Returns each seq, or the
+    exception its envelope raised, like the ingest queue."""
+    applied = []
+    for _, item, size in items:
+        try:
+            applied.append(debug_store.apply(item, size=size))
+        except Exception as e:
+            logger.exception("Failed to apply envelope")
+            applied.append(e)
+    return applied
+
+def _raise_failed(seq):
+    """The seq of a single post, raising the exception it failed with."""
+    if isinstance(seq, Exception):
+        raise seq
+    return seq
+
+def _enqueue(items: list, wait: bool) -> list:
+    """Queue (envelope, size) pairs, turning a full queue into 429."""
+    try:
+        return ingest.submit(items, wait=wait)
+    except QueueFull as e:
+        raise HTTPException(
+            status_code=429,
+            detail="Ingest queue is full; retry later",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+def _parse_batch(body: bytes, ndjson: bool) -> list:
+    """Split a batch body into (envelope or per-line parse error, encoded size) pairs."""
+    try:
+        text = body.decode("utf-8")
+    except UnicodeDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Batch body is not UTF-8: {e}")
+    if not ndjson and text.lstrip().startswith("["):
+        try:
+            items = loads(text)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON array: {e}")
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="Batch body must be a JSON array")
+        return [(item, None) for item in items]
+
+    items = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        try:
+            items.append((loads(line), len(line)))
+        except ValueError as e:
+            items.append((e, None))
+    return items
 
 @app.get("/debug-data")
-async def send_debug_data():
-    return {
-        **debug_data,
-        "sessions": debug_sessions,
-        "totalSessions": len(debug_sessions)
-    }
+async def send_debug_data(
+    session_id: str | None = None,
+    event_type: str | None = None,
+    since: int = Query(0, ge=0),
+    limit: int | None = Query(None, ge=1),
+    fields: str | None = None,
+    session_fields: str | None = None,
+):
+    """Return stored debug data, optionally filtered, paged and projected.
+
+    `event_type`, `fields` and `session_fields` take comma-separated lists.
+    Poll incrementally by passing the previous response's `nextCursor` as
+    `since`.
+    """
+    # Off the event loop: the store may read an evicted session from disk
+    content = await run_in_threadpool(
+        debug_store.query_json,
+        session_id=session_id,
+        event_types=_csv(event_type),
+        since=since,
+        limit=limit,
+        fields=_csv(fields),
+        session_fields=_csv(session_fields)
+    )
+    return Response(content=content, media_type="application/json")
+
+@app.get("/debug-data/window")
+async def send_debug_data_window(
+    start: str | None = None,
+    end: str | None = None,
+    session_id: str | None = None,
+    event_type: str | None = None,
+    limit: int | None = Query(None, ge=1),
+    before_termination: float | None = Query(None, ge=0),
+):
+    """Events whose timestamps fall between `start` and `end`, in time order.
+
+    Bounds are ISO 8601 timestamps or epoch seconds and may be left open.
+    `before_termination=N` returns the last N seconds of a terminated session
+    (`session_id`, or the most recently terminated one) instead.
+    """
+    try:
+        return await run_in_threadpool(
+            debug_store.events_between,
+            start=start,
+            end=end,
+            session_id=session_id,
+            event_types=_csv(event_type),
+            limit=limit,
+            before_termination=before_termination
+        )
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown debug session: {session_id}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/debug-data/archive")
+async def export_archive(background_tasks: BackgroundTasks, session_id: str | None = None):
+    """Download sessions (comma-separated `session_id`, default all) as a
+    binary archive; see archive.py for the format."""
+    session_ids = _csv(session_id)
+    try:
+        # Writing the file (and reading spilled values) is done off the loop
+        path = await run_in_threadpool(_export, sorted(session_ids) if session_ids else None)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=f"Unknown debug session: {e.args[0]}")
+    background_tasks.add_task(os.unlink, path)
+    return FileResponse(path, media_type="application/octet-stream", filename="sessions.mcparchive",
+                        background=background_tasks)
+
+def _export(session_ids: list | None) -> str:
+    fd, path = tempfile.mkstemp(suffix=".mcparchive")
+    os.close(fd)
+    try:
+        debug_store.export_archive(path, session_ids)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path
+
+@app.post("/debug-data/archive")
+async def import_archive(request: Request):
+    """Upload an archive; its sessions become read-only sessions whose
+    events are read from the saved file on demand. The file is deleted
+    once all of them have been evicted."""
+    length = request.headers.get("content-length")
+    if MAX_ARCHIVE_BYTES and length and length.isdigit() and int(length) > MAX_ARCHIVE_BYTES:
+        raise HTTPException(status_code=413, detail=f"Archive is larger than {MAX_ARCHIVE_BYTES} bytes")
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    path = os.path.abspath(os.path.join(ARCHIVE_DIR, f"{uuid.uuid4().hex}.mcparchive"))
+    try:
+        await _save_upload(request, path)
+        return await run_in_threadpool(debug_store.import_archive, path, owned=True)
+    except ValueError as e:
+        # Not an archive (raised as ArchiveError, or ValueError from the store daemon)
+        _remove(path)
+        raise HTTPException(status_code=400, detail=str(e))
+    except BaseException:
+        _remove(path)
+        raise
+
+# Upload bytes gathered before each write to disk
+UPLOAD_WRITE_BYTES = 1024 * 1024
+
+async def _save_upload(request: Request, path: str):
+    """Stream the request body to `path`, writing from a worker thread and
+    answering 413 once it exceeds MAX_ARCHIVE_BYTES."""
+    f = await run_in_threadpool(open, path, "wb")
+    try:
+        received = 0
+        pending = []
+        pending_bytes = 0
+        async for chunk in request.stream():
+            received += len(chunk)
+            if MAX_ARCHIVE_BYTES and received > MAX_ARCHIVE_BYTES:
+                raise HTTPException(status_code=413, detail=f"Archive is larger than {MAX_ARCHIVE_BYTES} bytes")
+            pending.append(chunk)
+            pending_bytes += len(chunk)
+            if pending_bytes >= UPLOAD_WRITE_BYTES:
+                await run_in_threadpool(f.write, b"".join(pending))
+                pending = []
+                pending_bytes = 0
+        if pending:
+            await run_in_threadpool(f.write, b"".join(pending))
+    finally:
+        await run_in_threadpool(f.close)
+
+def _remove(path: str):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+def _csv(value: str | None) -> set | None:
+    if not value:
+        return None
+    return {part.strip() for part in value.split(",") if part.strip()}
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    health = {"status": "healthy", "store": await run_in_threadpool(debug_store.stats)}
+    if ingest is not None:
+        health["ingest"] = ingest.stats()
+    if sampler is not None:
+        health["sampling"] = sampler.stats()
+    health["analysis"] = analysis_pool.stats()
+    return health
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics in the text exposition format"""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled (MCP_DEBUG_METRICS=0)")
+    # Scrape hooks read store stats: a socket round trip with the remote
+    # store, the store lock otherwise
+    content = await run_in_threadpool(REGISTRY.render)
+    return Response(content=content, media_type=METRICS_CONTENT_TYPE)
 
 @app.get("/mcp-info")
 async def mcp_info():
@@ -98,17 +443,49 @@ async def mcp_info():
         "mcp_server": mcp.name,
         "sse_endpoint": "/sse",
         "tools": [
+            {
+                "name": "list_sessions",
+                "description": "Lists the debug sessions known to the server"
+            },
+            {
+                "name": "get_session_summary",
+                "description": "Event counts, stop reasons, exceptions, output totals, duration and top stop locations of a session"
+            },
             {
                 "name": "get_variables",
-                "description": "Returns the latest debug variables"
+                "description": "Returns the latest debug variables (optionally for one session_id, as of event at_seq)"
+            },
+            {
+                "name": "get_variable",
+                "description": "Returns one variable by path (e.g. locals.df.columns[3]), bounded by depth, items and bytes"
+            },
+            {
+                "name": "get_variable_history",
+                "description": "When a variable changed, or when a condition on it (e.g. total < 0) started to hold"
             },
             {
                 "name": "get_stack_trace",
-                "description": "Returns the current stack trace"
+                "description": "Returns the current stack trace (optionally for one session_id)"
             },
             {
                 "name": "get_breakpoints",
-                "description": "Returns the current breakpoints"
+                "description": "Returns the current breakpoints (optionally for one session_id)"
+            },
+            {
+                "name": "get_console_output",
+                "description": "Tail, line range or regex search over a session's console output"
+            },
+            {
+                "name": "compare_sessions",
+                "description": "Summary, variable, stack and breakpoint differences between two sessions (runs in a worker pool)"
+            },
+            {
+                "name": "diff_snapshots",
+                "description": "Variables changed, added or removed between two events of a session (runs in a worker pool)"
+            },
+            {
+                "name": "get_events_in_window",
+                "description": "Events between two timestamps, or the last N seconds before a session terminated"
             }
         ],
         "usage": {
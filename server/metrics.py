@@ -0,0 +1,239 @@
+# Prometheus metrics
+# A small in-process registry rendered in the Prometheus text format at
+# /metrics: request latency per route, stored events by type and session,
+# store gauges and MCP tool calls. Recording is a dict lookup and an integer
+# increment, cheap enough to leave on.
+import bisect
+import os
+import time
+
+from fastmcp.server.middleware import Middleware
+
+METRICS_ENABLED = os.environ.get("MCP_DEBUG_METRICS", "1") not in ("0", "false", "no")
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with a fixed set of label names."""
+
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def inc(self, labels=(), amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def remove(self, labels):
+        self.values.pop(labels, None)
+
+    def samples(self):
+        for labels, value in list(self.values.items()):
+            yield self.name, _labels(self.labelnames, labels), value
+
+
+class Histogram:
+    """Cumulative histogram with fixed bucket upper bounds."""
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.values = {}  # labels -> [per-bucket counts (+Inf last), sum]
+
+    def observe(self, value, labels=()):
+        entry = self.values.get(labels)
+        if entry is None:
+            entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def samples(self):
+        for labels, (counts, total) in list(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", _labels(self.labelnames, labels, [("le", _number(bound))]), cumulative
+            yield f"{self.name}_sum", _labels(self.labelnames, labels), total
+            yield f"{self.name}_count", _labels(self.labelnames, labels), cumulative
+
+
+class Gauge:
+    """Value read from `function()` at scrape time."""
+
+    type = "gauge"
+
+    def __init__(self, name, documentation, function, kind="gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.function = function
+        self.type = kind
+
+    def samples(self):
+        yield self.name, "", self.function()
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.before_scrape = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        for hook in self.before_scrape:
+            hook()
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "debug_http_requests_total", "HTTP requests by method, route and status", ("method", "route", "status")))
+HTTP_LATENCY = REGISTRY.register(Histogram(
+    "debug_http_request_duration_seconds", "HTTP request latency by method and route (streams excluded)",
+    ("method", "route")))
+EVENTS = REGISTRY.register(Counter(
+    "debug_events_total", "Stored debug events by envelope type and DAP event name", ("type", "event")))
+SESSION_EVENTS = REGISTRY.register(Counter(
+    "debug_session_events_total", "Stored debug events per retained session", ("session_id",)))
+TOOL_CALLS = REGISTRY.register(Counter(
+    "mcp_tool_calls_total", "MCP tool calls by tool and outcome", ("tool", "status")))
+TOOL_DURATION = REGISTRY.register(Histogram(
+    "mcp_tool_duration_seconds", "MCP tool call duration", ("tool",)))
+
+
+def count_event(session_id, event):
+    """Store listener counting every stored event."""
+    name = event["data"].get("event", "") if event["type"] == "debugEvent" else ""
+    EVENTS.inc((event["type"], name))
+    SESSION_EVENTS.inc((session_id,))
+
+
+def instrument_store(store):
+    """Count `store`'s events and expose its stats as gauges."""
+    store.add_listener(count_event)
+
+    stats = {}
+
+    def before_scrape():
+        # Only retained sessions keep a series, so label cardinality stays
+        # bounded by the store's retention limits
+        retained = set(store.session_ids())
+        for labels in [labels for labels in SESSION_EVENTS.values if labels[0] not in retained]:
+            SESSION_EVENTS.remove(labels)
+        stats.clear()
+        stats.update(store.stats())
+
+    REGISTRY.before_scrape.append(before_scrape)
+    gauges = (
+        ("debug_store_sessions", "Sessions held in memory", "sessions", "gauge"),
+        ("debug_store_running_sessions", "Sessions not yet terminated", "runningSessions", "gauge"),
+        ("debug_store_events", "Events held in memory", "events", "gauge"),
+        ("debug_store_approx_bytes", "Approximate payload bytes held in memory", "approxBytes", "gauge"),
+        ("debug_store_evicted_events_total", "Events dropped by retention", "evictedEvents", "counter"),
+        ("debug_store_evicted_sessions_total", "Sessions evicted by retention", "evictedSessions", "counter"),
+        ("debug_store_expired_sessions_total", "Sessions expired by TTL", "expiredSessions", "counter"),
+        ("debug_store_last_seq", "Sequence number of the newest stored event", "lastSeq", "gauge"),
+        ("debug_store_spilled_bytes", "Bytes of payload values spilled to the blob store", "spilledBytes", "gauge"),
+    )
+    for name, documentation, key, kind in gauges:
+        REGISTRY.register(Gauge(name, documentation, lambda key=key: stats.get(key, 0), kind))
+
+
+def instrument_ingest(pipeline):
+    """Expose the ingest queue's depth and rejections."""
+    REGISTRY.register(Gauge(
+        "debug_ingest_queue_depth", "Envelopes queued but not yet applied", lambda: pipeline.stats()["queued"]))
+    REGISTRY.register(Gauge(
+        "debug_ingest_rejected_total", "Envelopes refused with 429 because the queue was full",
+        lambda: pipeline.stats()["rejectedFull"], "counter"))
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request counts and latency per route.
+
+    Routes are labelled by their template (`/debug-data`, the `/sse` mount),
+    never the raw path, so unknown URLs collapse into `unmatched`. Streaming
+    responses are counted but kept out of the latency histogram.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+        streaming = False
+
+        async def send_recorded(message):
+            nonlocal status, streaming
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                streaming = any(
+                    name == b"content-type" and value.startswith(b"text/event-stream")
+                    for name, value in message.get("headers", ())
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_recorded)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_REQUESTS.inc((scope["method"], route, str(status)))
+            if not streaming:
+                HTTP_LATENCY.observe(time.perf_counter() - started, (scope["method"], route))
+
+
+class ToolMetrics(Middleware):
+    """FastMCP middleware recording tool call counts and durations."""
+
+    async def on_call_tool(self, context, call_next):
+        tool = context.message.name
+        started = time.perf_counter()
+        status = "error"
+        try:
+            result = await call_next(context)
+            status = "ok"
+            return result
+        finally:
+            TOOL_CALLS.inc((tool, status))
+            TOOL_DURATION.observe(time.perf_counter() - started, (tool,))
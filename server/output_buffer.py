@@ -0,0 +1,187 @@
+# Console output buffers
+# `output` debug events are coalesced per session and category into an
+# append-only text buffer with a line-offset index, so tails, line ranges and
+# regex searches don't have to walk the event log. Text is dropped when the
+# event it came from is evicted from the log, so a retained event's offsets
+# always resolve.
+import bisect
+import re
+from array import array
+
+MAX_SEARCH_RESULTS = 1000
+
+
+class OutputBuffer:
+    """Append-only text of one output category with a line-offset index.
+
+    Offsets and line numbers are absolute: they keep counting from the first
+    character/line ever appended even after old text has been dropped.
+    """
+
+    def __init__(self):
+        self.chunks = []                  # text chunks (one per event), oldest first
+        self.chunk_starts = []            # absolute offset of each chunk
+        self.start = 0                    # absolute offset of the oldest retained char
+        self.end = 0                      # absolute offset after the last char
+        self.line_starts = array("q", [0])  # absolute offset where each line starts
+        self.line_seqs = array("q", [0])    # seq of the event that started each line
+        self.first_line = 0               # absolute number of line_starts[0]
+
+    def append(self, text, seq):
+        """Append `text` from event `seq`; returns its (start, end) offsets."""
+        start = self.end
+        if self.line_starts[-1] == start:
+            # The pending (empty) last line begins with this event
+            self.line_seqs[-1] = seq
+        self.chunks.append(text)
+        self.chunk_starts.append(start)
+        self.end = start + len(text)
+        newline = text.find("\n")
+        while newline != -1:
+            self.line_starts.append(start + newline + 1)
+            self.line_seqs.append(seq)
+            newline = text.find("\n", newline + 1)
+        return start, self.end
+
+    def release(self, end):
+        """Drop the text of events evicted from the log, i.e. the chunks
+        that start before offset `end`, where the last evicted event's text
+        ended."""
+        drop = bisect.bisect_left(self.chunk_starts, end)
+        if drop == 0:
+            return
+        del self.chunks[:drop]
+        del self.chunk_starts[:drop]
+        self.start = self.chunk_starts[0] if self.chunks else self.end
+        # Keep the line that straddles the new start; it begins mid-line now
+        first = bisect.bisect_right(self.line_starts, self.start) - 1
+        if first > 0:
+            del self.line_starts[:first]
+            del self.line_seqs[:first]
+            self.first_line += first
+        self.line_starts[0] = self.start
+
+    def text(self, start, end):
+        """Retained text between two absolute offsets."""
+        start = max(start, self.start)
+        end = min(end, self.end)
+        if start >= end:
+            return ""
+        index = bisect.bisect_right(self.chunk_starts, start) - 1
+        parts = []
+        while index < len(self.chunks) and self.chunk_starts[index] < end:
+            chunk_start = self.chunk_starts[index]
+            chunk = self.chunks[index]
+            parts.append(chunk[max(start - chunk_start, 0):end - chunk_start])
+            index += 1
+        return "".join(parts)
+
+    @property
+    def line_count(self):
+        """Absolute number of lines, not counting an empty trailing line."""
+        count = self.first_line + len(self.line_starts)
+        return count - 1 if self.line_starts[-1] == self.end else count
+
+    def lines(self, first, last):
+        """(line number, seq, text) for absolute lines first..last-1."""
+        first = max(first, self.first_line)
+        last = min(last, self.line_count)
+        result = []
+        for number in range(first, last):
+            index = number - self.first_line
+            line_end = self.line_starts[index + 1] - 1 if index + 1 < len(self.line_starts) else self.end
+            result.append((number, self.line_seqs[index], self.text(self.line_starts[index], line_end)))
+        return result
+
+    def search(self, regex, max_results):
+        """Lines matching a compiled `regex`, oldest first, at most `max_results`."""
+        text = self.text(self.start, self.end)
+        result = []
+        last_line = None
+        for match in regex.finditer(text):
+            index = bisect.bisect_right(self.line_starts, self.start + match.start()) - 1
+            if index == last_line:
+                continue
+            last_line = index
+            result.extend(self.lines(self.first_line + index, self.first_line + index + 1))
+            if len(result) >= max_results:
+                break
+        return result
+
+
+class OutputLog:
+    """A session's console output, one OutputBuffer per category."""
+
+    def __init__(self):
+        self.buffers = {}
+
+    def append(self, category, text, seq):
+        buffer = self.buffers.get(category)
+        if buffer is None:
+            buffer = self.buffers[category] = OutputBuffer()
+        return buffer.append(text, seq)
+
+    def text(self, category, start, end):
+        buffer = self.buffers.get(category)
+        return buffer.text(start, end) if buffer is not None else ""
+
+    def release(self, category, end):
+        buffer = self.buffers.get(category)
+        if buffer is not None:
+            buffer.release(end)
+
+    def _selected(self, category):
+        if category is None:
+            return list(self.buffers.items())
+        return [(category, self.buffers[category])] if category in self.buffers else []
+
+    def read(self, category=None, tail=None, start_line=None, end_line=None, pattern=None,
+             ignore_case=False, max_results=MAX_SEARCH_RESULTS):
+        """Read console lines.
+
+        `pattern` returns matching lines (regex search), `start_line`/`end_line`
+        a range of line numbers, and otherwise the last `tail` lines. Without a
+        `category` all categories are interleaved in the order they were
+        printed. Line numbers are per category.
+        """
+        max_results = min(max_results, MAX_SEARCH_RESULTS)
+        selected = self._selected(category)
+        truncated = False
+        if pattern is not None:
+            regex = re.compile(pattern, re.MULTILINE | (re.IGNORECASE if ignore_case else 0))
+            found = sorted(
+                (seq, name, number, text)
+                for name, buffer in selected
+                for number, seq, text in buffer.search(regex, max_results + 1)
+            )
+            truncated = len(found) > max_results
+            found = found[:max_results]
+        elif start_line is not None or end_line is not None:
+            first = start_line or 0
+            last = end_line if end_line is not None else first + max_results
+            truncated = last - first > max_results
+            last = min(last, first + max_results)
+            found = sorted(
+                (seq, name, number, text)
+                for name, buffer in selected
+                for number, seq, text in buffer.lines(first, last)
+            )
+        else:
+            count = min(tail or 50, max_results)
+            found = sorted(
+                (seq, name, number, text)
+                for name, buffer in selected
+                for number, seq, text in buffer.lines(buffer.line_count - count, buffer.line_count)
+            )[-count:]
+
+        return {
+            "lines": [
+                {"category": name, "line": number, "seq": seq, "text": text}
+                for seq, name, number, text in found
+            ],
+            "truncated": truncated,
+            "categories": {
+                name: {"firstLine": buffer.first_line, "lineCount": buffer.line_count}
+                for name, buffer in self.buffers.items()
+            }
+        }
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Shared store daemon and its client.
+
+With `uvicorn --workers N` every worker would otherwise hold its own
+disjoint store. Instead, one daemon process owns the real store (memory or
+sqlite) and serves it over a Unix domain socket; each worker talks to it
+through RemoteStore, which implements the DebugStore interface. The daemon
+applies requests one at a time, so all workers see a single consistent
+sequence of events, and it pushes every stored event to subscribed workers
+so their /events streams and listeners see ingest from any worker.
+
+    python remote_store.py --socket /tmp/mcp-debug-store.sock --backend memory
+    MCP_DEBUG_STORE=remote python -m uvicorn main:app --workers 4 ...
+
+Wire format: frames of a 1-byte kind, a 4-byte big-endian length and the
+payload. Requests and most replies are JSON objects; `query_json` replies
+carry the already-encoded response bytes so they are not encoded twice.
+"""
+import argparse
+import asyncio
+import os
+import re
+import signal
+import socket
+import struct
+import sys
+import threading
+import time
+
+from blobs import blob_store
+from fast_json import dumps, loads
+from store import DebugStore
+from variable_view import PathNotFound
+
+SOCKET_PATH = os.environ.get("MCP_DEBUG_STORE_SOCKET", "/tmp/mcp-debug-store.sock")
+# Seconds a worker waits for the daemon before failing the request
+CALL_TIMEOUT = float(os.environ.get("MCP_DEBUG_STORE_TIMEOUT", 30))
+# Pending push bytes after which a lagging subscriber is disconnected
+MAX_SUBSCRIBER_BUFFER = 64 * 1024 * 1024
+
+_HEADER = struct.Struct("!BI")
+JSON, RAW = 0, 1
+
+# DebugStore methods served by the daemon; anything added to the interface
+# is forwarded automatically. Reserved sequence numbers only stay in order
+# within one process, so workers ingest synchronously instead.
+LOCAL_METHODS = {"add_listener", "close", "reserve_seq"}
+REMOTE_METHODS = tuple(
+    name for name, value in vars(DebugStore).items()
+    if callable(value) and not name.startswith("_") and name not in LOCAL_METHODS
+)
+
+# Exceptions re-raised in the worker with the same type; others become RuntimeError
+_ERRORS = {cls.__name__: cls for cls in (KeyError, ValueError, TypeError, PathNotFound, re.error)}
+
+
+def _plain(value):
+    # Sets (event types, field projections) travel as JSON arrays
+    return sorted(value) if isinstance(value, (set, frozenset)) else value
+
+
+def _frame(kind, payload):
+    return _HEADER.pack(kind, len(payload)) + payload
+
+
+def _error(exc):
+    # Subclasses (ArchiveError) travel as the nearest type the worker knows
+    name = next((cls.__name__ for cls in type(exc).__mro__ if cls.__name__ in _ERRORS), type(exc).__name__)
+    return {"error": {"type": name, "args": [str(arg) for arg in exc.args]}}
+
+
+def _raise(error):
+    cls = _ERRORS.get(error["type"])
+    if cls is None:
+        raise RuntimeError(f"Store daemon error {error['type']}: {' '.join(error['args'])}")
+    raise cls(*error["args"])
+
+
+# -- daemon -----------------------------------------------------------------
+
+class StoreDaemon:
+    """Serve `store` to RemoteStore clients on a Unix domain socket."""
+
+    def __init__(self, store, path=SOCKET_PATH):
+        self.store = store
+        self.path = path
+        self.subscribers = set()
+        store.add_listener(self._push)
+
+    def _push(self, session_id, event):
+        if not self.subscribers:
+            return
+        event = {**event, "data": blob_store.materialize(event["data"])}
+        frame = _frame(JSON, dumps({"sessionId": session_id, "event": event}))
+        for writer in list(self.subscribers):
+            if writer.transport.get_write_buffer_size() > MAX_SUBSCRIBER_BUFFER:
+                # The worker stopped reading; it reconnects and resubscribes
+                self.subscribers.discard(writer)
+                writer.close()
+            else:
+                writer.write(frame)
+
+    def _dispatch(self, request):
+        method = request["method"]
+        args = request.get("args", ())
+        kwargs = request.get("kwargs", {})
+        if method == "apply":
+            return JSON, {"result": [self.store.apply(*args, **kwargs), self.store.session_count]}
+        if method not in REMOTE_METHODS:
+            return JSON, {"error": {"type": "ValueError", "args": [f"Unknown store method: {method}"]}}
+        result = getattr(self.store, method)(*args, **kwargs)
+        if isinstance(result, bytes):
+            return RAW, result
+        return JSON, {"result": result}
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                kind, length = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+                request = loads(await reader.readexactly(length))
+                if request["method"] == "subscribe":
+                    self.subscribers.add(writer)
+                    continue
+                try:
+                    kind, reply = self._dispatch(request)
+                except Exception as e:
+                    kind, reply = JSON, _error(e)
+                writer.write(_frame(kind, reply if kind == RAW else dumps(reply)))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.subscribers.discard(writer)
+            writer.close()
+
+    async def serve(self):
+        if os.path.exists(self.path):
+            if _reachable(self.path):
+                raise RuntimeError(f"A store daemon is already listening on {self.path}")
+            os.unlink(self.path)
+        server = await asyncio.start_unix_server(self._handle, path=self.path)
+        stop = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            asyncio.get_running_loop().add_signal_handler(signum, stop.set)
+        print(f"Store daemon listening on {self.path}", file=sys.stderr)
+        try:
+            async with server:
+                await stop.wait()
+        finally:
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+
+def _reachable(path):
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        probe.close()
+
+
+# -- client -----------------------------------------------------------------
+
+class _Connection:
+    def __init__(self, path, timeout):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(path)
+
+    def send(self, message):
+        self.sock.sendall(_frame(JSON, dumps(message)))
+
+    def receive(self):
+        kind, length = _HEADER.unpack(self._read(_HEADER.size))
+        return kind, self._read(length)
+
+    def _read(self, size):
+        chunks = []
+        while size:
+            chunk = self.sock.recv(min(size, 1 << 20))
+            if not chunk:
+                raise ConnectionError("Store daemon closed the connection")
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b"".join(chunks)
+
+    def close(self):
+        self.sock.close()
+
+
+class RemoteStore(DebugStore):
+    """DebugStore proxy talking to a StoreDaemon over a Unix domain socket.
+
+    Calls block on the socket, so async callers run them in a worker
+    thread. Each concurrent call takes its own connection from a pool,
+    opened lazily. A call whose connection fails before its request is
+    fully sent (the daemon restarted) is retried once on a new connection;
+    one that fails while waiting for the reply is not, as the daemon may
+    have applied it. Listeners
+    are fed by a background thread that subscribes to the daemon's event
+    pushes, so they run off the event loop.
+    """
+
+    def __init__(self, path=SOCKET_PATH, timeout=CALL_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self._idle = []               # pooled connections not in use
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._subscriber = None
+        self._session_count = 0
+        self._closed = False
+
+    def _call(self, method, args=(), kwargs=None):
+        request = {
+            "method": method,
+            "args": [_plain(value) for value in args],
+            "kwargs": {key: _plain(value) for key, value in (kwargs or {}).items()}
+        }
+        for attempt in (0, 1):
+            connection = None
+            sent = False
+            try:
+                connection = self._acquire()
+                connection.send(request)
+                sent = True
+                kind, payload = connection.receive()
+                break
+            except OSError as e:
+                if connection is not None:
+                    connection.close()
+                    connection = None
+                # After a daemon restart the pooled connections are dead too
+                with self._lock:
+                    stale, self._idle = self._idle, []
+                for other in stale:
+                    other.close()
+                # Only a request that never reached the daemon is sent again:
+                # once the whole frame is out it may have been applied
+                if attempt or sent:
+                    raise ConnectionError(f"Store daemon unavailable at {self.path}: {e}") from e
+            finally:
+                if connection is not None:
+                    self._release(connection)
+        if kind == RAW:
+            return payload
+        reply = loads(payload)
+        if "error" in reply:
+            _raise(reply["error"])
+        return reply["result"]
+
+    def _acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return _Connection(self.path, self.timeout)
+
+    def _release(self, connection):
+        with self._lock:
+            if not self._closed:
+                self._idle.append(connection)
+                return
+        connection.close()
+
+    def apply(self, data, size=None, seq=None):
+        seq, self._session_count = self._call("apply", (data,), {"size": size, "seq": seq})
+        return seq
+
+    @property
+    def session_count(self):
+        return self._session_count
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+        if self._subscriber is None:
+            self._subscriber = threading.Thread(target=self._subscribe_loop, name="remote-store-events", daemon=True)
+            self._subscriber.start()
+
+    def _subscribe_loop(self):
+        delay = 0.1
+        while not self._closed:
+            try:
+                connection = _Connection(self.path, None)
+            except OSError:
+                time.sleep(delay)
+                delay = min(delay * 2, 5.0)
+                continue
+            delay = 0.1
+            try:
+                connection.send({"method": "subscribe"})
+                while not self._closed:
+                    _, payload = connection.receive()
+                    push = loads(payload)
+                    for listener in self._listeners:
+                        listener(push["sessionId"], push["event"])
+            except (OSError, ConnectionError):
+                pass
+            finally:
+                connection.close()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+
+def _remote_method(name):
+    def method(self, *args, **kwargs):
+        return self._call(name, args, kwargs)
+    method.__name__ = name
+    method.__doc__ = getattr(DebugStore, name).__doc__
+    return method
+
+
+for _name in REMOTE_METHODS:
+    if _name not in vars(RemoteStore):
+        setattr(RemoteStore, _name, _remote_method(_name))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared debug store daemon for multi-worker deployments")
+    parser.add_argument("--socket", default=SOCKET_PATH, help=f"Unix socket path (default {SOCKET_PATH})")
+    parser.add_argument("--backend", default="memory", choices=("memory", "sqlite"), help="Store backend to serve")
+    args = parser.parse_args()
+
+    import store
+    backend = store.debug_store if store.STORE_BACKEND == args.backend else store.create_store(args.backend)
+    try:
+        asyncio.run(StoreDaemon(backend, args.socket).serve())
+    finally:
+        backend.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
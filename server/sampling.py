@@ -0,0 +1,250 @@
+# Ingest rate limiting and sampling
+# A debuggee printing in a tight loop can send tens of thousands of `output`
+# events a second. Every session gets a token bucket per event kind (DAP
+# event name, or envelope type for variables/stack): events beyond the rate
+# are dropped before they are queued or stored, so a noisy program costs a
+# parse and a bucket check per event. While the bucket is empty it refills at
+# the configured rate, which keeps an evenly spaced sample of the stream; the
+# rate shrinks as the ingest queue fills. Dropped output text is merged (up
+# to MERGE_CHARS) into one summary `output` event per category and second.
+# Lifecycle events are never dropped. Buckets live in each worker process:
+# with several uvicorn workers sharing the remote store, every worker gets an
+# equal share of the rates (MCP_DEBUG_WORKERS).
+import os
+import time
+from collections import OrderedDict
+
+SAMPLING_ENABLED = os.environ.get("MCP_DEBUG_SAMPLING", "1") not in ("0", "false", "no")
+
+
+def parse_limits(spec):
+    """`output=1000,default=200` -> {"output": 1000.0, "default": 200.0}
+    (events per second per session; 0 means unlimited)."""
+    limits = {}
+    for part in spec.split(","):
+        if part.strip():
+            key, _, rate = part.partition("=")
+            limits[key.strip()] = float(rate)
+    return limits
+
+
+# Events per second per session and event kind; `default` covers other kinds
+RATE_LIMITS = parse_limits(os.environ.get("MCP_DEBUG_RATE_LIMITS", "output=1000,default=500"))
+# A bucket holds this many seconds' worth of events, for short bursts
+BURST_SECONDS = 2.0
+# Dropped output text kept in a summary event, per category
+MERGE_CHARS = 4096
+# Output categories summarized per session; drops in others are only counted
+MAX_CATEGORIES = 16
+# Seconds between summary events of one session and category
+SUMMARY_INTERVAL = 1.0
+# Rates never shrink below this fraction when the ingest queue fills up
+MIN_RATE_FACTOR = 0.1
+# Sessions whose drop counters are kept
+MAX_TRACKED_SESSIONS = 1000
+# Worker processes ingesting into one store; uvicorn reads WEB_CONCURRENCY too
+WORKERS = max(int(os.environ.get("MCP_DEBUG_WORKERS", os.environ.get("WEB_CONCURRENCY", 1))), 1)
+
+# Never dropped: session lifecycle, breakpoint changes and these DAP events
+LOSSLESS_TYPES = frozenset({"sessionStarted", "sessionTerminated", "breakpoints"})
+LOSSLESS_EVENTS = frozenset({"stopped", "exited", "terminated", "initialized", "process", "exception"})
+
+
+def classify(envelope):
+    """(session id or None, event kind) of an ingest envelope."""
+    if "sessionStarted" in envelope:
+        return _id(envelope["sessionStarted"], "id"), "sessionStarted"
+    if "sessionTerminated" in envelope:
+        return _id(envelope["sessionTerminated"], "id"), "sessionTerminated"
+    if "debugEvent" in envelope:
+        event = envelope["debugEvent"]
+        name = event.get("event") if isinstance(event, dict) else None
+        return _id(event, "sessionId"), name if isinstance(name, str) else "debugEvent"
+    for key in ("variables", "stack", "breakpoints"):
+        if key in envelope:
+            return envelope.get("sessionId"), key
+    return envelope.get("sessionId"), None
+
+
+def _id(data, key):
+    return data.get(key) if isinstance(data, dict) else None
+
+
+class _Bucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens, now):
+        self.tokens = tokens
+        self.updated = now
+
+    def take(self, rate, capacity, now):
+        self.tokens = min(capacity, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class _Suppressed:
+    """Output dropped from one category since its last summary event."""
+
+    __slots__ = ("events", "lines", "chars", "text", "merged", "shown", "timestamp", "since")
+
+    def __init__(self, now):
+        self.events = self.lines = self.chars = self.merged = self.shown = 0
+        self.text = []
+        self.timestamp = None
+        self.since = now
+
+
+class _SessionState:
+    __slots__ = ("buckets", "suppressed", "dropped", "dropped_lines", "dropped_chars")
+
+    def __init__(self):
+        self.buckets = {}               # event kind -> _Bucket
+        self.suppressed = {}            # output category -> _Suppressed
+        self.dropped = {}               # event kind -> events dropped
+        self.dropped_lines = 0
+        self.dropped_chars = 0
+
+
+class Sampler:
+    """Per-session, per-event-kind token buckets in front of the store.
+
+    `load` returns how full ingest is (0..1); rates are scaled down by it.
+    Rates are divided by `workers`, the number of processes sampling the
+    same sessions: each one only sees the envelopes posted to it.
+    """
+
+    def __init__(self, limits=RATE_LIMITS, load=None, clock=time.monotonic, workers=1):
+        self.limits = dict(limits)
+        self.load = load
+        self.clock = clock
+        self.workers = workers
+        self._sessions = OrderedDict()  # session id -> _SessionState, least recently active first
+        self.counters = {"dropped": 0, "summaries": 0}
+
+    def filter(self, envelope):
+        """The envelopes to store for `envelope`: none when it is dropped,
+        otherwise it, preceded by summaries of output dropped before it."""
+        session_id, kind = classify(envelope)
+        if kind in LOSSLESS_TYPES or kind in LOSSLESS_EVENTS:
+            state = self._sessions.get(session_id)
+            released = self._summaries(session_id, state, force=True) if state is not None else []
+            if kind == "sessionTerminated" and state is not None:
+                # Keep the counters; the buckets are no longer needed
+                state.buckets.clear()
+            return released + [envelope]
+
+        rate = self.limits.get(kind, self.limits.get("default", 0)) if kind is not None else 0
+        state = self._state(session_id) if rate else self._sessions.get(session_id)
+        if not rate:
+            return (self._summaries(session_id, state) if state is not None else []) + [envelope]
+
+        now = self.clock()
+        rate /= self.workers
+        if self.load is not None:
+            rate *= max(MIN_RATE_FACTOR, 1.0 - self.load())
+        bucket = state.buckets.get(kind)
+        if bucket is None:
+            bucket = state.buckets[kind] = _Bucket(rate * BURST_SECONDS, now)
+        if bucket.take(rate, max(rate * BURST_SECONDS, 1.0), now):
+            return self._summaries(session_id, state) + [envelope]
+
+        state.dropped[kind] = state.dropped.get(kind, 0) + 1
+        self.counters["dropped"] += 1
+        if kind == "output":
+            self._suppress(state, envelope["debugEvent"], now)
+        return []
+
+    def _state(self, session_id):
+        state = self._sessions.get(session_id)
+        if state is None:
+            state = self._sessions[session_id] = _SessionState()
+            if len(self._sessions) > MAX_TRACKED_SESSIONS:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(session_id)
+        return state
+
+    def _suppress(self, state, event, now):
+        body = event.get("body")
+        text = body.get("output") if isinstance(body, dict) else None
+        if not isinstance(text, str):
+            return
+        lines = text.count("\n")
+        state.dropped_lines += lines
+        state.dropped_chars += len(text)
+        category = body.get("category") or "console"
+        suppressed = state.suppressed.get(category)
+        if suppressed is None:
+            if len(state.suppressed) >= MAX_CATEGORIES:
+                return
+            suppressed = state.suppressed[category] = _Suppressed(now)
+        suppressed.events += 1
+        suppressed.lines += lines
+        suppressed.chars += len(text)
+        if suppressed.merged < MERGE_CHARS:
+            room = MERGE_CHARS - suppressed.merged
+            if len(text) > room:
+                # Keep whole lines when there are any, and stop merging so
+                # that the text shown stays contiguous
+                cut = text.rfind("\n", 0, room)
+                text = text[:cut + 1] if cut >= 0 or suppressed.merged else text[:room]
+                suppressed.merged = MERGE_CHARS
+            else:
+                suppressed.merged += len(text)
+            suppressed.text.append(text)
+            suppressed.shown += len(text)
+        if event.get("timestamp") is not None:
+            suppressed.timestamp = event["timestamp"]
+
+    def _summaries(self, session_id, state, force=False):
+        if not state.suppressed:
+            return []
+        now = self.clock()
+        released = []
+        for category, suppressed in list(state.suppressed.items()):
+            if not force and now - suppressed.since < SUMMARY_INTERVAL:
+                continue
+            del state.suppressed[category]
+            text = "".join(suppressed.text)
+            if text and not text.endswith("\n"):
+                text += "\n"
+            text += (f"[{suppressed.events} output events ({suppressed.lines} lines, {suppressed.chars} "
+                     f"characters) were dropped by rate limiting; {suppressed.shown} characters are shown above]\n")
+            event = {
+                "event": "output",
+                "body": {"category": category, "output": text},
+                "sampled": {"droppedEvents": suppressed.events, "droppedLines": suppressed.lines,
+                            "droppedCharacters": suppressed.chars}
+            }
+            if session_id is not None:
+                event["sessionId"] = session_id
+            if suppressed.timestamp is not None:
+                event["timestamp"] = suppressed.timestamp
+            released.append({"debugEvent": event})
+            self.counters["summaries"] += 1
+        return released
+
+    def dropped(self, session_id):
+        """Drop counters of a session: events by kind, output lines and characters."""
+        state = self._sessions.get(session_id)
+        if state is None:
+            return {"events": {}, "total": 0, "outputLines": 0, "outputCharacters": 0}
+        # Called from tool threads while ingest updates the counters
+        events = dict(state.dropped)
+        return {
+            "events": events,
+            "total": sum(events.values()),
+            "outputLines": state.dropped_lines,
+            "outputCharacters": state.dropped_chars
+        }
+
+    def stats(self):
+        return {"limits": self.limits, "workers": self.workers, "trackedSessions": len(self._sessions),
+                **self.counters}
+
+
+sampler = Sampler() if SAMPLING_ENABLED else None
@@ -0,0 +1,176 @@
+# Delta-encoded variable snapshots
+# A stepping session sends a full `variables` payload on every stop, but most of
+# it is unchanged from the previous stop. VariableHistory keeps periodic
+# keyframes plus path-level deltas in between, and rebuilds snapshots by path
+# copying so unchanged subtrees are shared between snapshots rather than copied.
+import bisect
+import json
+from collections import OrderedDict
+
+from blobs import same_value
+
+# A full snapshot is stored at least this often
+KEYFRAME_INTERVAL = 32
+# Rebuilt snapshots kept around for repeated reads
+SNAPSHOT_CACHE_SIZE = 8
+
+_DELETED = object()
+
+
+def diff(old, new, path=()):
+    """Path-level changes turning `old` into `new`: a list of (path, value) pairs,
+    with value _DELETED for removed keys. Dicts, and lists of unchanged length,
+    are descended into; any other changed value is replaced whole."""
+    if old is new:
+        return []
+    if isinstance(old, dict) and isinstance(new, dict):
+        changes = []
+        for key, value in new.items():
+            if key not in old:
+                changes.append((path + (key,), value))
+            else:
+                changes.extend(diff(old[key], value, path + (key,)))
+        for key in old:
+            if key not in new:
+                changes.append((path + (key,), _DELETED))
+        return changes
+    if isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        changes = []
+        for index, (old_item, new_item) in enumerate(zip(old, new)):
+            changes.extend(diff(old_item, new_item, path + (index,)))
+        return changes
+    return [] if same_value(old, new) else [(path, new)]
+
+
+def _copy(container):
+    return list(container) if isinstance(container, list) else dict(container)
+
+
+def patch(base, changes):
+    """Apply `changes` to `base` without mutating it.
+
+    Only the containers along changed paths are copied; every other subtree is
+    shared with `base`.
+    """
+    if any(not path for path, _ in changes):
+        # The root itself was replaced
+        return next(value for path, value in changes if not path)
+    root = _copy(base)
+    copied = {id(root)}
+    for path, value in changes:
+        node = root
+        for key in path[:-1]:
+            child = node[key]
+            if id(child) not in copied:
+                child = _copy(child)
+                copied.add(id(child))
+                node[key] = child
+            node = child
+        if value is _DELETED:
+            node.pop(path[-1], None)
+        else:
+            node[path[-1]] = value
+    return root
+
+
+def _changes_size(changes):
+    return sum(
+        len(json.dumps(list(path), default=str)) + (0 if value is _DELETED else len(json.dumps(value, default=str)))
+        for path, value in changes
+    )
+
+
+class VariableHistory:
+    """Per-session history of `variables` snapshots, indexed by event seq."""
+
+    def __init__(self, keyframe_interval=KEYFRAME_INTERVAL):
+        self.keyframe_interval = keyframe_interval
+        self.seqs = []       # seq of each snapshot, ascending
+        self.entries = []    # (is_keyframe, snapshot or changes), parallel to seqs
+        self.latest = None
+        self._since_keyframe = 0
+        self._cache = OrderedDict()
+
+    def __len__(self):
+        return len(self.seqs)
+
+    def record(self, seq, variables, spill=None):
+        """Store a new snapshot and return (shared snapshot, approx stored bytes).
+
+        The returned snapshot equals `variables` but reuses the previous
+        snapshot's objects wherever nothing changed. `spill(value, top)`, if
+        given, is applied to what is new: the first snapshot, or each changed
+        value (`top` when it replaces the whole snapshot).
+        """
+        changes = diff(self.latest, variables) if self.latest is not None else None
+        if spill is not None:
+            if changes is None:
+                variables = spill(variables, True)
+            else:
+                changes = [(path, value if value is _DELETED else spill(value, not path)) for path, value in changes]
+        keyframe = changes is None or self._since_keyframe + 1 >= self.keyframe_interval
+        if changes is not None:
+            snapshot = patch(self.latest, changes) if changes else self.latest
+        else:
+            snapshot = variables
+
+        if keyframe:
+            self.entries.append((True, snapshot))
+            self._since_keyframe = 0
+            size = len(json.dumps(snapshot, default=str))
+        else:
+            self.entries.append((False, changes))
+            self._since_keyframe += 1
+            size = _changes_size(changes)
+        self.seqs.append(seq)
+        self.latest = snapshot
+        return snapshot, size
+
+    def snapshot(self, seq):
+        """The snapshot recorded at `seq`, rebuilt from the nearest keyframe."""
+        index = bisect.bisect_left(self.seqs, seq)
+        if index == len(self.seqs) or self.seqs[index] != seq:
+            raise KeyError(seq)
+        return self._at_index(index)
+
+    def as_of(self, seq):
+        """The most recent snapshot recorded at or before `seq` (None if none)."""
+        index = bisect.bisect_right(self.seqs, seq) - 1
+        if index < 0:
+            return None
+        return self._at_index(index)
+
+    def _at_index(self, index):
+        if index == len(self.seqs) - 1:
+            return self.latest
+        seq = self.seqs[index]
+        if seq in self._cache:
+            self._cache.move_to_end(seq)
+            return self._cache[seq]
+
+        start = index
+        while not self.entries[start][0]:
+            start -= 1
+        snapshot = self.entries[start][1]
+        for _, changes in self.entries[start + 1:index + 1]:
+            if changes:
+                snapshot = patch(snapshot, changes)
+
+        self._cache[seq] = snapshot
+        if len(self._cache) > SNAPSHOT_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return snapshot
+
+    def trim(self, min_seq):
+        """Forget snapshots before `min_seq` that no retained snapshot depends on."""
+        cut = 0
+        for index in range(1, len(self.seqs)):
+            if self.seqs[index] > min_seq:
+                break
+            if self.entries[index][0]:
+                cut = index
+        if cut:
+            del self.seqs[:cut]
+            del self.entries[:cut]
+            for seq in [seq for seq in self._cache if seq < self.seqs[0]]:
+                del self._cache[seq]
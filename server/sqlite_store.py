@@ -0,0 +1,337 @@
+# SQLite-backed debug store
+# The in-memory MemoryStore stays the working set; every stored event is also
+# written to a SQLite database (WAL mode) by a background thread, so history
+# survives restarts and is not limited by the in-memory retention caps.
+import itertools
+import json
+import logging
+import queue
+import sqlite3
+import threading
+
+from blobs import blob_store
+from event_log import format_timestamp
+from store import DebugSession, MemoryStore, debug_data
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    type TEXT,
+    start_time TEXT,
+    end_time TEXT,
+    terminated INTEGER NOT NULL DEFAULT 0,
+    first_seq INTEGER NOT NULL,
+    last_seq INTEGER NOT NULL,
+    event_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    type TEXT NOT NULL,
+    event TEXT,
+    timestamp TEXT,
+    size INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_events_session_type ON events (session_id, type, seq);
+CREATE INDEX IF NOT EXISTS idx_events_type ON events (type, seq);
+CREATE INDEX IF NOT EXISTS idx_events_timestamp ON events (timestamp);
+CREATE INDEX IF NOT EXISTS idx_sessions_last_seq ON sessions (last_seq);
+"""
+
+# Writer batching: commit after this many events or when the queue runs dry
+WRITE_BATCH_SIZE = 500
+
+_STOP = object()
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteStore(MemoryStore):
+    """MemoryStore with write-behind persistence to SQLite.
+
+    Ingest only enqueues rows; a writer thread drains the queue and commits
+    them in batched transactions, so disk latency never blocks the event
+    loop. Reads are served from memory; a session that was evicted from
+    memory (or predates a restart) is loaded back from disk when a query
+    asks for it, never on ingest. Queries that may hit the disk are run off
+    the event loop by the HTTP handlers.
+
+    On startup the most recently active sessions are recovered into memory,
+    within the usual retention limits, and the sequence counter resumes after
+    the last persisted event. Events still queued when the process dies are
+    lost; everything committed survives thanks to WAL.
+    """
+
+    def __init__(self, path, **retention):
+        super().__init__(**retention)
+        self.path = path
+        self._queue = queue.Queue()
+        # Highest seq committed by the writer
+        self._written_seq = 0
+        # id -> (session, store seq at eviction), for evicted sessions that
+        # may still have events queued for the writer
+        self._evicted = {}
+        # Events the writer failed to persist
+        self.write_errors = 0
+        self._reader = self._connect()
+        self._reader_lock = threading.Lock()
+        self._reader.executescript(SCHEMA)
+        self._recover()
+        self._writer = threading.Thread(target=self._write_loop, name="sqlite-store-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # -- writes -----------------------------------------------------------
+
+    def _on_event(self, session, event, size):
+        # The event's time as the session resolved it (its envelope
+        # timestamp, or the receive time on the client's clock)
+        self._queue.put((session.id, event, size, session.log.time(len(session.log) - 1)))
+
+    def _write_loop(self):
+        conn = self._connect()
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            while item is not _STOP and len(batch) < WRITE_BATCH_SIZE:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(item)
+            stop = batch[-1] is _STOP
+            if stop:
+                batch.pop()
+            try:
+                if batch:
+                    with conn:
+                        self._write_batch(conn, batch)
+            except Exception:
+                # The batch is lost, but the writer keeps going and flush()
+                # still returns
+                self.write_errors += len(batch)
+                logger.exception("Failed to persist %d events", len(batch))
+            finally:
+                if batch:
+                    self._written_seq = max(item[1]["seq"] for item in batch)
+                for _ in range(len(batch) + stop):
+                    self._queue.task_done()
+            if stop:
+                conn.close()
+                return
+
+    def _write_batch(self, conn, batch):
+        rows = []
+        touched = {}
+        for session_id, event, size, at in batch:
+            data = event["data"]
+            if event["type"] == "sessionStarted":
+                # A restarted session id replaces whatever was stored before,
+                # including rows queued earlier in this batch
+                conn.executemany("INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                rows = []
+                conn.execute("DELETE FROM events WHERE session_id = ?", (session_id,))
+                conn.execute(
+                    "INSERT OR REPLACE INTO sessions (id, name, type, start_time, first_seq, last_seq) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (session_id, data.get("name"), data.get("type"), data.get("timestamp"), event["seq"], event["seq"])
+                )
+                touched[session_id] = (event["seq"], 1)
+            else:
+                if event["type"] == "sessionTerminated":
+                    conn.execute(
+                        "UPDATE sessions SET end_time = ?, terminated = 1 WHERE id = ?",
+                        (data.get("timestamp"), session_id)
+                    )
+                touched[session_id] = (event["seq"], touched.get(session_id, (0, 0))[1] + 1)
+            rows.append((
+                event["seq"], session_id, event["type"],
+                data.get("event") if event["type"] == "debugEvent" else None,
+                format_timestamp(at) if at == at else None,
+                size, json.dumps(blob_store.materialize(data), default=str)
+            ))
+        conn.executemany("INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        conn.executemany(
+            "UPDATE sessions SET last_seq = ?, event_count = event_count + ? WHERE id = ?",
+            [(seq, count, session_id) for session_id, (seq, count) in touched.items()]
+        )
+
+    def flush(self):
+        """Block until every queued event has been committed."""
+        self._queue.join()
+
+    def close(self):
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join()
+        with self._reader_lock:
+            self._reader.close()
+
+    # -- reads / recovery -------------------------------------------------
+
+    def _read(self, sql, params=()):
+        with self._reader_lock:
+            return self._reader.execute(sql, params).fetchall()
+
+    def _load_session(self, row):
+        """Rebuild a DebugSession from its sessions row and newest events."""
+        session_id, name, type_, start_time, end_time, terminated = row
+        session = DebugSession(
+            {"id": session_id, "name": name, "type": type_, "timestamp": start_time},
+            self.max_events_per_session
+        )
+        session.end_time = end_time
+        session.terminated = bool(terminated)
+
+        limit = self.max_events_per_session or -1
+        rows = self._read(
+            "SELECT seq, type, timestamp, size, data FROM events WHERE session_id = ? ORDER BY seq DESC LIMIT ?",
+            (session_id, limit)
+        )
+        for seq, event_type, timestamp, size, data in reversed(rows):
+            session.add_event({"type": event_type, "data": json.loads(data), "seq": seq}, size, timestamp=timestamp)
+
+        # The latest state may be older than the retained events
+        for event_type in ("variables", "stack", "breakpoints"):
+            latest = self._read(
+                "SELECT data FROM events WHERE session_id = ? AND type = ? ORDER BY seq DESC LIMIT 1",
+                (session_id, event_type)
+            )
+            if latest:
+                setattr(session, event_type, json.loads(latest[0][0]))
+        return session
+
+    def _recover(self):
+        (max_seq,) = self._read("SELECT MAX(seq) FROM events")[0]
+        if max_seq is None:
+            return
+        self._seq = itertools.count(max_seq + 1)
+        self.last_seq = self._written_seq = max_seq
+
+        limit = self.max_sessions or -1
+        rows = self._read(
+            "SELECT id, name, type, start_time, end_time, terminated, first_seq FROM sessions "
+            "ORDER BY last_seq DESC LIMIT ?",
+            (limit,)
+        )
+        # Re-create them in start order so "most recent running" stays correct
+        rows.sort(key=lambda row: row[-1])
+        recovered = [self._load_session(row[:-1]) for row in rows]
+        for session in recovered:
+            self._add_session(session)
+        self.enforce_retention()
+
+        # Seed the legacy "latest values" from the most recent session
+        if recovered:
+            latest = recovered[-1]
+            debug_data.update({
+                "variables": latest.variables,
+                "stack": latest.stack,
+                "breakpoints": latest.breakpoints
+            })
+
+    def _preload(self, session_id):
+        # Unlocked peeks: a stale answer only leaves the work to _lookup
+        if session_id is None or session_id in self.sessions or self._unwritten(session_id):
+            return
+        session = self._read_session(session_id)
+        if session is None:
+            return
+        with self._lock:
+            # Skipped if the session was started, or evicted with events not
+            # on disk yet, while it was being read
+            if session_id not in self.sessions and not self._unwritten(session_id):
+                self._cache_loaded(session)
+
+    def _unwritten(self, session_id):
+        """Whether `session_id` was evicted with events the writer has not
+        committed yet."""
+        entry = self._evicted.get(session_id)
+        return entry is not None and entry[1] > self._written_seq
+
+    def _lookup(self, session_id):
+        session = self.get_session(session_id)
+        if session is not None or session_id is None:
+            return session
+        # Sessions evicted from memory are read back from disk, normally by
+        # _preload; one whose events the writer has not committed yet is
+        # served from memory instead of waiting for the queue to drain
+        self._forget_written()
+        session = self._evicted.pop(session_id, (None, None))[0]
+        if session is None:
+            session = self._read_session(session_id)
+            if session is None:
+                return None
+        self._cache_loaded(session)
+        return session
+
+    def _read_session(self, session_id):
+        rows = self._read(
+            "SELECT id, name, type, start_time, end_time, terminated FROM sessions WHERE id = ?",
+            (session_id,)
+        )
+        return self._load_session(rows[0]) if rows else None
+
+    def _cache_loaded(self, session):
+        # Cached in memory until the next ingest enforces retention. It is
+        # not running even if it never terminated: envelopes without an id
+        # keep going to the sessions that were started in this process.
+        self._add_session(session)
+        self._running.pop(session.id, None)
+
+    def _add_session(self, session):
+        self._evicted.pop(session.id, None)
+        super()._add_session(session)
+
+    def _remove_session(self, session_id):
+        session = super()._remove_session(session_id)
+        self._forget_written()
+        self._evicted[session_id] = (session, self.last_seq)
+        return session
+
+    def _forget_written(self):
+        """Drop evicted sessions whose events are all on disk by now."""
+        written = self._written_seq
+        for session_id, (_, last_seq) in list(self._evicted.items()):
+            if last_seq <= written:
+                del self._evicted[session_id]
+
+    def list_sessions(self):
+        sessions = super().list_sessions()
+        # Read without the store lock, like every disk access
+        rows = self._read(
+            "SELECT id, name, type, start_time, end_time, terminated, event_count "
+            "FROM sessions ORDER BY first_seq"
+        )
+        known = {session["id"] for session in sessions}
+        archived = [
+            {
+                "id": session_id,
+                "name": name,
+                "type": type_,
+                "startTime": start_time,
+                "endTime": end_time,
+                "terminated": bool(terminated),
+                "active": False,
+                "eventCount": event_count,
+                # Only counted for sessions in memory
+                "stops": None,
+                "exceptions": None
+            }
+            for session_id, name, type_, start_time, end_time, terminated, event_count in rows
+            if session_id not in known
+        ]
+        return archived + sessions
+
+    def stats(self):
+        stats = super().stats()
+        stats["pendingWrites"] = self._queue.qsize()
+        stats["writeErrors"] = self.write_errors
+        return stats
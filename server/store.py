@@ -1,7 +1,26 @@
 # Simple in-memory store
-# Structure: List of debug sessions with all their events
-debug_sessions = []
-current_session = None
+# Structure: debug sessions indexed by id, each holding a bounded ring buffer of events
+import atexit
+import heapq
+import inspect
+import itertools
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Sequence
+from functools import wraps
+
+from blobs import blob_store
+from event_log import NO_TIME, EventLog, format_timestamp, parse_timestamp, to_epoch
+from fast_json import dumps
+from frames import StackRef, StackTable, freeze
+from output_buffer import OutputLog
+from snapshots import VariableHistory
+from summary import SessionSummary
+from variable_changes import VariableChanges
+from variable_view import DEFAULT_MAX_BYTES, DEFAULT_MAX_DEPTH, DEFAULT_MAX_ITEMS, bounded_view
 
 # Also maintain the old structure for backward compatibility
 debug_data = {
@@ -10,3 +29,991 @@ debug_data = {
     "breakpoints": [],
     "sessions": []
 }
+
+# Envelope keys understood by the ingest endpoints, in dispatch order
+ENVELOPE_KEYS = ("sessionStarted", "sessionTerminated", "debugEvent", "variables", "stack", "breakpoints")
+# JSON types each envelope value may have
+_ENVELOPE_SHAPES = {
+    "sessionStarted": (dict,),
+    "sessionTerminated": (dict,),
+    "debugEvent": (dict,),
+    "variables": (dict,),
+    # A list of frames, or the DAP stackTrace response body holding one
+    "stack": (list, dict),
+    "breakpoints": (list,),
+}
+_SHAPE_NAMES = {dict: "an object", list: "an array"}
+
+# Retention limits, overridable from the environment. A limit of 0 disables it.
+MAX_EVENTS_PER_SESSION = int(os.environ.get("MCP_DEBUG_MAX_EVENTS_PER_SESSION", 10000))
+MAX_SESSIONS = int(os.environ.get("MCP_DEBUG_MAX_SESSIONS", 100))
+SESSION_TTL_SECONDS = float(os.environ.get("MCP_DEBUG_SESSION_TTL", 24 * 60 * 60))
+MAX_BYTES = int(os.environ.get("MCP_DEBUG_MAX_BYTES", 256 * 1024 * 1024))
+
+# Session versions: a session takes the next number whenever its events change,
+# so (id, version) identifies its content for caches
+_versions = itertools.count(1)
+
+# Distinct output event shapes shared per session; rarer shapes are stored as is
+MAX_SHARED_OUTPUT_META = 1024
+
+
+def estimate_size(data):
+    """Approximate stored size of a payload: the length of its JSON encoding."""
+    return len(json.dumps(data, default=str))
+
+
+_NO_TIMESTAMP = object()
+
+
+def _event_seq(event):
+    return event["seq"]
+
+
+def envelope_error(data):
+    """Why `data` can't be applied as an ingest envelope, or None if it can.
+    Ingest checks this before it takes a sequence number."""
+    if not isinstance(data, dict) or not any(key in data for key in ENVELOPE_KEYS):
+        return "not a debug data envelope"
+    for key, shapes in _ENVELOPE_SHAPES.items():
+        if key in data and not isinstance(data[key], shapes):
+            return f"{key} must be {' or '.join(_SHAPE_NAMES[shape] for shape in shapes)}"
+    for key, id_key in (("sessionStarted", "id"), ("sessionTerminated", "id"), ("debugEvent", "sessionId")):
+        if key in data and not isinstance(data[key].get(id_key), (str, type(None))):
+            return f"{key}.{id_key} must be a string"
+    if not isinstance(data.get("sessionId"), (str, type(None))):
+        return "sessionId must be a string"
+    return None
+
+
+def envelope_timestamp(data):
+    """The client timestamp of an ingest envelope: that of its
+    sessionStarted/sessionTerminated/debugEvent object, or the top-level
+    `timestamp` sent alongside variables/stack/breakpoints. Payloads are
+    never looked into, so a variable named `timestamp` is just a variable."""
+    for key in ("sessionStarted", "sessionTerminated", "debugEvent"):
+        if key in data:
+            inner = data[key]
+            return inner.get("timestamp") if isinstance(inner, dict) else None
+    return data.get("timestamp")
+
+
+def _locked(method):
+    """Run a store method under the store's lock. The session it names by
+    `session_id`, if any, is passed to `_preload` before the lock is taken."""
+    parameters = list(inspect.signature(method).parameters)
+    index = parameters.index("session_id") - 1 if "session_id" in parameters else None
+
+    @wraps(method)
+    def locked(self, *args, **kwargs):
+        if index is not None:
+            self._preload(args[index] if len(args) > index else kwargs.get("session_id"))
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return locked
+
+
+def event_matches(event, event_types):
+    return event["type"] in event_types or (
+        event["type"] == "debugEvent" and event["data"].get("event") in event_types
+    )
+
+
+class EventsView(Sequence):
+    """Read-only list view of a session's events in their `{"type", "data",
+    "seq"}` shape, materialized from the columnar log on access."""
+
+    def __init__(self, session):
+        self._session = session
+
+    def __len__(self):
+        return len(self._session.log)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self._session.event_at(index) for index in range(len(self))[position]]
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError("event index out of range")
+        return self._session.event_at(position)
+
+
+class DebugSession:
+    """A single debug session and everything captured for it."""
+
+    # Imported archives are read-only; envelopes routed to them are ignored
+    read_only = False
+
+    def __init__(self, session_info, max_events=None):
+        self.id = session_info.get("id")
+        self.name = session_info.get("name")
+        self.type = session_info.get("type")
+        self.start_time = session_info.get("timestamp")
+        self.end_time = None
+        self.terminated = False
+        # Epoch seconds of the sessionTerminated event
+        self.ended_at = None
+        # Columnar ring buffer: once full, appending drops the oldest event
+        self.log = EventLog(max_events)
+        self.bytes = 0
+        self.evicted_events = 0
+        # `variables` events keep no payload in the log; the snapshots
+        # live here as keyframes + deltas and are rebuilt on read
+        self.variable_history = VariableHistory()
+        # Variable path -> the `variables` events that changed it
+        self.variable_changes = VariableChanges()
+        # Text of `output` events; their payload keeps only offsets into it
+        self.output = OutputLog()
+        # `stack` payloads are StackRefs into this table of interned frames
+        self.stacks = StackTable()
+        self.variables = {}
+        self.stack = []
+        self.breakpoints = []
+        # Counts, stop reasons, output totals... of every event received
+        self.summary = SessionSummary()
+        # `output` event fields other than the text and timestamp, shared
+        # between events that only differ in those
+        self._output_meta = {}
+        # Encoded to_dict() output by session_fields, kept while nothing changes
+        self._encoded = {}
+        # Values of this session's payloads spilled to the blob store
+        self.spilled = 0
+        # Client clock minus server clock, as of the last timestamped envelope
+        self._clock_offset = 0.0
+        self.version = next(_versions)
+
+    @property
+    def events(self):
+        return EventsView(self)
+
+    def add_event(self, event, size, received=None, timestamp=None):
+        """Append an event and return the bytes released by ring-buffer overflow.
+
+        For `variables` events, `event["data"]` is replaced by the structurally
+        shared snapshot, which also becomes the session's current variables.
+        Payloads of `size` at least the blob store's threshold have their
+        large values spilled, and `event["data"]` is replaced by what is
+        stored (see `materialized`).
+
+        The event's time is `timestamp`, the ISO 8601 time its envelope was
+        sent at by the client. Events sent without one are placed on the
+        client's clock too: `received` (server epoch seconds) shifted by the
+        offset between the clocks seen on the last timestamped event, else
+        the previous event's time.
+        """
+        data = event["data"]
+        event_type = event["type"]
+        name = None
+        spill = blob_store.min_bytes and size >= blob_store.min_bytes
+        if event_type == "variables":
+            previous = self.variable_history.latest
+            snapshot, size = self.variable_history.record(event["seq"], data, self._spill if spill else None)
+            event["data"] = self.variables = snapshot
+            payload = None
+        elif event_type == "debugEvent" and isinstance(data, dict):
+            name = data.get("event")
+            body = data.get("body")
+            if name == "output" and isinstance(body, dict) and isinstance(body.get("output"), str):
+                category = body.get("category") or "console"
+                start, end = self.output.append(category, body["output"], event["seq"])
+                payload = (self._share_output_meta(data), data.get("timestamp", _NO_TIMESTAMP), category, start, end)
+            else:
+                payload = self._spill(data) if spill else data
+                if payload is not data:
+                    event["data"] = payload
+                    size = estimate_size(payload)
+        elif event_type == "stack":
+            payload, added = self.stacks.intern(data, size)
+            if payload is None:
+                payload = data
+            else:
+                size = added
+        else:
+            payload = data
+
+        sent = timestamp
+        timestamp = parse_timestamp(sent)
+        if timestamp is not None:
+            if received is not None:
+                self._clock_offset = timestamp - received
+        elif received is not None:
+            timestamp = received + self._clock_offset
+        else:
+            timestamp = self.log.time(len(self.log) - 1) if len(self.log) else NO_TIME
+
+        if event_type == "sessionTerminated":
+            self.ended_at = timestamp
+        elif event_type == "variables":
+            self.variable_changes.record(event["seq"], timestamp, previous, snapshot)
+        self.summary.record(event_type, name, data, timestamp, event["seq"])
+        self._encoded.clear()
+        self.version = next(_versions)
+        released = 0
+        evicted = self.log.append(event["seq"], event_type, name, timestamp, size, payload)
+        if evicted is not None:
+            released = evicted[2]
+            self.evicted_events += 1
+            self._released(evicted)
+        self.bytes += size - released
+        return released
+
+    def drop_oldest_event(self):
+        """Discard the oldest event and return its size."""
+        evicted = self.log.popleft()
+        released = evicted[2]
+        self.bytes -= released
+        self._encoded.clear()
+        self.version = next(_versions)
+        self.evicted_events += 1
+        self._released(evicted)
+        return released
+
+    def _spill(self, value, top=True):
+        stored = blob_store.spill(value, top)
+        if stored is not value:
+            self.spilled += 1
+        return stored
+
+    def _share_output_meta(self, data):
+        meta = {**data, "body": {key: value for key, value in data["body"].items() if key != "output"}}
+        if "timestamp" in meta:
+            meta["timestamp"] = None
+        key = freeze(meta)
+        shared = self._output_meta.get(key)
+        if shared is None:
+            if len(self._output_meta) >= MAX_SHARED_OUTPUT_META:
+                return meta
+            shared = self._output_meta[key] = meta
+        return shared
+
+    def _released(self, evicted):
+        event_type, payload, _ = evicted
+        if event_type == "debugEvent" and isinstance(payload, tuple):
+            # The evicted event's console text goes with it
+            _, _, category, _, end = payload
+            self.output.release(category, end)
+        elif event_type == "variables" and len(self.log):
+            self.variable_history.trim(self.log.first_seq)
+            self.variable_changes.trim(self.log.first_seq)
+        elif isinstance(payload, StackRef) and self.stacks.needs_compaction:
+            # Frames only referenced by evicted stacks are dropped in bulk once
+            # the frame table has grown enough to be worth rebuilding
+            log = self.log
+            self.stacks.compact(
+                payload for payload in (log.payload(index) for index in range(len(log)))
+                if isinstance(payload, StackRef)
+            )
+
+    def event_at(self, position):
+        """The event at `position` in the log, in its original
+        `{"type", "data", "seq"}` shape."""
+        log = self.log
+        event_type = log.type(position)
+        seq = log.seq(position)
+        payload = log.payload(position)
+        if event_type == "variables":
+            data = self.materialized(self.variable_history.snapshot(seq))
+        elif isinstance(payload, StackRef):
+            data = self.stacks.rebuild(payload)
+        elif event_type == "debugEvent" and isinstance(payload, tuple):
+            meta, timestamp, category, start, end = payload
+            data = {**meta, "body": {**meta["body"], "output": self.output.text(category, start, end)}}
+            if timestamp is not _NO_TIMESTAMP:
+                data["timestamp"] = timestamp
+        else:
+            data = self.materialized(payload)
+        return {"type": event_type, "data": data, "seq": seq}
+
+    def materialized(self, value):
+        """`value` (a stored payload or snapshot of this session) with its
+        spilled values read back from the blob store."""
+        return blob_store.materialize(value) if self.spilled else value
+
+    def variables_at(self, seq):
+        """Variables as of event `seq` (the latest snapshot at or before it),
+        with spilled values still referenced (see `materialized`)."""
+        snapshot = self.variable_history.as_of(seq)
+        return {} if snapshot is None else snapshot
+
+    def select_events(self, since=0, event_types=None, limit=None):
+        """Events with seq > `since`, optionally filtered by type, oldest first.
+
+        `event_types` matches either the envelope type (`debugEvent`, `stack`,
+        ...) or the DAP event name of a debugEvent (`output`, `stopped`, ...).
+        """
+        return [self.event_at(position) for position in self.log.positions(since, event_types, limit)]
+
+    def timed_events(self, start_time=None, end_time=None, event_types=None, limit=None):
+        """(time, event) pairs timestamped within [start_time, end_time], in time order."""
+        log = self.log
+        return [
+            (log.time(position), self.event_at(position))
+            for position in log.window(start_time, end_time, event_types, limit)
+        ]
+
+    def to_dict(self, events=None, fields=None):
+        """Serialize the session; `events` overrides the full event list and
+        `fields` restricts the keys returned."""
+        if events is None and (not fields or "events" in fields):
+            events = [self.event_at(position) for position in range(len(self.log))]
+        session = {
+            "id": self.id,
+            "name": self.name,
+            "type": self.type,
+            "startTime": self.start_time,
+            "endTime": self.end_time,
+            "events": events,
+            "variables": self.materialized(self.variables),
+            "stack": self.stack,
+            "breakpoints": self.breakpoints
+        }
+        if fields:
+            return {key: value for key, value in session.items() if key in fields}
+        return session
+
+    def encodable(self, fields=None):
+        """`to_dict(fields=fields)`, or its cached JSON encoding (bytes).
+
+        Only terminated sessions are cached: their payload is encoded on the
+        first request (see `remember_encoding`) and reused until an event is
+        added or evicted. Sessions with spilled values are not, as the cache
+        would hold them in memory.
+        """
+        if self.terminated and not self.spilled:
+            cached = self._encoded.get(frozenset(fields) if fields else None)
+            if cached is not None:
+                return cached
+        return self.to_dict(fields=fields)
+
+    def remember_encoding(self, fields, version, encoded):
+        """Cache `encoded`, made from `to_dict(fields=fields)` at `version`,
+        unless the session has changed since."""
+        if self.terminated and not self.spilled and self.version == version:
+            self._encoded[frozenset(fields) if fields else None] = encoded
+
+
+class DebugStore:
+    """Interface shared by the storage backends.
+
+    `receive_debug_data`, `send_debug_data` and the MCP tools only talk to the
+    store through these methods, so a backend is free to keep its data in
+    memory, on disk or elsewhere. Lookups by an unknown session id raise
+    KeyError.
+    """
+
+    def apply(self, data, size=None, seq=None):
+        """Store one ingest envelope and return its sequence number (or None)."""
+        raise NotImplementedError
+
+    def reserve_seq(self):
+        """Take the next sequence number for an envelope applied later with
+        `apply(..., seq=...)`. Reserved numbers must be applied in order."""
+        raise NotImplementedError
+
+    def query(self, session_id=None, event_types=None, since=0, limit=None, fields=None, session_fields=None):
+        """Build the GET /debug-data response."""
+        raise NotImplementedError
+
+    def query_json(self, session_id=None, event_types=None, since=0, limit=None, fields=None, session_fields=None):
+        """`query()` encoded as JSON bytes."""
+        return dumps(self.query(session_id, event_types, since, limit, fields, session_fields))
+
+    def list_sessions(self):
+        """Summaries of the known sessions, oldest first."""
+        raise NotImplementedError
+
+    def session_ids(self):
+        """Ids of the sessions currently held in memory."""
+        raise NotImplementedError
+
+    @property
+    def session_count(self):
+        """Number of sessions held in memory, as of the last apply."""
+        raise NotImplementedError
+
+    def get_variables(self, session_id=None, at_seq=None):
+        """Current variables, or as of event `at_seq` when given."""
+        raise NotImplementedError
+
+    def inspect_variables(self, session_id=None, path="", at_seq=None, max_depth=DEFAULT_MAX_DEPTH,
+                          max_items=DEFAULT_MAX_ITEMS, max_bytes=DEFAULT_MAX_BYTES):
+        """A size-bounded view of the variable at `path`; see variable_view.bounded_view."""
+        raise NotImplementedError
+
+    def get_stack(self, session_id=None):
+        raise NotImplementedError
+
+    def get_breakpoints(self, session_id=None):
+        raise NotImplementedError
+
+    def get_output(self, session_id=None, **options):
+        """Console output lines of a session; see OutputLog.read for options."""
+        raise NotImplementedError
+
+    def get_variable_history(self, session_id=None, path="", op=None, value=None, limit=None):
+        """The `variables` events that changed the variable at `path`, from an
+        index kept on ingest; with `op`/`value`, only those after which the
+        condition started to hold. See variable_changes.VariableChanges.history."""
+        raise NotImplementedError
+
+    def get_session_summary(self, session_id=None):
+        """Aggregates of a session (the active one by default): event counts,
+        stop reasons, exceptions, output totals, duration and the locations
+        it stopped at most. Maintained on ingest, so reading is cheap."""
+        raise NotImplementedError
+
+    def events_between(self, start=None, end=None, session_id=None, event_types=None, limit=None,
+                       before_termination=None):
+        """Events timestamped within [start, end], oldest first.
+
+        Bounds are ISO 8601 strings or epoch seconds; either may be omitted.
+        Without `session_id` all sessions are searched. `before_termination`
+        selects the last that many seconds of a terminated session (the most
+        recently terminated one by default) instead of start/end.
+        """
+        raise NotImplementedError
+
+    def export_archive(self, path, session_ids=None):
+        """Write sessions (all by default) to an archive file at `path`; see
+        archive.py. Returns the archived session ids, event count and size."""
+        raise NotImplementedError
+
+    def import_archive(self, path, owned=False):
+        """Load the sessions of an archive file as read-only, terminated
+        sessions whose events are read from the file on demand. Sessions with
+        the same id are replaced. The events get new sequence numbers, after
+        every event already stored. Returns the imported session ids.
+
+        With `owned`, the store deletes the file once all of its sessions
+        have been evicted."""
+        raise NotImplementedError
+
+    def stats(self):
+        raise NotImplementedError
+
+    def add_listener(self, listener):
+        """Call `listener(session_id, event)` for every event stored from now on.
+
+        Remote backends call listeners from a background thread.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Release resources; pending writes are flushed first."""
+
+
+class MemoryStore(DebugStore):
+    """In-memory debug store with sessions indexed by id.
+
+    Envelopes are routed to a session by the id they carry (`sessionStarted.id`,
+    `sessionTerminated.id`, `debugEvent.sessionId`, or a top-level `sessionId`
+    on `variables`/`stack`/`breakpoints`). Envelopes without an id go to the
+    active session: the most recently started one that is still running.
+
+    Retention is bounded: each session keeps at most `max_events_per_session`
+    events, at most `max_sessions` sessions are kept, terminated sessions expire
+    after `session_ttl` seconds, and once the approximate payload size exceeds
+    `max_bytes` the least recently used sessions are evicted (terminated ones
+    first). What was dropped is counted in `retention_stats`.
+
+    Ingest applies envelopes in its own thread while the sync MCP tools read
+    from fastmcp's threadpool, so every public method runs under one
+    re-entrant lock. Large results are copied under it and encoded or
+    written after it is released.
+    """
+
+    def __init__(self, max_events_per_session=MAX_EVENTS_PER_SESSION, max_sessions=MAX_SESSIONS,
+                 session_ttl=SESSION_TTL_SECONDS, max_bytes=MAX_BYTES):
+        self.max_events_per_session = max_events_per_session
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+        self.max_bytes = max_bytes
+
+        self._lock = threading.RLock()
+        self.sessions = {}            # id -> DebugSession, in start order
+        self._running = {}            # ids of sessions not yet terminated, in start order
+        self._lru = OrderedDict()     # ids, least recently used first
+        self._terminated_at = OrderedDict()  # id -> monotonic termination time, oldest first
+        self._seq = itertools.count(1)
+        self._listeners = []
+        self.last_seq = 0
+        self.total_bytes = 0
+        self.retention_stats = {
+            "evictedEvents": 0,
+            "evictedSessions": 0,
+            "expiredSessions": 0,
+            "evictedBytes": 0
+        }
+
+    @property
+    def active_session(self):
+        if not self._running:
+            return None
+        return self.sessions.get(next(reversed(self._running)))
+
+    def get_session(self, session_id=None):
+        """Look up a session by id, or the active session when no id is given.
+        Only sessions in memory are found; ingest routes through here."""
+        with self._lock:
+            session = self.active_session if session_id is None else self.sessions.get(session_id)
+            if session is not None:
+                self._lru.move_to_end(session.id)
+            return session
+
+    def _route(self, data):
+        if "sessionTerminated" in data:
+            session_id = data["sessionTerminated"].get("id")
+        elif "debugEvent" in data:
+            session_id = data["debugEvent"].get("sessionId")
+        else:
+            session_id = data.get("sessionId")
+        return self.get_session(session_id)
+
+    @_locked
+    def apply(self, data, size=None, seq=None):
+        """Apply a single ingest envelope.
+
+        Returns the sequence number assigned to the stored event, or None when
+        the envelope could not be attached to a session. `size` is the payload's
+        encoded length if the caller already knows it; `seq` is a number taken
+        earlier from reserve_seq().
+        """
+        event = None
+
+        # Check if this is a new session starting
+        if "sessionStarted" in data:
+            session_info = data["sessionStarted"]
+            session = DebugSession(session_info, self.max_events_per_session)
+            if session.id in self.sessions:
+                self._remove_session(session.id)
+            self._add_session(session)
+            event = {"type": "sessionStarted", "data": session_info}
+
+        # Otherwise add the event to the session it belongs to
+        else:
+            session = self._route(data)
+            if session is not None and not session.read_only:
+                if "sessionTerminated" in data:
+                    session.end_time = data["sessionTerminated"].get("timestamp")
+                    session.terminated = True
+                    event = {"type": "sessionTerminated", "data": data["sessionTerminated"]}
+                    self._running.pop(session.id, None)
+                    self._terminated_at[session.id] = time.monotonic()
+                elif "debugEvent" in data:
+                    event = {"type": "debugEvent", "data": data["debugEvent"]}
+                elif "variables" in data:
+                    event = {"type": "variables", "data": data["variables"]}
+                elif "stack" in data:
+                    session.stack = data["stack"]
+                    event = {"type": "stack", "data": data["stack"]}
+                elif "breakpoints" in data:
+                    session.breakpoints = data["breakpoints"]
+                    event = {"type": "breakpoints", "data": data["breakpoints"]}
+
+        if event is None:
+            seq = None
+        else:
+            event["seq"] = seq = seq if seq is not None else next(self._seq)
+            # An import may have taken numbers past a reserved one
+            self.last_seq = max(self.last_seq, seq)
+            if size is None:
+                size = estimate_size(event["data"])
+            before = session.bytes
+            released = session.add_event(event, size, received=time.time(), timestamp=envelope_timestamp(data))
+            self.total_bytes += session.bytes - before
+            self._count_evicted_bytes(released)
+            self._lru.move_to_end(session.id)
+            self._on_event(session, event, size)
+            for listener in self._listeners:
+                listener(session.id, event)
+            self.enforce_retention()
+
+        # Also update the legacy debug_data structure with latest values
+        debug_data.update(data)
+        if event is not None and event["type"] in ("variables", "debugEvent"):
+            # Hold the stored payload (the shared snapshot, spilled values as
+            # references) rather than the freshly parsed copy
+            debug_data[event["type"]] = event["data"]
+
+        return seq
+
+    def reserve_seq(self):
+        # Not locked: next() on a count is atomic, and the event loop calls
+        # this while ingest may hold the lock in its thread
+        return next(self._seq)
+
+    def _on_event(self, session, event, size):
+        """Hook for backends that persist events; called after each store."""
+
+    @_locked
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def _add_session(self, session):
+        self.sessions[session.id] = session
+        if not session.terminated:
+            self._running[session.id] = True
+        else:
+            self._terminated_at[session.id] = time.monotonic()
+        self._lru[session.id] = True
+        self.total_bytes += session.bytes
+
+    def _count_evicted_bytes(self, released):
+        if released:
+            self.retention_stats["evictedEvents"] += 1
+            self.retention_stats["evictedBytes"] += released
+
+    def _remove_session(self, session_id):
+        session = self.sessions.pop(session_id)
+        self._running.pop(session_id, None)
+        self._lru.pop(session_id, None)
+        self._terminated_at.pop(session_id, None)
+        self.total_bytes -= session.bytes
+        self.retention_stats["evictedEvents"] += len(session.log)
+        self.retention_stats["evictedBytes"] += session.bytes
+        return session
+
+    def _lru_victim(self):
+        """Least recently used session id, preferring terminated sessions."""
+        for session_id in self._lru:
+            if session_id not in self._running:
+                return session_id
+        return next(iter(self._lru))
+
+    @_locked
+    def enforce_retention(self):
+        """Expire and evict sessions until every retention limit holds."""
+        if self.session_ttl:
+            cutoff = time.monotonic() - self.session_ttl
+            while self._terminated_at:
+                session_id, terminated_at = next(iter(self._terminated_at.items()))
+                if terminated_at > cutoff:
+                    break
+                self._remove_session(session_id)
+                self.retention_stats["expiredSessions"] += 1
+
+        if self.max_sessions:
+            while len(self.sessions) > self.max_sessions:
+                self._remove_session(self._lru_victim())
+                self.retention_stats["evictedSessions"] += 1
+
+        if self.max_bytes:
+            while self.total_bytes > self.max_bytes and len(self.sessions) > 1:
+                self._remove_session(self._lru_victim())
+                self.retention_stats["evictedSessions"] += 1
+            # A single session over budget loses its oldest events instead
+            if self.total_bytes > self.max_bytes:
+                session = next(iter(self.sessions.values()))
+                while self.total_bytes > self.max_bytes and session.log:
+                    released = session.drop_oldest_event()
+                    self.total_bytes -= released
+                    self._count_evicted_bytes(released)
+
+    def _preload(self, session_id):
+        """Called without the lock before a query that names `session_id`;
+        backends with history beyond memory read the session in here, so
+        that the lock is not held during disk I/O."""
+
+    def _lookup(self, session_id):
+        """`get_session` for queries; backends with history beyond memory
+        load the session here. Ingest only routes to sessions in memory."""
+        return self.get_session(session_id)
+
+    def _require(self, session_id):
+        session = self._lookup(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        return session
+
+    @_locked
+    def session_ids(self):
+        return list(self.sessions)
+
+    @property
+    def session_count(self):
+        return len(self.sessions)
+
+    @_locked
+    def list_sessions(self):
+        active = self.active_session
+        return [
+            {
+                "id": session.id,
+                "name": session.name,
+                "type": session.type,
+                "startTime": session.start_time,
+                "endTime": session.end_time,
+                "terminated": session.terminated,
+                "active": session is active,
+                "eventCount": len(session.log),
+                "stops": session.summary.debug_event_counts.get("stopped", 0),
+                "exceptions": session.summary.exceptions
+            }
+            for session in self.sessions.values()
+        ]
+
+    @_locked
+    def get_variables(self, session_id=None, at_seq=None):
+        return blob_store.materialize(self._stored_variables(session_id, at_seq))
+
+    def _stored_variables(self, session_id, at_seq):
+        """Variables as stored, spilled values still referenced."""
+        if session_id is None and at_seq is None:
+            return debug_data.get("variables", {})
+        session = self._require(session_id)
+        if at_seq is not None:
+            return session.variables_at(at_seq)
+        return session.variables
+
+    @_locked
+    def inspect_variables(self, session_id=None, path="", at_seq=None, max_depth=DEFAULT_MAX_DEPTH,
+                          max_items=DEFAULT_MAX_ITEMS, max_bytes=DEFAULT_MAX_BYTES):
+        # The view reads only the parts of spilled values it shows
+        variables = self._stored_variables(session_id, at_seq)
+        return bounded_view(variables, path, max_depth=max_depth, max_items=max_items, max_bytes=max_bytes)
+
+    @_locked
+    def get_stack(self, session_id=None):
+        if session_id is None:
+            return debug_data.get("stack", [])
+        return self._require(session_id).stack
+
+    @_locked
+    def get_breakpoints(self, session_id=None):
+        if session_id is None:
+            return debug_data.get("breakpoints", [])
+        return self._require(session_id).breakpoints
+
+    @_locked
+    def get_output(self, session_id=None, **options):
+        return self._require(session_id).output.read(**options)
+
+    @_locked
+    def get_variable_history(self, session_id=None, path="", op=None, value=None, limit=None):
+        session = self._require(session_id)
+        history = session.variable_changes.history(path, op=op, value=value, limit=limit)
+        return {"sessionId": session.id, **history}
+
+    @_locked
+    def get_session_summary(self, session_id=None):
+        session = self._require(session_id)
+        return {
+            "id": session.id,
+            "name": session.name,
+            "type": session.type,
+            "startTime": session.start_time,
+            "endTime": session.end_time,
+            "terminated": session.terminated,
+            "active": session is self.active_session,
+            "version": session.version,
+            "retainedEvents": len(session.log),
+            "evictedEvents": session.evicted_events,
+            **session.summary.to_dict(parse_timestamp(session.start_time), session.ended_at)
+        }
+
+    def events_between(self, start=None, end=None, session_id=None, event_types=None, limit=None,
+                       before_termination=None):
+        self._preload(session_id)
+        with self._lock:
+            time_range, merged, truncated = self._timed_page(start, end, session_id, event_types, limit,
+                                                             before_termination)
+        # Formatted outside the lock; the events are copies
+        start, end = time_range
+        return {
+            "start": format_timestamp(start) if start is not None else None,
+            "end": format_timestamp(end) if end is not None else None,
+            "events": [
+                {"sessionId": session_id, "time": format_timestamp(time), **event}
+                for time, _, session_id, event in merged
+            ],
+            "truncated": truncated
+        }
+
+    def _timed_page(self, start, end, session_id, event_types, limit, before_termination):
+        """((start, end) in epoch seconds, [(time, seq, session id, event)],
+        truncated) for `events_between`."""
+        if before_termination is not None:
+            if before_termination < 0:
+                raise ValueError("before_termination must not be negative")
+            if session_id is None and not self._terminated_at:
+                raise ValueError("No terminated session")
+            session = self._require(session_id if session_id is not None else next(reversed(self._terminated_at)))
+            if session.ended_at is None or session.ended_at != session.ended_at:
+                raise ValueError(f"Session {session.id} has not terminated")
+            end = session.ended_at
+            start = end - before_termination
+            sessions = [session]
+        else:
+            start = to_epoch(start) if start is not None else None
+            end = to_epoch(end) if end is not None else None
+            if start is not None and end is not None and start > end:
+                raise ValueError("start is after end")
+            sessions = [self._require(session_id)] if session_id is not None else list(self.sessions.values())
+
+        # Each session's log answers from its own time index; the pages are
+        # merged by time. One extra event tells whether the limit cut it short.
+        fetch = limit + 1 if limit is not None else None
+        pages = []
+        for session in sessions:
+            pages.append([
+                (time, event["seq"], session.id, event)
+                for time, event in session.timed_events(start, end, event_types, fetch)
+            ])
+        merged = list(itertools.islice(heapq.merge(*pages), fetch))
+        return (start, end), merged[:limit], limit is not None and len(merged) > limit
+
+    def export_archive(self, path, session_ids=None):
+        from archive import SessionSnapshot, write_archive
+        for session_id in session_ids or ():
+            self._preload(session_id)
+        with self._lock:
+            sessions = [self._require(session_id) for session_id in session_ids] if session_ids else list(self.sessions.values())
+            snapshots = [SessionSnapshot(session) for session in sessions]
+        # The file is written outside the lock, from the copied events
+        return write_archive(path, snapshots)
+
+    @_locked
+    def import_archive(self, path, owned=False):
+        from archive import Archive
+        # Renumbered from the store's counter: polls with `since` and the
+        # event stream see the imported events once, after what they had
+        imported = Archive(path, owned).sessions(next_seq=self.reserve_seq)
+        for session in imported:
+            if len(session.log):
+                self.last_seq = max(self.last_seq, session.log.seq(len(session.log) - 1))
+            if session.id in self.sessions:
+                self._remove_session(session.id)
+            self._add_session(session)
+        self.enforce_retention()
+        return {"path": str(path), "sessions": [session.id for session in imported]}
+
+    @_locked
+    def stats(self):
+        blobs = blob_store.stats()
+        return {
+            "sessions": len(self.sessions),
+            "runningSessions": len(self._running),
+            "events": sum(len(session.log) for session in self.sessions.values()),
+            "approxBytes": self.total_bytes,
+            "lastSeq": self.last_seq,
+            "spilledBlobs": blobs["blobs"],
+            "spilledBytes": blobs["storedBytes"],
+            **self.retention_stats
+        }
+
+    @_locked
+    def query(self, session_id=None, event_types=None, since=0, limit=None, fields=None, session_fields=None):
+        """Build a GET /debug-data response.
+
+        With no arguments this is the full legacy payload. `session_id` narrows
+        to one session (whose variables/stack/breakpoints then fill the
+        top-level keys), `event_types` filters events, `since` only returns
+        events with a larger sequence number, `limit` caps the number of events
+        across all sessions, and `fields` / `session_fields` project the
+        top-level and per-session keys. `nextCursor` is the `since` value for
+        the next poll; `hasMore` is set when `limit` cut the page short.
+        """
+        sessions, response = self._scope(session_id)
+        pages = {}
+        has_more = False
+        next_cursor = self.last_seq
+        want_sessions = not fields or "sessions" in fields
+        if want_sessions and (not session_fields or "events" in session_fields):
+            # Fetch one event past the limit to tell whether the page is complete
+            fetch = limit + 1 if limit is not None else None
+            for session in sessions:
+                pages[session.id] = session.select_events(since, event_types, fetch)
+            merged = list(itertools.islice(heapq.merge(*pages.values(), key=_event_seq), fetch))
+            if limit is not None and len(merged) > limit:
+                has_more = True
+                cutoff = merged[limit - 1]["seq"]
+                for key, events in pages.items():
+                    pages[key] = [event for event in events if event["seq"] <= cutoff]
+                next_cursor = cutoff
+            if since:
+                # Incremental polls only report sessions that have something new
+                sessions = [session for session in sessions if pages[session.id]]
+
+        if want_sessions:
+            response["sessions"] = [
+                session.to_dict(events=pages.get(session.id, []), fields=session_fields)
+                for session in sessions
+            ]
+        response["totalSessions"] = len(self.sessions)
+        if fields:
+            response = {key: value for key, value in response.items() if key in fields}
+        response["nextCursor"] = next_cursor
+        response["hasMore"] = has_more
+        return response
+
+    def _scope(self, session_id):
+        """Sessions covered by a query and the top-level keys it starts from."""
+        if session_id is not None:
+            selected = self._lookup(session_id)
+            return [selected] if selected is not None else [], {
+                "variables": selected.materialized(selected.variables) if selected else {},
+                "stack": selected.stack if selected else [],
+                "breakpoints": selected.breakpoints if selected else []
+            }
+        return list(self.sessions.values()), blob_store.materialize(dict(debug_data))
+
+    def query_json(self, session_id=None, event_types=None, since=0, limit=None, fields=None, session_fields=None):
+        """`query()` encoded as JSON bytes.
+
+        Unfiltered, unpaged responses are assembled from per-session
+        fragments, so terminated sessions are served from their cached
+        encoding and only running sessions are serialized on each request.
+        The response is built under the lock and encoded after releasing
+        it, so a large query does not hold up ingest.
+        """
+        if since or event_types or limit is not None or (fields and "sessions" not in fields):
+            return super().query_json(session_id, event_types, since, limit, fields, session_fields)
+
+        self._preload(session_id)
+        with self._lock:
+            sessions, response = self._scope(session_id)
+            response.pop("sessions", None)
+            response["totalSessions"] = len(self.sessions)
+            if fields:
+                response = {key: value for key, value in response.items() if key in fields}
+            response["nextCursor"] = self.last_seq
+            response["hasMore"] = False
+            parts = [(session, session.version, session.encodable(session_fields)) for session in sessions]
+
+        fragments = []
+        encoded = []
+        for session, version, part in parts:
+            if not isinstance(part, bytes):
+                part = dumps(part)
+                encoded.append((session, version, part))
+            fragments.append(part)
+        if encoded:
+            with self._lock:
+                for session, version, part in encoded:
+                    session.remember_encoding(session_fields, version, part)
+        return dumps(response)[:-1] + b',"sessions":[' + b",".join(fragments) + b"]}"
+
+
+# Backend selection: "memory" (default), "sqlite", or "remote" (a shared store
+# daemon, see remote_store.py)
+STORE_BACKEND = os.environ.get("MCP_DEBUG_STORE", "memory")
+DB_PATH = os.environ.get("MCP_DEBUG_DB_PATH", "debug_store.db")
+
+
+def create_store(backend=STORE_BACKEND):
+    """Instantiate the configured storage backend."""
+    if backend == "memory":
+        return MemoryStore()
+    if backend == "sqlite":
+        from sqlite_store import SQLiteStore
+        store = SQLiteStore(DB_PATH)
+        atexit.register(store.close)
+        return store
+    if backend == "remote":
+        from remote_store import RemoteStore
+        return RemoteStore()
+    raise ValueError(f"Unknown MCP_DEBUG_STORE backend: {backend}")
+
+
+debug_store = create_store()
@@ -0,0 +1,171 @@
+# Per-session summaries
+# Aggregates updated as each event is stored, so an overview of a session
+# (how many stops and why, exceptions, how much output, how long it ran,
+# where it stopped most) is read without scanning its events. They cover
+# every event the session received, including ones since evicted from its log.
+import heapq
+import math
+from collections import deque
+
+from event_log import format_timestamp
+from frames import FRAMES_KEY
+
+# Distinct stop locations counted per session; later new locations are only
+# counted in `untrackedStops`
+MAX_LOCATIONS = 1000
+# Distinct stop reasons and output categories counted per session
+MAX_KEYS = 100
+TOP_LOCATIONS = 10
+RECENT_EXCEPTIONS = 5
+
+
+def _count(counts, key, amount=1):
+    if key in counts or len(counts) < MAX_KEYS:
+        counts[key] = counts.get(key, 0) + amount
+
+
+def _finite(value):
+    return value if value is not None and math.isfinite(value) else None
+
+
+def _top_frame(stack):
+    frames = stack.get(FRAMES_KEY) if isinstance(stack, dict) else stack
+    if isinstance(frames, list) and frames and isinstance(frames[0], dict):
+        return frames[0]
+    return None
+
+
+class SessionSummary:
+    """Running aggregates of one session's events."""
+
+    def __init__(self):
+        self.event_counts = {}          # envelope type -> events
+        self.debug_event_counts = {}    # DAP event name -> events
+        self.stop_reasons = {}          # stopped event reason -> events
+        self.exceptions = 0
+        self.recent_exceptions = deque(maxlen=RECENT_EXCEPTIONS)
+        self.output = {}                # category -> [bytes, lines]
+        self.locations = {}             # (path, line, name) -> stack snapshots with it on top
+        self.untracked_stops = 0
+        self.exit_code = None
+        self.first_time = None
+        self.last_time = None
+
+    def record(self, event_type, name, data, timestamp, seq):
+        """Count one stored event. `name` is a debugEvent's DAP event name and
+        `timestamp` its epoch time (NaN when unknown)."""
+        self.event_counts[event_type] = self.event_counts.get(event_type, 0) + 1
+        if timestamp == timestamp:
+            if self.first_time is None or timestamp < self.first_time:
+                self.first_time = timestamp
+            if self.last_time is None or timestamp > self.last_time:
+                self.last_time = timestamp
+
+        if event_type == "stack":
+            self._record_location(_top_frame(data))
+            return
+        if event_type != "debugEvent" or not isinstance(name, str):
+            return
+        _count(self.debug_event_counts, name)
+        body = data.get("body")
+        if not isinstance(body, dict):
+            return
+        if name == "output" and isinstance(body.get("output"), str):
+            text = body["output"]
+            category = body.get("category") or "console"
+            size = len(text) if text.isascii() else len(text.encode("utf-8", "surrogatepass"))
+            totals = self.output.get(category)
+            if totals is None:
+                if len(self.output) >= MAX_KEYS:
+                    return
+                totals = self.output[category] = [0, 0]
+            totals[0] += size
+            totals[1] += text.count("\n")
+        elif name == "stopped":
+            reason = body.get("reason")
+            _count(self.stop_reasons, reason if isinstance(reason, str) else "unknown")
+            if reason == "exception":
+                self.exceptions += 1
+                self.recent_exceptions.append({
+                    "seq": seq,
+                    "text": body.get("text"),
+                    "description": body.get("description")
+                })
+        elif name == "exited" and isinstance(body.get("exitCode"), int):
+            self.exit_code = body["exitCode"]
+
+    def _record_location(self, frame):
+        if frame is None:
+            return
+        source = frame.get("source")
+        path = (source.get("path") or source.get("name")) if isinstance(source, dict) else None
+        key = (path, frame.get("line"), frame.get("name"))
+        try:
+            if key in self.locations or len(self.locations) < MAX_LOCATIONS:
+                self.locations[key] = self.locations.get(key, 0) + 1
+            else:
+                self.untracked_stops += 1
+        except TypeError:
+            # Unhashable line or name: not a DAP frame
+            pass
+
+    def to_dict(self, start_time=None, end_time=None):
+        """The summary as JSON. `start_time`/`end_time` (epoch seconds) bound
+        the duration when known; otherwise the event timestamps do."""
+        start = _finite(start_time) if _finite(start_time) is not None else self.first_time
+        end = _finite(end_time) if _finite(end_time) is not None else self.last_time
+        top = heapq.nlargest(TOP_LOCATIONS, self.locations.items(), key=lambda item: item[1])
+        return {
+            "eventCounts": dict(self.event_counts),
+            "debugEventCounts": dict(self.debug_event_counts),
+            "stops": self.debug_event_counts.get("stopped", 0),
+            "stopReasons": dict(self.stop_reasons),
+            "exceptions": {"count": self.exceptions, "recent": list(self.recent_exceptions)},
+            "output": {
+                "bytes": sum(totals[0] for totals in self.output.values()),
+                "lines": sum(totals[1] for totals in self.output.values()),
+                "byCategory": {
+                    category: {"bytes": totals[0], "lines": totals[1]} for category, totals in self.output.items()
+                }
+            },
+            "firstEventTime": format_timestamp(self.first_time) if self.first_time is not None else None,
+            "lastEventTime": format_timestamp(self.last_time) if self.last_time is not None else None,
+            "durationSeconds": end - start if start is not None and end is not None else None,
+            "topLocations": [
+                {"path": path, "line": line, "name": name, "hits": hits} for (path, line, name), hits in top
+            ],
+            "untrackedStops": self.untracked_stops,
+            "exitCode": self.exit_code
+        }
+
+    def state(self):
+        """JSON-compatible state, restored by `from_state` (used by archives)."""
+        return {
+            "eventCounts": self.event_counts,
+            "debugEventCounts": self.debug_event_counts,
+            "stopReasons": self.stop_reasons,
+            "exceptions": self.exceptions,
+            "recentExceptions": list(self.recent_exceptions),
+            "output": self.output,
+            "locations": [[path, line, name, hits] for (path, line, name), hits in self.locations.items()],
+            "untrackedStops": self.untracked_stops,
+            "exitCode": self.exit_code,
+            "firstTime": self.first_time,
+            "lastTime": self.last_time
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        summary = cls()
+        summary.event_counts = dict(state["eventCounts"])
+        summary.debug_event_counts = dict(state["debugEventCounts"])
+        summary.stop_reasons = dict(state["stopReasons"])
+        summary.exceptions = state["exceptions"]
+        summary.recent_exceptions.extend(state["recentExceptions"])
+        summary.output = {category: list(totals) for category, totals in state["output"].items()}
+        summary.locations = {(path, line, name): hits for path, line, name, hits in state["locations"]}
+        summary.untracked_stops = state["untrackedStops"]
+        summary.exit_code = state["exitCode"]
+        summary.first_time = state["firstTime"]
+        summary.last_time = state["lastTime"]
+        return summary
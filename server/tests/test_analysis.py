@@ -0,0 +1,82 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from analysis import AnalysisPool, AnalysisTimeout, capture, compare_snapshots, diff_variables
+from store import MemoryStore
+
+
+def _frame(name, line):
+    return {"id": line, "name": name, "line": line, "source": {"path": "/src/app.py"}}
+
+
+def _session(store, session_id, total, inner, condition):
+    store.apply({"sessionStarted": {"id": session_id}})
+    store.apply({"debugEvent": {"sessionId": session_id, "event": "stopped", "body": {"reason": "breakpoint"}}})
+    store.apply({"variables": {"locals": {"total": total, "same": [1, 2]}}, "sessionId": session_id})
+    store.apply({"stack": [_frame(inner, 30), _frame("run", 20), _frame("main", 10)], "sessionId": session_id})
+    store.apply({"breakpoints": [{"id": session_id, "line": 30, "condition": condition}], "sessionId": session_id})
+
+
+def test_sessions_are_compared_in_the_pool():
+    store = MemoryStore()
+    _session(store, "pass", 1, "add", None)
+    _session(store, "fail", -1, "subtract", "total < 0")
+    pool = AnalysisPool(workers=1)
+    try:
+        a, b = capture(store, "pass"), capture(store, "fail")
+        result = asyncio.run(pool.run(("compare", a["version"], b["version"]), compare_snapshots, a, b, 10))
+    finally:
+        pool.shutdown()
+    assert result["variables"]["differences"] == [{"path": "locals.total", "status": "changed", "a": 1, "b": -1}]
+    assert result["stack"]["commonOuterFrames"] == 2
+    assert result["stack"]["onlyA"] == ["add (/src/app.py:30)"]
+    assert result["breakpoints"]["onlyB"][0]["condition"] == "total < 0"
+    assert result["summary"]["stops"] == {"a": 1, "b": 1}
+
+
+def test_results_are_cached_by_key():
+    pool = AnalysisPool(workers=1)
+
+    async def run():
+        first = await pool.run("key", diff_variables, {"x": 1}, {"x": 2, "y": 3}, 10)
+        second = await pool.run("key", diff_variables, {"x": 1}, {"x": 2, "y": 3}, 10)
+        return first, second
+
+    try:
+        first, second = asyncio.run(run())
+    finally:
+        pool.shutdown()
+    assert first is second
+    assert (first["changed"], first["added"], first["removed"]) == (1, 1, 0)
+    assert pool.counters["completed"] == 1 and pool.counters["cacheHits"] == 1
+
+
+def test_differences_beyond_the_limit_are_counted():
+    result = diff_variables({"a": list(range(10))}, {"a": list(range(1, 11))}, 3, time.time() + 30)
+    assert len(result["differences"]) == 3
+    assert result["changed"] == 10 and result["truncated"]
+
+
+def test_analysis_stops_at_its_deadline():
+    with pytest.raises(AnalysisTimeout):
+        diff_variables({"a": list(range(5000))}, {}, 10, time.time() - 1)
+
+
+def test_slow_analysis_times_out_for_the_caller():
+    pool = AnalysisPool(workers=1)
+    release = threading.Event()
+
+    def slow(deadline):
+        release.wait(5)
+        return "done"
+
+    try:
+        with pytest.raises(AnalysisTimeout):
+            asyncio.run(pool.run("slow", slow, timeout=0.05))
+        assert pool.counters["timeouts"] == 1
+    finally:
+        release.set()
+        pool.shutdown()
@@ -0,0 +1,123 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import main
+from archive import MAGIC, _TRAILER, Archive, ArchiveError, replay_events
+from store import MemoryStore
+
+
+def _store():
+    store = MemoryStore()
+    for session_id in ("a", "b"):
+        store.apply({"sessionStarted": {"id": session_id, "name": f"{session_id}.py",
+                                        "timestamp": "2024-01-01T00:00:00Z"}})
+    for i in range(20):
+        session_id = "ab"[i % 2]
+        store.apply({"debugEvent": {"sessionId": session_id, "event": "output",
+                                    "body": {"output": f"{session_id} {i}\n"}}})
+        store.apply({"variables": {"i": i, "big": "v" * 2000}, "sessionId": session_id})
+    store.apply({"sessionTerminated": {"id": "a"}})
+    return store
+
+
+def test_export_import_round_trip(tmp_path):
+    store = _store()
+    path = tmp_path / "sessions.mcpa"
+    summary = store.export_archive(str(path))
+    assert summary["sessions"] == ["a", "b"]
+
+    restored = MemoryStore()
+    assert restored.import_archive(str(path))["sessions"] == ["a", "b"]
+    for session_id in ("a", "b"):
+        assert restored.query(session_id=session_id)["sessions"] == store.query(session_id=session_id)["sessions"]
+        assert restored.get_output(session_id) == store.get_output(session_id)
+        assert restored.get_variable_history(session_id, "i") == store.get_variable_history(session_id, "i")
+
+
+def test_replay_is_in_ingest_order(tmp_path):
+    store = _store()
+    path = tmp_path / "sessions.mcpa"
+    store.export_archive(str(path))
+    envelopes = [item for _, item in replay_events(Archive(str(path)), prefix="r-")]
+    assert len(envelopes) == store.last_seq
+    outputs = [item["debugEvent"]["body"]["output"] for item in envelopes if "debugEvent" in item]
+    assert outputs == [f"{'ab'[i % 2]} {i}\n" for i in range(20)]
+    assert envelopes[-1] == {"sessionTerminated": {**store.get_session("a").events[-1]["data"], "id": "r-a"}}
+
+
+def test_import_renumbers_after_the_cursor(tmp_path):
+    path = tmp_path / "sessions.mcpa"
+    _store().export_archive(str(path))
+
+    store = MemoryStore()
+    store.apply({"sessionStarted": {"id": "live", "name": "live.py"}})
+    for i in range(100):
+        store.apply({"variables": {"i": i}, "sessionId": "live"})
+    cursor = store.query(since=0)["nextCursor"]
+
+    store.import_archive(str(path))
+    store.apply({"variables": {"i": 100}, "sessionId": "live"})
+    response = store.query(since=cursor)
+    seqs = [event["seq"] for session in response["sessions"] for event in session["events"]]
+    assert len(seqs) == 2 + 20 * 2 + 1 + 1
+    assert min(seqs) > cursor
+    assert response["nextCursor"] == max(seqs) == store.last_seq
+    later = store.query(since=response["nextCursor"])
+    assert not any(session["events"] for session in later["sessions"])
+
+
+def _corrupt(tmp_path, change):
+    path = tmp_path / "sessions.mcpa"
+    _store().export_archive(str(path))
+    data = bytearray(path.read_bytes())
+    change(data)
+    path.write_bytes(bytes(data))
+    return str(path)
+
+
+def _set_footer(data, footer):
+    offset, length, magic = _TRAILER.unpack_from(data, len(data) - _TRAILER.size)
+    encoded = json.dumps(footer).encode()
+    data[offset:] = encoded + _TRAILER.pack(offset, len(encoded), magic)
+
+
+def _footer(data):
+    offset, length, _ = _TRAILER.unpack_from(data, len(data) - _TRAILER.size)
+    return json.loads(bytes(data[offset:offset + length]))
+
+
+# Type code and DAP event name code of the first record
+_TYPE_CODE = slice(len(MAGIC) + 20, len(MAGIC) + 21)
+_NAME_CODE = slice(len(MAGIC) + 22, len(MAGIC) + 24)
+
+
+@pytest.mark.parametrize("change", [
+    # Unknown event type code
+    lambda data: data.__setitem__(_TYPE_CODE, b"\xff"),
+    # DAP event name index past the name list
+    lambda data: data.__setitem__(_NAME_CODE, b"\xff\xff"),
+    lambda data: _set_footer(data, {**_footer(data), "names": None}),
+    lambda data: _set_footer(data, [1, 2]),
+    lambda data: _set_footer(data, {**_footer(data), "sessions": [{"id": "a"}]}),
+    lambda data: _set_footer(data, {**_footer(data), "sessions": [
+        {**_footer(data)["sessions"][0], "offsets": 10 ** 12}]}),
+    lambda data: _set_footer(data, {**_footer(data), "sessions": [
+        {**_footer(data)["sessions"][0], "summary": {"eventCounts": 3}}]}),
+])
+def test_corrupt_archive_is_refused(tmp_path, change):
+    with pytest.raises(ArchiveError):
+        MemoryStore().import_archive(_corrupt(tmp_path, change))
+
+
+def test_corrupt_upload_answers_400(tmp_path):
+    path = _corrupt(tmp_path, lambda data: _set_footer(data, {**_footer(data), "names": [1]}))
+
+    async def upload():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            with open(path, "rb") as f:
+                return await client.post("/debug-data/archive", content=f.read())
+    assert asyncio.run(upload()).status_code == 400
@@ -0,0 +1,91 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import main
+
+
+def _post_batch(body, wait=True, headers=None):
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post(f"/debug-data/batch?wait={str(wait).lower()}", content=body,
+                                     headers=headers or {"Content-Type": "application/json"})
+    return asyncio.run(run())
+
+
+@pytest.fixture(params=["async", "sync"])
+def ingest_mode(request, monkeypatch):
+    if request.param == "async":
+        monkeypatch.setattr(main, "ingest", main.IngestPipeline(main.debug_store))
+    else:
+        monkeypatch.setattr(main, "ingest", None)
+    return request.param
+
+
+def test_items_are_applied_in_order(ingest_mode):
+    session_id = f"batch-{ingest_mode}"
+    body = json.dumps([
+        {"sessionStarted": {"id": session_id}},
+        {"debugEvent": {"sessionId": session_id, "event": "output", "body": {"output": "a\n"}}},
+        {"debugEvent": {"sessionId": session_id, "event": "output", "body": {"output": "b\n"}}},
+    ])
+    response = _post_batch(body)
+    assert response.status_code == 200
+    seqs = [result["seq"] for result in response.json()["results"]]
+    assert response.json()["accepted"] == 3 and seqs == sorted(seqs)
+    lines = main.debug_store.get_output(session_id)["lines"]
+    assert [line["text"] for line in lines] == ["a", "b"]
+
+
+def test_bad_items_are_reported_in_their_slot(ingest_mode):
+    session_id = f"batch-bad-{ingest_mode}"
+    body = "\n".join([
+        json.dumps({"sessionStarted": {"id": session_id}}),
+        "{not json",
+        json.dumps({"stack": 3, "sessionId": session_id}),
+        json.dumps({"nothing": 1}),
+        json.dumps({"variables": {"x": 1}, "sessionId": "batch-unknown"}),
+        json.dumps({"variables": {"x": 1}, "sessionId": session_id}),
+    ])
+    response = _post_batch(body, headers={"Content-Type": "application/x-ndjson"})
+    results = response.json()["results"]
+    assert [result["status"] for result in results] == ["ok", "error", "error", "error", "ignored", "ok"]
+    assert results[2]["error"] == "stack must be an array or an object"
+    assert response.json()["rejected"] == 4
+
+
+def test_apply_failure_fails_only_its_item(ingest_mode, monkeypatch):
+    session_id = f"batch-fail-{ingest_mode}"
+    apply = main.debug_store.apply
+
+    def failing_apply(data, size=None, seq=None):
+        if data.get("fail"):
+            raise RuntimeError("store broke")
+        return apply(data, size=size, seq=seq)
+
+    monkeypatch.setattr(main.debug_store, "apply", failing_apply)
+    body = json.dumps([
+        {"sessionStarted": {"id": session_id}},
+        {"variables": {"x": 1}, "sessionId": session_id, "fail": True},
+        {"variables": {"x": 2}, "sessionId": session_id},
+    ])
+    response = _post_batch(body)
+    assert response.status_code == 200
+    statuses = [result["status"] for result in response.json()["results"]]
+    assert statuses == ["ok", "error", "ok"]
+
+
+def test_queued_batch_answers_202_with_reserved_seqs(monkeypatch):
+    monkeypatch.setattr(main, "ingest", main.IngestPipeline(main.debug_store))
+    response = _post_batch(json.dumps([{"sessionStarted": {"id": "batch-queued"}}, "x"]), wait=False)
+    assert response.status_code == 202
+    accepted, malformed = response.json()["results"]
+    assert accepted["status"] == "accepted" and isinstance(accepted["seq"], int)
+    assert malformed == {"status": "error", "error": "not a debug data envelope"}
+
+
+def test_body_that_is_not_an_array_answers_400():
+    assert _post_batch("[1, 2").status_code == 400
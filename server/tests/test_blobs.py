@@ -0,0 +1,54 @@
+import gc
+import os
+
+from blobs import BlobRef, BlobStore, same_value
+
+
+def test_large_values_spill_and_load_back(tmp_path):
+    blobs = BlobStore(min_bytes=100, directory=str(tmp_path))
+    value = {"text": "x" * 500, "items": list(range(200)), "small": "y"}
+    stored = blobs.spill(value)
+    assert isinstance(stored["text"], BlobRef)
+    assert isinstance(stored["items"], BlobRef)
+    assert stored["small"] == "y"
+    assert blobs.materialize(stored) == value
+    assert blobs.text(stored["text"], 10) == "x" * 10
+
+
+def test_identical_content_is_deduplicated(tmp_path):
+    blobs = BlobStore(min_bytes=100, directory=str(tmp_path))
+    first = blobs.spill("z" * 1000, top=False)
+    second = blobs.spill("z" * 1000, top=False)
+    assert first is second
+    assert blobs.counters["deduplicated"] == 1
+
+
+def test_refs_match_raw_content(tmp_path):
+    blobs = BlobStore(min_bytes=100, directory=str(tmp_path))
+    text = "é" * 300
+    ref = blobs.spill(text, top=False)
+    assert same_value(ref, text) and same_value(text, ref)
+    assert not same_value(ref, text[:-1] + "e")
+    items = list(range(100))
+    assert same_value(blobs.spill(items, top=False), items)
+
+
+def test_refs_keep_the_eq_hash_contract(tmp_path):
+    blobs = BlobStore(min_bytes=100, directory=str(tmp_path))
+    text = "z" * 300
+    ref = blobs.spill(text, top=False)
+    again = blobs.spill(text, top=False)
+    assert ref == again and hash(ref) == hash(again)
+    assert ref != text and text != ref
+    assert len({ref, again, text}) == 2
+
+
+def test_file_is_deleted_with_its_last_ref(tmp_path):
+    blobs = BlobStore(min_bytes=100, directory=str(tmp_path))
+    ref = blobs.spill("w" * 1000, top=False)
+    path = blobs._file(ref.digest)
+    assert os.path.exists(path)
+    del ref
+    gc.collect()
+    assert not os.path.exists(path)
+    assert blobs.stats()["storedBytes"] == 0
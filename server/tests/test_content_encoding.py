@@ -0,0 +1,59 @@
+import asyncio
+import gzip
+import zlib
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from content_encoding import CompressionMiddleware
+
+app = FastAPI()
+
+
+@app.post("/ingest")
+async def ingest(request: Request):
+    return {"body": (await request.body()).decode()}
+
+
+@app.get("/query")
+async def query(size: int = 10):
+    return JSONResponse({"text": "x" * size})
+
+
+app.add_middleware(CompressionMiddleware, ingest_paths=("/ingest",), query_paths=("/query",),
+                   minimum_size=100, max_body_bytes=1000)
+
+
+def _send(method, url, **kwargs):
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.request(method, url, **kwargs)
+    return asyncio.run(run())
+
+
+def test_compressed_bodies_are_decoded():
+    for encoding, body in (("gzip", gzip.compress(b"hello")), ("deflate", zlib.compress(b"hello"))):
+        response = _send("POST", "/ingest", content=body, headers={"Content-Encoding": encoding})
+        assert response.status_code == 200
+        assert response.json() == {"body": "hello"}
+
+
+def test_bad_bodies_are_refused():
+    corrupt = _send("POST", "/ingest", content=b"not gzip", headers={"Content-Encoding": "gzip"})
+    assert corrupt.status_code == 400
+    truncated = _send("POST", "/ingest", content=gzip.compress(b"hello")[:-8], headers={"Content-Encoding": "gzip"})
+    assert truncated.status_code == 400
+    bomb = _send("POST", "/ingest", content=gzip.compress(b"x" * 5000), headers={"Content-Encoding": "gzip"})
+    assert bomb.status_code == 413
+    unknown = _send("POST", "/ingest", content=b"hello", headers={"Content-Encoding": "br"})
+    assert unknown.status_code == 415
+
+
+def test_large_query_responses_are_gzipped():
+    large = _send("GET", "/query?size=5000", headers={"Accept-Encoding": "gzip"})
+    assert large.headers["content-encoding"] == "gzip"
+    assert large.json() == {"text": "x" * 5000}
+    small = _send("GET", "/query", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
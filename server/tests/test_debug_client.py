@@ -0,0 +1,101 @@
+import asyncio
+import gzip
+import json
+import threading
+
+import httpx
+
+import main
+from debug_client import AsyncDebugClient, DebugClient
+
+
+def _output(i, session_id="client"):
+    return {"debugEvent": {"sessionId": session_id, "event": "output", "body": {"output": f"{i}\n"}}}
+
+
+class Server:
+    """MockTransport handler answering batches from a list of status codes."""
+
+    def __init__(self, statuses=()):
+        self.statuses = list(statuses)
+        self.batches = []
+
+    def __call__(self, request):
+        body = request.content
+        if request.headers.get("content-encoding") == "gzip":
+            body = gzip.decompress(body)
+        status = self.statuses.pop(0) if self.statuses else 200
+        if isinstance(status, Exception):
+            raise status
+        batch = json.loads(body)
+        self.batches.append(batch)
+        return httpx.Response(status, json={"accepted": len(batch), "rejected": 0}, headers={"Retry-After": "0"})
+
+
+def _client(server, **options):
+    return DebugClient("http://test", transport=httpx.MockTransport(server), backoff=0, max_backoff=0, **options)
+
+
+def test_envelopes_are_sent_in_batches():
+    server = Server()
+    with _client(server, batch_size=2, flush_interval=0.1) as client:
+        for i in range(5):
+            client.send(_output(i))
+        assert client.flush(5)
+    assert [len(batch) for batch in server.batches] == [2, 2, 1]
+    assert [item["debugEvent"]["body"]["output"] for batch in server.batches for item in batch] == \
+        [f"{i}\n" for i in range(5)]
+    assert client.stats["sent"] == 5
+
+
+def test_posts_are_resent_only_when_they_cannot_have_been_stored():
+    server = Server([429, httpx.ConnectError("refused"), 200, 500])
+    with _client(server, batch_size=1, flush_interval=0) as client:
+        client.send(_output(1))
+        client.flush(5)
+        client.send(_output(2))
+        client.flush(5)
+    assert client.stats["retries"] == 2
+    assert client.stats["failedBatches"] == 1
+    assert len(server.batches) == 3
+
+
+def test_full_buffer_drops_the_oldest_but_keeps_lifecycle_envelopes():
+    release = threading.Event()
+    server = Server()
+
+    def slow(request):
+        release.wait(5)
+        return server(request)
+
+    client = DebugClient("http://test", transport=httpx.MockTransport(slow), batch_size=1, flush_interval=0,
+                         max_buffer=2)
+    try:
+        client.send(_output(0))
+        # Wait until the worker holds the first batch in flight
+        assert not client.flush(0.2)
+        assert not client.buffer
+        client.send({"sessionStarted": {"id": "client"}})
+        client.send(_output(1))
+        client.send(_output(2))
+        assert client.stats["dropped"] == 1
+        assert list(client.buffer) == [{"sessionStarted": {"id": "client"}}, _output(2)]
+    finally:
+        release.set()
+        client.close()
+
+
+def test_async_client_drives_the_app_in_process(monkeypatch):
+    monkeypatch.setattr(main, "ingest", main.IngestPipeline(main.debug_store))
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with AsyncDebugClient("http://test", transport=transport, wait=True) as client:
+            await client.send({"sessionStarted": {"id": "async-client"}})
+            for i in range(3):
+                await client.send(_output(i, "async-client"))
+            assert await client.flush(5)
+            return await client.query(session_id="async-client", event_type="output")
+
+    response = asyncio.run(run())
+    assert len(response["sessions"][0]["events"]) == 3
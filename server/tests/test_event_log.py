@@ -0,0 +1,50 @@
+from event_log import EventLog
+
+
+def _log(events, maxlen=None):
+    log = EventLog(maxlen)
+    for seq, event_type, name, timestamp in events:
+        log.append(seq, event_type, name, timestamp, 10, {"seq": seq})
+    return log
+
+
+def test_append_evicts_oldest_when_full():
+    log = _log([(seq, "debugEvent", "output", float(seq)) for seq in range(1, 4)], maxlen=2)
+    assert len(log) == 2
+    assert log.first_seq == 2
+    evicted = log.append(4, "stack", None, 4.0, 7, {"seq": 4})
+    assert evicted == ("debugEvent", {"seq": 2}, 10)
+    assert [log.seq(position) for position in range(len(log))] == [3, 4]
+
+
+def test_positions_filter_by_type_name_and_since():
+    log = _log([
+        (1, "sessionStarted", None, 1.0),
+        (2, "debugEvent", "output", 2.0),
+        (3, "variables", None, 3.0),
+        (4, "debugEvent", "stopped", 4.0),
+        (5, "debugEvent", "output", 5.0),
+    ])
+    assert log.positions(event_types=["output"]) == [1, 4]
+    assert log.positions(event_types=["debugEvent"]) == [1, 3, 4]
+    assert log.positions(event_types=["output", "variables"], since=2) == [2, 4]
+    assert log.positions(limit=2) == [0, 1]
+    assert log.last_seq_of("output", at_most=4) == 2
+
+
+def test_window_with_out_of_order_timestamps():
+    log = _log([(1, "debugEvent", "output", 5.0), (2, "debugEvent", "output", 1.0),
+                (3, "debugEvent", "output", 3.0)])
+    assert [log.seq(position) for position in log.window(0.0, 4.0)] == [2, 3]
+    assert log.positions(start_time=2.0, end_time=6.0) == [0, 2]
+
+
+def test_compaction_keeps_indexes_consistent():
+    log = _log([(seq, "debugEvent", "output" if seq % 2 else "stopped", float(seq)) for seq in range(1, 3001)],
+               maxlen=100)
+    assert len(log) == 100
+    assert log.first_seq == 2901
+    outputs = log.positions(event_types=["output"])
+    assert len(outputs) == 50
+    assert all(log.seq(position) % 2 for position in outputs)
+    assert log.last_seq_of("stopped", at_most=2900) is None
@@ -0,0 +1,75 @@
+import asyncio
+import json
+import threading
+
+from event_stream import EventStream
+
+
+class Request:
+    async def is_disconnected(self):
+        return False
+
+
+def _event(seq, event_type="debugEvent"):
+    return {"seq": seq, "type": event_type, "data": {"n": seq}}
+
+
+def _parse(frame):
+    fields = dict(line.split(": ", 1) for line in frame.strip().split("\n"))
+    return fields.get("event"), fields.get("id"), json.loads(fields["data"])
+
+
+def test_resume_replays_after_last_event_id_and_reports_a_gap():
+    stream = EventStream(replay_size=3)
+    for seq in range(1, 6):
+        stream.publish("a", _event(seq))
+
+    async def first_frames():
+        frames = stream.stream(Request(), last_event_id=1)
+        return [_parse(await frames.__anext__()) for _ in range(4)]
+
+    gap, *events = asyncio.run(first_frames())
+    assert gap[0] == "gap" and gap[2] == {"lastEventId": 1, "oldestAvailable": 3}
+    assert [event_id for _, event_id, _ in events] == ["3", "4", "5"]
+
+
+def test_live_events_from_other_threads_are_filtered_by_session():
+    stream = EventStream()
+
+    async def follow():
+        frames = stream.stream(Request(), session_id="b", event_types={"variables"})
+        pending = asyncio.ensure_future(frames.__anext__())
+        await asyncio.sleep(0)
+
+        def ingest():
+            stream.publish("a", _event(1, "variables"))
+            stream.publish("b", _event(2, "debugEvent"))
+            stream.publish("b", _event(3, "variables"))
+
+        thread = threading.Thread(target=ingest)
+        thread.start()
+        thread.join()
+        return _parse(await asyncio.wait_for(pending, 1))
+
+    event_name, event_id, payload = asyncio.run(follow())
+    assert (event_name, event_id) == ("variables", "3")
+    assert payload == {"seq": 3, "sessionId": "b", "type": "variables", "data": {"n": 3}}
+
+
+def test_slow_subscriber_is_disconnected():
+    stream = EventStream()
+
+    async def overflow():
+        frames = stream.stream(Request())
+        pending = asyncio.ensure_future(frames.__anext__())
+        await asyncio.sleep(0)
+        for seq in range(1, 2000):
+            stream.publish("a", _event(seq))
+        received = [await pending]
+        async for frame in frames:
+            received.append(frame)
+        return received, stream.subscribers
+
+    received, subscribers = asyncio.run(overflow())
+    assert 0 < len(received) < 1999
+    assert not subscribers
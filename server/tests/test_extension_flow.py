@@ -1,11 +1,14 @@
-import requests
-import json
+import os
+import sys
 from datetime import datetime
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from debug_client import DebugClient
+
 def test_extension_data_flow():
     """Test that simulates what the VS Code extension would send"""
     
-    server_url = "http://localhost:8001/debug-data"
+    client = DebugClient("http://localhost:8001", wait=True)
     
     # Clear existing data first
     print("Testing debug data flow to MCP server...")
@@ -20,8 +23,8 @@ def test_extension_data_flow():
         }
     }
     
-    response = requests.post(server_url, json=session_data)
-    print(f"✅ Session start sent: {response.status_code}")
+    response = client.post(session_data)
+    print(f"✅ Session start sent: seq {response['seq']}")
     
     # Test 2: Variables data
     variables_data = {
@@ -33,8 +36,8 @@ def test_extension_data_flow():
         }
     }
     
-    response = requests.post(server_url, json=variables_data)
-    print(f"✅ Variables sent: {response.status_code}")
+    response = client.post(variables_data)
+    print(f"✅ Variables sent: seq {response['seq']}")
     
     # Test 3: Console output
     console_data = {
@@ -49,8 +52,8 @@ def test_extension_data_flow():
         }
     }
     
-    response = requests.post(server_url, json=console_data)
-    print(f"✅ Console output sent: {response.status_code}")
+    response = client.post(console_data)
+    print(f"✅ Console output sent: seq {response['seq']}")
     
     # Test 4: Stack trace
     stack_data = {
@@ -70,8 +73,8 @@ def test_extension_data_flow():
         ]
     }
     
-    response = requests.post(server_url, json=stack_data)
-    print(f"✅ Stack trace sent: {response.status_code}")
+    response = client.post(stack_data)
+    print(f"✅ Stack trace sent: seq {response['seq']}")
     
     # Test 5: Breakpoints
     breakpoint_data = {
@@ -86,13 +89,13 @@ def test_extension_data_flow():
         ]
     }
     
-    response = requests.post(server_url, json=breakpoint_data)
-    print(f"✅ Breakpoints sent: {response.status_code}")
+    response = client.post(breakpoint_data)
+    print(f"✅ Breakpoints sent: seq {response['seq']}")
     
     # Check final state
     print("\n📊 Final debug data state:")
-    response = requests.get(server_url)
-    data = response.json()
+    data = client.query()
+    client.close()
     
     print(f"Variables: {len(data.get('variables', {})) if data.get('variables') else 0} items")
     print(f"Stack frames: {len(data.get('stack', [])) if data.get('stack') else 0} items")
@@ -0,0 +1,42 @@
+from frames import StackTable
+
+
+def _frame(frame_id, name, line):
+    return {"id": frame_id, "name": name, "line": line, "column": 1,
+            "source": {"name": "app.py", "path": "/src/app.py"}}
+
+
+def test_rebuild_returns_the_interned_stack():
+    table = StackTable()
+    body = {"stackFrames": [_frame(3, "inner", 30), _frame(2, "middle", 20), _frame(1, "main", 10)],
+            "totalFrames": 3}
+    ref, added = table.intern(body, 400)
+    assert added > 0
+    assert table.rebuild(ref) == body
+
+
+def test_shared_frames_are_stored_once():
+    table = StackTable()
+    outer = [_frame(2, "middle", 20), _frame(1, "main", 10)]
+    first, _ = table.intern([_frame(3, "inner", 30)] + outer, 300)
+    second, added = table.intern([_frame(4, "other", 40)] + outer, 300)
+    assert len(table.frames) == 4
+    # Only the new innermost frame is charged
+    assert added < 300
+    assert table.rebuild(second)[1:] == outer
+    assert table.rebuild(first)[0]["name"] == "inner"
+
+
+def test_non_stack_payloads_are_not_interned():
+    table = StackTable()
+    assert table.intern({"error": "no frames"}, 20) == (None, 0)
+    assert table.intern(["not a frame"], 20) == (None, 0)
+
+
+def test_compact_drops_unreachable_frames():
+    table = StackTable()
+    kept, _ = table.intern([_frame(1, "kept", 1)], 100)
+    table.intern([_frame(2, "dropped", 2)], 100)
+    table.compact([kept])
+    assert len(table.frames) == 1
+    assert table.rebuild(kept) == [_frame(1, "kept", 1)]
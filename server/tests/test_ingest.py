@@ -0,0 +1,53 @@
+import asyncio
+
+import httpx
+
+import main
+
+
+def _post(*requests):
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return [await client.post(url, json=body) for url, body in requests]
+    return asyncio.run(run())
+
+
+def _started(session_id):
+    return {"sessionStarted": {"id": session_id}}
+
+
+def test_ingest_is_accepted_before_it_is_applied(monkeypatch):
+    monkeypatch.setattr(main, "ingest", main.IngestPipeline(main.debug_store))
+    accepted, batch, applied = _post(
+        ("/debug-data", _started("ingest-a")),
+        ("/debug-data/batch", [{"debugEvent": {"sessionId": "ingest-a", "event": "output",
+                                               "body": {"output": "x\n"}}}]),
+        ("/debug-data?wait=true", {"stack": [], "sessionId": "ingest-a"}),
+    )
+    assert accepted.status_code == 202
+    assert accepted.json()["status"] == "accepted"
+    assert batch.status_code == 202
+    assert applied.status_code == 200
+    assert applied.json()["seq"] > accepted.json()["seq"]
+    assert main.debug_store.get_output("ingest-a")["lines"][0]["text"] == "x"
+
+
+def test_full_queue_answers_429(monkeypatch):
+    monkeypatch.setattr(main, "ingest", main.IngestPipeline(main.debug_store, capacity=1))
+    rejected, = _post(("/debug-data/batch", [_started("ingest-b"), _started("ingest-c")]))
+    assert rejected.status_code == 429
+    assert rejected.headers["retry-after"] == "1"
+    assert main.debug_store.get_session("ingest-b") is None
+
+
+def test_malformed_envelope_answers_400(monkeypatch):
+    monkeypatch.setattr(main, "ingest", main.IngestPipeline(main.debug_store))
+    queued, waited = _post(
+        ("/debug-data", {"sessionStarted": "ingest-d"}),
+        ("/debug-data?wait=true", {"stack": 1, "sessionId": "ingest-d"}),
+    )
+    assert queued.status_code == 400
+    assert queued.json()["detail"] == "sessionStarted must be an object"
+    assert waited.status_code == 400
+    assert main.ingest.stats()["queued"] == 0
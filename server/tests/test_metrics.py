@@ -0,0 +1,43 @@
+import asyncio
+
+import httpx
+
+import main
+from metrics import Counter, Histogram, Registry
+
+
+def _get(*urls):
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return [await client.get(url) for url in urls]
+    return asyncio.run(run())
+
+
+def test_histograms_render_cumulative_buckets():
+    registry = Registry()
+    latency = registry.register(Histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0)))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        latency.observe(value, ("/a",))
+    lines = registry.render().splitlines()
+    assert lines[:2] == ["# HELP latency_seconds Latency", "# TYPE latency_seconds histogram"]
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{route="/a",le="1.0"} 3' in lines
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 4' in lines
+    assert 'latency_seconds_count{route="/a"} 4' in lines
+
+
+def test_label_values_are_escaped():
+    registry = Registry()
+    counter = registry.register(Counter("things_total", "Things", ("name",)))
+    counter.inc(('say "hi"\n',), 2)
+    assert 'things_total{name="say \\"hi\\"\\n"} 2' in registry.render()
+
+
+def test_requests_are_labelled_by_route_template():
+    *_, metrics = _get("/health", "/no/such/page", "/metrics")
+    assert metrics.status_code == 200
+    text = metrics.text
+    assert 'debug_http_requests_total{method="GET",route="/health",status="200"}' in text
+    assert 'debug_http_requests_total{method="GET",route="unmatched",status="404"}' in text
+    assert "debug_store_sessions " in text
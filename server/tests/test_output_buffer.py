@@ -0,0 +1,37 @@
+import re
+
+from output_buffer import OutputBuffer
+from store import MemoryStore
+
+
+def test_lines_and_search_across_chunks():
+    buffer = OutputBuffer()
+    buffer.append("one\ntw", 1)
+    buffer.append("o\nthree\n", 2)
+    assert buffer.line_count == 3
+    assert buffer.lines(0, 3) == [(0, 1, "one"), (1, 1, "two"), (2, 2, "three")]
+    assert buffer.search(re.compile("t"), 10) == [(1, 1, "two"), (2, 2, "three")]
+
+
+def test_release_drops_only_evicted_chunks():
+    buffer = OutputBuffer()
+    buffer.append("a\n", 1)
+    end = buffer.append("b\n", 2)[1]
+    buffer.append("c\n", 3)
+    buffer.release(end)
+    assert buffer.text(0, buffer.end) == "c\n"
+    assert buffer.first_line == 2
+    assert buffer.lines(0, 10) == [(2, 3, "c")]
+
+
+def test_retained_events_keep_their_text():
+    store = MemoryStore(max_events_per_session=20)
+    store.apply({"sessionStarted": {"id": "a"}})
+    for i in range(200):
+        store.apply({"debugEvent": {"sessionId": "a", "event": "output",
+                                    "body": {"category": "stdout", "output": f"line {i}\n" * (i % 3 + 1)}}})
+    session = store.get_session("a")
+    retained = "".join(event["data"]["body"]["output"] for event in session.events if event["type"] == "debugEvent")
+    buffer = session.output.buffers["stdout"]
+    assert buffer.text(buffer.start, buffer.end) == retained
+    assert store.get_output("a", tail=1)["lines"][0]["text"] == "line 199"
@@ -0,0 +1,56 @@
+import json
+
+from store import MemoryStore
+
+
+def _store():
+    store = MemoryStore()
+    for session_id in ("a", "b"):
+        store.apply({"sessionStarted": {"id": session_id, "name": f"{session_id}.py"}})
+    for i in range(10):
+        session_id = "ab"[i % 2]
+        store.apply({"debugEvent": {"sessionId": session_id, "event": "output", "body": {"output": f"{i}\n"}}})
+        store.apply({"variables": {"i": i}, "sessionId": session_id})
+    return store
+
+
+def _seqs(response):
+    return sorted(event["seq"] for session in response["sessions"] for event in session["events"])
+
+
+def test_cursor_pages_through_every_event_once():
+    store = _store()
+    seen = []
+    cursor = 0
+    while True:
+        response = store.query(since=cursor, limit=7)
+        seen += _seqs(response)
+        cursor = response["nextCursor"]
+        if not response["hasMore"]:
+            break
+    assert seen == list(range(1, store.last_seq + 1))
+    assert store.query(since=cursor)["sessions"] == []
+
+
+def test_event_types_match_envelope_types_and_dap_names():
+    store = _store()
+    outputs = store.query(event_types={"output"})
+    assert len(_seqs(outputs)) == 10
+    assert all(event["type"] == "debugEvent" for session in outputs["sessions"] for event in session["events"])
+    both = store.query(session_id="a", event_types={"output", "variables"})
+    assert [session["id"] for session in both["sessions"]] == ["a"]
+    assert len(_seqs(both)) == 10
+
+
+def test_fields_project_the_response():
+    store = _store()
+    response = store.query(fields={"sessions"}, session_fields={"id", "name"})
+    assert set(response) >= {"sessions", "nextCursor", "hasMore"}
+    assert "variables" not in response
+    assert response["sessions"] == [{"id": "a", "name": "a.py"}, {"id": "b", "name": "b.py"}]
+
+
+def test_encoded_query_matches_query():
+    store = _store()
+    for options in ({}, {"since": 5, "limit": 3}, {"session_id": "b", "event_types": {"variables"}}):
+        assert json.loads(store.query_json(**options)) == json.loads(json.dumps(store.query(**options)))
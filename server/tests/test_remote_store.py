@@ -0,0 +1,94 @@
+import asyncio
+import socket
+import threading
+
+import pytest
+
+from remote_store import RemoteStore, StoreDaemon
+from store import MemoryStore
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    path = str(tmp_path / "store.sock")
+    store = MemoryStore()
+    daemon = StoreDaemon(store, path)
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    server = asyncio.run_coroutine_threadsafe(asyncio.start_unix_server(daemon._handle, path=path), loop).result()
+    yield path, store
+
+    async def shutdown():
+        server.close()
+        handlers = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in handlers:
+            task.cancel()
+        await asyncio.gather(*handlers, return_exceptions=True)
+
+    asyncio.run_coroutine_threadsafe(shutdown(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+def test_calls_are_served_by_the_daemon_store(daemon):
+    path, store = daemon
+    remote = RemoteStore(path, timeout=5)
+    try:
+        seq = remote.apply({"sessionStarted": {"id": "a"}})
+        remote.apply({"debugEvent": {"sessionId": "a", "event": "output", "body": {"output": "hi\n"}}})
+        assert seq == 1 and remote.session_count == 1
+        assert remote.get_output("a")["lines"][0]["text"] == "hi"
+        assert remote.query(session_id="a", event_types={"output"}) == store.query(session_id="a", event_types={"output"})
+        with pytest.raises(KeyError):
+            remote.get_output("missing")
+    finally:
+        remote.close()
+
+
+def test_listeners_get_the_daemon_events(daemon):
+    path, _ = daemon
+    remote = RemoteStore(path, timeout=5)
+    received = []
+    arrived = threading.Event()
+
+    def listener(session_id, event):
+        received.append((session_id, event["type"], event["seq"]))
+        arrived.set()
+
+    try:
+        remote.add_listener(listener)
+        # The subscription is asynchronous: ingest until the first push arrives
+        for _ in range(50):
+            seq = remote.apply({"sessionStarted": {"id": "b"}})
+            if arrived.wait(0.1):
+                break
+        assert received[0][:2] == ("b", "sessionStarted")
+        assert received[0][2] <= seq
+    finally:
+        remote.close()
+
+
+def test_apply_is_not_resent_once_it_reached_the_daemon(tmp_path):
+    path = str(tmp_path / "drop.sock")
+    server = socket.socket(socket.AF_UNIX)
+    server.bind(path)
+    server.listen()
+    requests = []
+
+    def read_and_hang_up():
+        while True:
+            connection, _ = server.accept()
+            requests.append(connection.recv(65536))
+            connection.close()
+
+    threading.Thread(target=read_and_hang_up, daemon=True).start()
+    remote = RemoteStore(path, timeout=2)
+    try:
+        with pytest.raises(ConnectionError):
+            remote.apply({"sessionStarted": {"id": "c"}})
+        assert len(requests) == 1
+    finally:
+        remote.close()
+        server.close()
@@ -0,0 +1,53 @@
+import store
+from store import MemoryStore
+
+
+def _start(debug_store, session_id):
+    debug_store.apply({"sessionStarted": {"id": session_id}})
+
+
+def _variables(debug_store, session_id, i):
+    return debug_store.apply({"variables": {"i": i}, "sessionId": session_id})
+
+
+def test_sessions_keep_their_newest_events():
+    debug_store = MemoryStore(max_events_per_session=5)
+    _start(debug_store, "a")
+    seqs = [_variables(debug_store, "a", i) for i in range(10)]
+    events = debug_store.query(session_id="a")["sessions"][0]["events"]
+    assert [event["seq"] for event in events] == seqs[-5:]
+    assert debug_store.retention_stats["evictedEvents"] == 6
+
+
+def test_least_recently_used_session_is_evicted():
+    debug_store = MemoryStore(max_sessions=2)
+    _start(debug_store, "a")
+    _start(debug_store, "b")
+    _variables(debug_store, "a", 1)
+    _start(debug_store, "c")
+    assert set(debug_store.session_ids()) == {"a", "c"}
+    assert debug_store.retention_stats["evictedSessions"] == 1
+
+
+def test_terminated_sessions_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(store.time, "monotonic", lambda: now[0])
+    debug_store = MemoryStore(session_ttl=60)
+    _start(debug_store, "done")
+    _start(debug_store, "running")
+    debug_store.apply({"sessionTerminated": {"id": "done"}})
+    now[0] += 61
+    _variables(debug_store, "running", 1)
+    assert debug_store.session_ids() == ["running"]
+    assert debug_store.retention_stats["expiredSessions"] == 1
+
+
+def test_byte_budget_trims_a_lone_session():
+    debug_store = MemoryStore(max_bytes=2000)
+    _start(debug_store, "a")
+    for i in range(100):
+        debug_store.apply({"stack": [{"id": i, "name": "f" * 50, "line": i}], "sessionId": "a"})
+    assert debug_store.total_bytes <= 2000
+    events = debug_store.query(session_id="a")["sessions"][0]["events"]
+    assert 0 < len(events) < 101
+    assert events[-1]["data"][0]["id"] == 99
@@ -0,0 +1,52 @@
+from sampling import Sampler
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _output(text, session_id="a"):
+    return {"debugEvent": {"sessionId": session_id, "event": "output", "body": {"output": text}}}
+
+
+def test_bursts_beyond_the_rate_are_dropped_and_summarized():
+    clock = Clock()
+    sampler = Sampler({"output": 10}, clock=clock)
+    kept = [sampler.filter(_output(f"{i}\n")) for i in range(50)]
+    # The bucket starts with BURST_SECONDS worth of events
+    assert sum(1 for released in kept if released) == 20
+    assert sampler.dropped("a")["events"] == {"output": 30}
+    assert sampler.dropped("a")["outputLines"] == 30
+
+    clock.now = 2.0
+    released = sampler.filter(_output("later\n"))
+    summary, event = released
+    assert summary["debugEvent"]["sampled"]["droppedEvents"] == 30
+    assert summary["debugEvent"]["body"]["output"].startswith("20\n21\n")
+    assert event == _output("later\n")
+
+
+def test_lifecycle_events_are_never_dropped():
+    sampler = Sampler({"default": 1}, clock=Clock())
+    for _ in range(10):
+        assert sampler.filter({"debugEvent": {"sessionId": "a", "event": "stopped"}})
+    assert sampler.filter({"sessionTerminated": {"id": "a"}}) == [{"sessionTerminated": {"id": "a"}}]
+
+
+def test_rate_shrinks_with_load():
+    sampler = Sampler({"output": 10}, load=lambda: 1.0, clock=Clock())
+    kept = sum(1 for i in range(50) if sampler.filter(_output(f"{i}\n")))
+    # MIN_RATE_FACTOR of the rate, two seconds' worth
+    assert kept == 2
+
+
+def test_workers_share_the_rate():
+    clock = Clock()
+    sampler = Sampler({"default": 10}, clock=clock, workers=2)
+    kept = sum(bool(sampler.filter({"variables": {}, "sessionId": "w"})) for _ in range(100))
+    # A burst of two seconds at half the rate
+    assert kept == 10
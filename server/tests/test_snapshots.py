@@ -0,0 +1,33 @@
+from snapshots import VariableHistory
+
+
+def _snapshot(i):
+    return {"locals": {"i": i, "name": "loop", "items": list(range(3))}}
+
+
+def test_snapshots_rebuild_from_keyframes_and_deltas():
+    history = VariableHistory(keyframe_interval=4)
+    for seq in range(1, 11):
+        history.record(seq, _snapshot(seq))
+    assert [keyframe for keyframe, _ in history.entries] == [True, False, False, False] * 2 + [True, False]
+    for seq in range(1, 11):
+        assert history.snapshot(seq) == _snapshot(seq)
+    assert history.as_of(0) is None
+    assert history.as_of(100) == _snapshot(10)
+
+
+def test_unchanged_values_are_shared():
+    history = VariableHistory()
+    first, _ = history.record(1, _snapshot(1))
+    second, _ = history.record(2, _snapshot(2))
+    assert second["locals"]["items"] is first["locals"]["items"]
+
+
+def test_trim_keeps_what_retained_snapshots_need():
+    history = VariableHistory(keyframe_interval=3)
+    for seq in range(1, 11):
+        history.record(seq, _snapshot(seq))
+    history.trim(8)
+    # Keyframes are at 1, 4, 7 and 10; 8 is rebuilt from 7
+    assert history.seqs[0] == 7
+    assert history.snapshot(8) == _snapshot(8)
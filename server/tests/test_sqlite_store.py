@@ -0,0 +1,96 @@
+import sqlite3
+import threading
+
+from sqlite_store import SQLiteStore
+
+
+def _session(store, session_id):
+    store.apply({"sessionStarted": {"id": session_id, "timestamp": "2024-01-01T00:00:00Z"}})
+    store.apply({"debugEvent": {"sessionId": session_id, "event": "output", "body": {"output": f"{session_id}\n"}}})
+    store.apply({"variables": {"x": session_id}, "sessionId": session_id})
+
+
+def test_sessions_survive_a_restart(tmp_path):
+    path = str(tmp_path / "debug.db")
+    store = SQLiteStore(path)
+    _session(store, "a")
+    store.apply({"sessionTerminated": {"id": "a"}})
+    _session(store, "b")
+    store.flush()
+    store.close()
+
+    store = SQLiteStore(path)
+    try:
+        assert [session["id"] for session in store.list_sessions()] == ["a", "b"]
+        assert store.get_variables("a") == {"x": "a"}
+        assert store.active_session.id == "b"
+        assert store.apply({"stack": [], "sessionId": "b"}) > store.get_session("b").events[-2]["seq"]
+    finally:
+        store.close()
+
+
+def test_evicted_session_is_loaded_back_without_becoming_active(tmp_path):
+    store = SQLiteStore(str(tmp_path / "debug.db"), max_sessions=2)
+    try:
+        for session_id in "abc":
+            _session(store, session_id)
+        assert "a" not in store.sessions
+        # Ingest for an evicted session is dropped rather than read from disk
+        assert store.apply({"stack": [], "sessionId": "a"}) is None
+        assert store.get_output("a")["lines"][0]["text"] == "a"
+        assert store.get_variables("a") == {"x": "a"}
+        assert store.active_session.id == "c"
+    finally:
+        store.close()
+
+
+def test_evicted_session_is_read_without_the_store_lock(tmp_path):
+    store = SQLiteStore(str(tmp_path / "debug.db"), max_sessions=1)
+    try:
+        for session_id in "ab":
+            _session(store, session_id)
+        store.flush()
+        free = []
+        read = store._read
+
+        def take_lock():
+            if store._lock.acquire(timeout=1):
+                store._lock.release()
+                free.append(True)
+            else:
+                free.append(False)
+
+        def spy(sql, params=()):
+            # Ingest in another thread can take the lock meanwhile
+            thread = threading.Thread(target=take_lock)
+            thread.start()
+            thread.join()
+            return read(sql, params)
+
+        store._read = spy
+        assert store.get_output("a")["lines"][0]["text"] == "a"
+        assert free and all(free)
+    finally:
+        store.close()
+
+
+def test_writer_survives_a_failed_batch(tmp_path):
+    store = SQLiteStore(str(tmp_path / "debug.db"))
+    try:
+        _session(store, "a")
+        store.flush()
+        write_batch = store._write_batch
+
+        def failing_write(conn, batch):
+            raise sqlite3.OperationalError("disk I/O error")
+
+        store._write_batch = failing_write
+        store.apply({"stack": [], "sessionId": "a"})
+        store.flush()
+        store._write_batch = write_batch
+        seq = store.apply({"variables": {"x": "later"}, "sessionId": "a"})
+        store.flush()
+        assert store.stats()["writeErrors"] == 1
+        assert store._read("SELECT MAX(seq) FROM events")[0][0] == seq
+    finally:
+        store.close()
@@ -0,0 +1,53 @@
+from store import MemoryStore
+from summary import SessionSummary
+
+
+def _event(session_id, name, body, timestamp):
+    return {"debugEvent": {"sessionId": session_id, "event": name, "body": body, "timestamp": timestamp}}
+
+
+def _frame(line, name="step", path="/src/app.py"):
+    return {"id": line, "name": name, "line": line, "source": {"path": path}}
+
+
+def _run(store):
+    store.apply({"sessionStarted": {"id": "s", "timestamp": "2024-01-01T00:00:00Z"}})
+    for second, line in enumerate([10, 20, 10, 10], start=1):
+        store.apply(_event("s", "stopped", {"reason": "breakpoint"}, f"2024-01-01T00:00:0{second}Z"))
+        store.apply({"stack": {"stackFrames": [_frame(line), _frame(1, "main")]}, "sessionId": "s"})
+    store.apply(_event("s", "stopped", {"reason": "exception", "text": "ValueError"}, "2024-01-01T00:00:05Z"))
+    store.apply(_event("s", "output", {"category": "stderr", "output": "boom\nagain\n"}, "2024-01-01T00:00:06Z"))
+    store.apply(_event("s", "exited", {"exitCode": 3}, "2024-01-01T00:00:07Z"))
+    store.apply({"sessionTerminated": {"id": "s", "timestamp": "2024-01-01T00:00:08Z"}})
+
+
+def test_summary_aggregates_every_event():
+    store = MemoryStore()
+    _run(store)
+    summary = store.get_session_summary("s")
+    assert summary["stops"] == 5
+    assert summary["stopReasons"] == {"breakpoint": 4, "exception": 1}
+    assert summary["exceptions"]["count"] == 1
+    assert summary["exceptions"]["recent"][0]["text"] == "ValueError"
+    assert summary["output"]["byCategory"] == {"stderr": {"bytes": 11, "lines": 2}}
+    assert summary["topLocations"][0] == {"path": "/src/app.py", "line": 10, "name": "step", "hits": 3}
+    assert summary["exitCode"] == 3
+    assert summary["durationSeconds"] == 8.0
+
+
+def test_summary_counts_events_evicted_from_the_log():
+    store = MemoryStore(max_events_per_session=3)
+    _run(store)
+    summary = store.get_session_summary("s")
+    assert summary["retainedEvents"] == 3
+    assert summary["retainedEvents"] + summary["evictedEvents"] == sum(summary["eventCounts"].values())
+    assert summary["stops"] == 5
+    assert summary["exitCode"] == 3
+    assert summary["topLocations"][0]["hits"] == 3
+
+
+def test_state_round_trip():
+    store = MemoryStore()
+    _run(store)
+    summary = store.get_session("s").summary
+    assert SessionSummary.from_state(summary.state()).to_dict() == summary.to_dict()
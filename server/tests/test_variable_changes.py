@@ -0,0 +1,71 @@
+import pytest
+
+from blobs import BlobStore
+from store import MemoryStore
+from variable_changes import VariableChanges, predicate
+
+
+def _variables(total, name="loop"):
+    return {"variables": [{"name": "total", "value": total}, {"name": "label", "value": f"'{name}'"}]}
+
+
+def test_changes_are_indexed_per_path():
+    index = VariableChanges()
+    snapshots = [_variables("1"), _variables("1"), _variables("3"), _variables("3", "done")]
+    previous = None
+    for seq, snapshot in enumerate(snapshots, start=1):
+        index.record(seq, 1700000000.0 + seq, previous, snapshot)
+        previous = snapshot
+    total = index.history("total")
+    assert total["path"] == "variables.total"
+    assert [(change["seq"], change["value"]) for change in total["changes"]] == [(1, "1"), (3, "3")]
+    assert [change["seq"] for change in index.history("variables.label")["changes"]] == [1, 4]
+
+
+def test_removed_paths_are_marked_deleted():
+    index = VariableChanges()
+    index.record(1, 0.0, None, {"a": 1, "b": 2})
+    index.record(2, 0.0, {"a": 1, "b": 2}, {"a": 1})
+    assert index.history("b")["changes"][-1] == {"seq": 2, "time": "1970-01-01T00:00:00.000Z", "value": None,
+                                                 "deleted": True}
+
+
+def test_spilled_and_raw_copies_of_a_value_are_unchanged(tmp_path):
+    blobs = BlobStore(min_bytes=100, directory=str(tmp_path))
+    raw = {"text": "x" * 500, "items": list(range(100))}
+    index = VariableChanges()
+    index.record(1, 0.0, None, raw)
+    index.record(2, 0.0, raw, blobs.spill(raw))
+    assert [change["seq"] for change in index.history("text")["changes"]] == [1]
+    assert index.history("text")["changes"][0]["length"] == 500
+    assert len(index.history("items[0]")["changes"]) == 1
+
+
+def test_operators_report_when_a_condition_starts_to_hold():
+    index = VariableChanges()
+    previous = None
+    for seq, total in enumerate(["5", "-1", "-2", "4", "-3"], start=1):
+        snapshot = _variables(total)
+        index.record(seq, 0.0, previous, snapshot)
+        previous = snapshot
+    assert [change["seq"] for change in index.history("total", op="<", value=0)["changes"]] == [2, 5]
+    limited = index.history("total", op="<", value=0, limit=1)
+    assert limited["truncated"] and len(limited["changes"]) == 1
+    assert predicate("==", "loop")("'loop'")
+    assert predicate("contains", "oo")("'loop'")
+    assert predicate("matches", "^l.*p$")("'loop'")
+    assert predicate("!=", 1)("1.5")
+    with pytest.raises(ValueError):
+        predicate(">", "abc")
+    with pytest.raises(ValueError):
+        predicate("~", 1)
+
+
+def test_store_answers_from_the_index():
+    store = MemoryStore()
+    store.apply({"sessionStarted": {"id": "v"}})
+    for total in ("1", "2", "2"):
+        store.apply({"variables": _variables(total), "sessionId": "v"})
+    history = store.get_variable_history("v", "total")
+    assert history["sessionId"] == "v"
+    assert [change["value"] for change in history["changes"]] == ["1", "2"]
@@ -1,19 +1,222 @@
+import asyncio
+import re
+from functools import partial
+
+from analysis import AnalysisTimeout, analysis_pool, capture, compare_snapshots, diff_variables
 from fastmcp import FastMCP
-from store import debug_data
+from fastmcp.exceptions import ToolError
+from metrics import METRICS_ENABLED, ToolMetrics
+from sampling import sampler
+from store import debug_store
+from variable_view import PathNotFound
 
 mcp = FastMCP("VS Code Debug Tools")
+if METRICS_ENABLED:
+    mcp.add_middleware(ToolMetrics())
+
+def _for_session(getter, session_id, **kwargs):
+    try:
+        return getter(session_id, **kwargs)
+    except KeyError:
+        raise ToolError(f"Unknown debug session: {session_id}")
+
+@mcp.tool
+def list_sessions() -> list:
+    """Lists the debug sessions known to the server, with their event,
+    stop and exception counts"""
+    return debug_store.list_sessions()
 
 @mcp.tool
-def get_variables() -> dict:
-    """Returns the latest debug variables"""
-    return debug_data.get("variables", {})
+def get_session_summary(session_id: str | None = None) -> dict:
+    """Overview of a debug session (the active one by default): event counts by
+    type and DAP event, stop reasons, exceptions, output bytes/lines, duration
+    and the locations it stopped at most. Cheap to call; no events are scanned.
+    `dropped` counts events discarded by ingest rate limiting."""
+    summary = _for_session(debug_store.get_session_summary, session_id)
+    if sampler is not None:
+        summary["dropped"] = sampler.dropped(summary["id"])
+    return summary
 
 @mcp.tool
-def get_stack_trace() -> list:
-    """Returns the current stack trace"""
-    return debug_data.get("stack", [])
+def get_variables(session_id: str | None = None, at_seq: int | None = None) -> dict:
+    """Returns the latest debug variables, or those of the given session.
+    With at_seq, returns the variables as they were at that event sequence number."""
+    return _for_session(debug_store.get_variables, session_id, at_seq=at_seq)
+
+@mcp.tool
+def get_variable(
+    path: str = "",
+    session_id: str | None = None,
+    at_seq: int | None = None,
+    max_depth: int = 3,
+    max_items: int = 50,
+    max_bytes: int = 16384
+) -> dict:
+    """Returns one variable (or scope) by path, e.g. `locals.df.columns[3]`, size-bounded.
+
+    Nesting below max_depth, items past max_items per container and content
+    beyond roughly max_bytes are replaced by `__truncated__` markers that say
+    how much was left out; request a longer path to drill into them. An empty
+    path renders the whole scope under the same limits.
+    """
+    try:
+        return _for_session(
+            debug_store.inspect_variables, session_id, path=path, at_seq=at_seq,
+            max_depth=max_depth, max_items=max_items, max_bytes=max_bytes
+        )
+    except PathNotFound as e:
+        raise ToolError(f"No variable at path: {e}")
+    except ValueError as e:
+        raise ToolError(str(e))
 
 @mcp.tool
-def get_breakpoints() -> list:
-    """Returns the current breakpoints"""
-    return debug_data.get("breakpoints", [])
+def get_variable_history(
+    path: str,
+    session_id: str | None = None,
+    op: str | None = None,
+    value: str | None = None,
+    max_results: int = 100
+) -> dict:
+    """Returns when a variable changed: the event seq, time and new value of each
+    change, oldest first, read from an index built on ingest.
+
+    `path` is a variable path as for get_variable; a trailing part such as
+    `total` is enough when it is unambiguous. With `op` (==, !=, <, <=, >, >=,
+    contains, matches) and `value`, only the changes after which the condition
+    started to hold are returned, e.g. path="total", op="<", value="0" for when
+    total went negative; max_results=1 gives the first. Use the seq with
+    get_variables(at_seq=...) to see the whole scope at that point.
+    """
+    try:
+        return _for_session(
+            debug_store.get_variable_history, session_id, path=path, op=op, value=value, limit=max_results
+        )
+    except PathNotFound as e:
+        raise ToolError(f"No recorded changes for variable: {e}")
+    except (ValueError, re.error) as e:
+        raise ToolError(str(e))
+
+@mcp.tool
+def get_stack_trace(session_id: str | None = None) -> list:
+    """Returns the current stack trace, or that of the given session"""
+    return _for_session(debug_store.get_stack, session_id)
+
+@mcp.tool
+def get_breakpoints(session_id: str | None = None) -> list:
+    """Returns the current breakpoints, or those of the given session"""
+    return _for_session(debug_store.get_breakpoints, session_id)
+
+@mcp.tool
+def get_console_output(
+    session_id: str | None = None,
+    category: str | None = None,
+    tail: int | None = None,
+    start_line: int | None = None,
+    end_line: int | None = None,
+    pattern: str | None = None,
+    ignore_case: bool = False,
+    max_results: int = 200
+) -> dict:
+    """Returns a session's console output (the active session by default).
+
+    By default the last `tail` lines (50). Pass start_line/end_line for a range
+    of line numbers, or `pattern` for a regex search. `category` limits to
+    stdout, stderr, console, ...; otherwise categories are interleaved in print
+    order. At most max_results lines are returned; `truncated` says if more exist.
+    """
+    try:
+        return _for_session(
+            debug_store.get_output, session_id, category=category, tail=tail,
+            start_line=start_line, end_line=end_line, pattern=pattern,
+            ignore_case=ignore_case, max_results=max_results
+        )
+    except re.error as e:
+        raise ToolError(f"Invalid pattern: {e}")
+
+@mcp.tool
+def get_events_in_window(
+    start: str | None = None,
+    end: str | None = None,
+    session_id: str | None = None,
+    seconds_before_termination: float | None = None,
+    event_types: list[str] | None = None,
+    max_results: int = 200
+) -> dict:
+    """Returns debug events whose timestamps fall between start and end, in time order.
+
+    start/end are ISO 8601 timestamps (e.g. 2025-01-01T12:01:03Z) or epoch
+    seconds; either may be omitted. All sessions are searched unless
+    session_id is given. seconds_before_termination=N instead returns the last
+    N seconds before the session (by default the most recently terminated one)
+    ended. event_types filters by envelope type or DAP event name (output,
+    stopped, ...). `truncated` says if more than max_results events matched.
+    """
+    try:
+        return debug_store.events_between(
+            start=start, end=end, session_id=session_id, event_types=set(event_types or ()) or None,
+            limit=max_results, before_termination=seconds_before_termination
+        )
+    except KeyError:
+        raise ToolError(f"Unknown debug session: {session_id}")
+    except ValueError as e:
+        raise ToolError(str(e))
+
+@mcp.tool
+async def compare_sessions(
+    session_a: str,
+    session_b: str,
+    at_seq_a: int | None = None,
+    at_seq_b: int | None = None,
+    max_differences: int = 200
+) -> dict:
+    """Compares two debug sessions (e.g. a passing and a failing run): summary
+    metrics side by side, variable differences by path (as of at_seq_a /
+    at_seq_b, else the latest), where the current stacks diverge and
+    breakpoints set in only one of them.
+
+    Runs in a worker pool with a time limit; results are cached until either
+    session changes.
+    """
+    try:
+        # Store reads may hit the disk (or the store daemon); keep them off the loop
+        a = await asyncio.to_thread(_for_session, partial(capture, debug_store), session_a, at_seq=at_seq_a)
+        b = await asyncio.to_thread(_for_session, partial(capture, debug_store), session_b, at_seq=at_seq_b)
+    except ValueError as e:
+        raise ToolError(str(e))
+    key = ("compare_sessions", a["sessionId"], a["version"], at_seq_a, b["sessionId"], b["version"], at_seq_b,
+           max_differences)
+    try:
+        return await analysis_pool.run(key, compare_snapshots, a, b, max_differences)
+    except AnalysisTimeout as e:
+        raise ToolError(str(e))
+
+def _snapshots(session_id, from_seq, to_seq):
+    summary = _for_session(debug_store.get_session_summary, session_id)
+    before = debug_store.get_variables(summary["id"], at_seq=from_seq)
+    after = debug_store.get_variables(summary["id"], at_seq=to_seq)
+    return summary, before, after
+
+@mcp.tool
+async def diff_snapshots(
+    from_seq: int,
+    to_seq: int | None = None,
+    session_id: str | None = None,
+    max_differences: int = 200
+) -> dict:
+    """Variables that changed, appeared or disappeared between two events of a
+    session (the active one by default): as of from_seq versus as of to_seq
+    (default: the latest). Paths are as for get_variable.
+
+    Runs in a worker pool with a time limit; results are cached until the
+    session changes.
+    """
+    try:
+        summary, before, after = await asyncio.to_thread(_snapshots, session_id, from_seq, to_seq)
+    except ValueError as e:
+        raise ToolError(str(e))
+    key = ("diff_snapshots", summary["id"], summary["version"], from_seq, to_seq, max_differences)
+    try:
+        result = await analysis_pool.run(key, diff_variables, before, after, max_differences)
+    except AnalysisTimeout as e:
+        raise ToolError(str(e))
+    return {"sessionId": summary["id"], "fromSeq": from_seq, "toSeq": to_seq, **result}
@@ -0,0 +1,307 @@
+# Per-variable change index
+# Answers "when did `total` change / go negative?" without rebuilding and
+# diffing snapshots. Each new `variables` snapshot is compared with the
+# previous one (unchanged subtrees are shared objects, so the comparison
+# skips them) and every changed leaf path gets a (seq, time, value) entry.
+# Paths are named like variable_view paths: list items that are DAP variables
+# are addressed by name (`variables.total`) and stand for their `value`.
+import json
+import os
+import re
+
+from blobs import TEXT, BlobRef, same_value
+from event_log import format_timestamp
+from variable_view import PathNotFound, parse_path
+
+# Distinct variable paths indexed per session; changes to further paths are
+# only counted
+MAX_TRACKED_PATHS = int(os.environ.get("MCP_DEBUG_MAX_VARIABLE_PATHS", 10000))
+# Longer string values are indexed as a prefix of this many characters
+MAX_VALUE_CHARS = 256
+# Entries from before the oldest retained event are dropped once the index
+# has doubled in size since the last sweep, and never below this many
+TRIM_MIN_ENTRIES = 4096
+
+OPERATORS = ("==", "!=", "<", "<=", ">", ">=", "contains", "matches")
+
+_DELETED = object()
+_MISSING = object()
+_PLAIN_KEY = re.compile(r"[^.\[\]\s\"']+")
+
+
+def render_path(path):
+    """The path string for a tuple of keys and list indexes."""
+    parts = []
+    for key in path:
+        if isinstance(key, int):
+            parts.append(f"[{key}]")
+        elif _PLAIN_KEY.fullmatch(key):
+            parts.append(f".{key}" if parts else key)
+        else:
+            parts.append(f"['{key}']" if '"' in key else f"[{json.dumps(key)}]")
+    return "".join(parts)
+
+
+def _is_variable(value):
+    return isinstance(value, dict) and isinstance(value.get("name"), str) and "value" in value
+
+
+def _items(value):
+    """(key, child) pairs of a container; list items named like DAP variables
+    are keyed by their first occurrence's name, others by index."""
+    if isinstance(value, dict):
+        return value.items()
+    seen = set()
+    items = []
+    for index, item in enumerate(value):
+        name = item.get("name") if isinstance(item, dict) else None
+        if isinstance(name, str) and name not in seen:
+            seen.add(name)
+            items.append((name, item))
+        else:
+            items.append((index, item))
+    return items
+
+
+def _name(value):
+    return value.get("name") if isinstance(value, dict) else None
+
+
+def _key_at(items, index):
+    """The key `_items` gives list item `index`."""
+    name = _name(items[index])
+    if isinstance(name, str) and not any(_name(item) == name for item in items[:index]):
+        return name
+    return index
+
+
+def _is_leaf(value):
+    return _is_variable(value) or not isinstance(value, (dict, list)) or not value
+
+
+def _leaf_value(value):
+    return value["value"] if _is_variable(value) else value
+
+
+def leaves(value, path=()):
+    """(path, value) of every leaf of a snapshot, named as in the index."""
+    if _is_leaf(value):
+        yield path, _leaf_value(value)
+        return
+    for key, child in _items(value):
+        yield from leaves(child, path + (key,))
+
+
+def changes(old, new, path=()):
+    """(path, value) for every leaf that differs between two snapshots, with
+    value _DELETED for removed leaves. `old`/`new` may be _MISSING."""
+    if old is new:
+        return
+    if new is _MISSING:
+        for leaf, _ in leaves(old, path):
+            yield leaf, _DELETED
+        return
+    if old is _MISSING:
+        yield from leaves(new, path)
+        return
+    if _is_leaf(old) or _is_leaf(new) or type(old) is not type(new):
+        if (isinstance(old, BlobRef) or isinstance(new, BlobRef)) and same_value(old, new):
+            # A spilled collection and the same content in memory
+            return
+        if _is_leaf(old) and _is_leaf(new):
+            old_value, new_value = _leaf_value(old), _leaf_value(new)
+            if not _unchanged(old_value, new_value):
+                yield path, new_value
+            return
+        # A container became a leaf or the other way round
+        new_leaves = dict(leaves(new, path))
+        for leaf, _ in leaves(old, path):
+            if leaf not in new_leaves:
+                yield leaf, _DELETED
+        yield from new_leaves.items()
+        return
+    if isinstance(old, list) and len(old) == len(new):
+        # Usually a few items changed in place: pair them by position
+        changed = [index for index, (a, b) in enumerate(zip(old, new)) if a is not b]
+        if all(_name(old[index]) == _name(new[index]) for index in changed):
+            keys = [key for key, _ in _items(new)] if len(changed) > 8 else None
+            for index in changed:
+                key = keys[index] if keys is not None else _key_at(new, index)
+                yield from changes(old[index], new[index], path + (key,))
+            return
+    old_items = old if isinstance(old, dict) else dict(_items(old))
+    new_keys = set()
+    for key, child in _items(new):
+        new_keys.add(key)
+        old_child = old_items.get(key, _MISSING)
+        if old_child is not child:
+            yield from changes(old_child, child, path + (key,))
+    for key, child in old_items.items():
+        if key not in new_keys:
+            yield from changes(child, _MISSING, path + (key,))
+
+
+def _unchanged(old, new):
+    if isinstance(old, BlobRef) or isinstance(new, BlobRef):
+        # Compared by content, spilled or not
+        return same_value(old, new)
+    return old == new and type(old) is type(new)
+
+
+def _stored(value):
+    """(value, original length when cut short or 0). Spilled values are
+    indexed by their preview, like a long string."""
+    if isinstance(value, BlobRef):
+        return value.preview[:MAX_VALUE_CHARS], value.length if value.kind == TEXT else value.size
+    if isinstance(value, str) and len(value) > MAX_VALUE_CHARS:
+        return value[:MAX_VALUE_CHARS], len(value)
+    return value, 0
+
+
+def _number(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        try:
+            return float(value.strip())
+        except ValueError:
+            return None
+    return None
+
+
+def _text(value):
+    if isinstance(value, str):
+        # Debug adapters render string values quoted: 'abc' or "abc"
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in "'\"":
+            return value[1:-1]
+        return value
+    return json.dumps(value)
+
+
+def predicate(op, target):
+    """A function of a stored value for `value <op> target`. Numeric
+    operators compare values that parse as numbers; text operators compare
+    strings with the adapter's quotes removed."""
+    if op not in OPERATORS:
+        raise ValueError(f"Unknown operator {op!r}; use one of {', '.join(OPERATORS)}")
+    if op == "matches":
+        regex = re.compile(str(target))
+        return lambda value: regex.search(_text(value)) is not None
+    if op == "contains":
+        text = _text(target)
+        return lambda value: text in _text(value)
+    number = _number(target)
+    text = _text(target)
+    if op in ("==", "!="):
+        def equal(value):
+            value_number = _number(value)
+            if number is not None and value_number is not None:
+                return value_number == number
+            return _text(value) == text
+        return equal if op == "==" else (lambda value: not equal(value))
+    if number is None:
+        raise ValueError(f"Operator {op} needs a numeric value, got {target!r}")
+    compare = {
+        "<": lambda a: a < number, "<=": lambda a: a <= number,
+        ">": lambda a: a > number, ">=": lambda a: a >= number
+    }[op]
+    return lambda value: _number(value) is not None and compare(_number(value))
+
+
+class VariableChanges:
+    """Per-session index of variable paths to the events that changed them."""
+
+    def __init__(self, max_paths=MAX_TRACKED_PATHS):
+        self.max_paths = max_paths
+        self.paths = {}                 # path string -> [(seq, time, value, cut length)]
+        self.untracked_changes = 0
+        self._entries = 0
+        self._trim_at = TRIM_MIN_ENTRIES
+
+    def record(self, seq, timestamp, old, new):
+        """Index the changes from snapshot `old` (None before the first one)
+        to `new`, made by event `seq` at epoch `timestamp`."""
+        for path, value in changes(_MISSING if old is None else old, new):
+            key = render_path(path)
+            entries = self.paths.get(key)
+            if entries is None:
+                if value is _DELETED:
+                    continue
+                if self.max_paths and len(self.paths) >= self.max_paths:
+                    self.untracked_changes += 1
+                    continue
+                entries = self.paths[key] = []
+            if value is _DELETED:
+                entries.append((seq, timestamp, _DELETED, 0))
+            else:
+                entries.append((seq, timestamp) + _stored(value))
+            self._entries += 1
+
+    def trim(self, min_seq):
+        """Drop entries older than `min_seq`, keeping each path's last value
+        before it. Only sweeps once the index has doubled since the last sweep."""
+        if self._entries < self._trim_at:
+            return
+        total = 0
+        for key, entries in list(self.paths.items()):
+            first = 0
+            while first + 1 < len(entries) and entries[first + 1][0] <= min_seq:
+                first += 1
+            if first:
+                del entries[:first]
+            if len(entries) == 1 and entries[0][2] is _DELETED and entries[0][0] <= min_seq:
+                del self.paths[key]
+                continue
+            total += len(entries)
+        self._entries = total
+        self._trim_at = max(TRIM_MIN_ENTRIES, 2 * total)
+
+    def resolve(self, path):
+        """The indexed path `path` refers to: an exact match, or the only
+        indexed path ending with it (`total` for `variables.total`)."""
+        wanted = render_path(tuple(parse_path(path)))
+        if not wanted:
+            raise ValueError("A variable path is required")
+        if wanted in self.paths:
+            return wanted
+        suffix = wanted if wanted.startswith("[") else "." + wanted
+        candidates = [key for key in self.paths if key.endswith(suffix)]
+        if len(candidates) == 1:
+            return candidates[0]
+        if candidates:
+            shown = ", ".join(sorted(candidates)[:10])
+            raise ValueError(f"Ambiguous variable path {path!r}: matches {shown}")
+        raise PathNotFound(path)
+
+    def history(self, path, op=None, value=None, limit=None):
+        """Changes of the variable at `path`, oldest first. With `op`, only
+        the changes after which `value <op> target` started to hold."""
+        key = self.resolve(path)
+        entries = self.paths[key]
+        test = predicate(op, value) if op is not None else None
+        selected = []
+        held = False
+        truncated = False
+        for seq, timestamp, stored, length in entries:
+            if test is not None:
+                holds = stored is not _DELETED and test(stored)
+                became_true = holds and not held
+                held = holds
+                if not became_true:
+                    continue
+            if limit is not None and len(selected) >= limit:
+                truncated = True
+                break
+            change = {
+                "seq": seq,
+                "time": format_timestamp(timestamp) if timestamp == timestamp else None,
+                "value": None if stored is _DELETED else stored
+            }
+            if stored is _DELETED:
+                change["deleted"] = True
+            if length:
+                change["length"] = length
+            selected.append(change)
+        return {"path": key, "changes": selected, "truncated": truncated}
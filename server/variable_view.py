@@ -0,0 +1,152 @@
+# Size-bounded, path-addressable views of variable snapshots
+# Agents ask for `locals.df.columns[3]` instead of the whole scope, and get a
+# rendering capped by depth, items per container and an approximate byte
+# budget, with markers saying how much was left out.
+import json
+import re
+
+from blobs import JSON, BlobRef, blob_store
+
+DEFAULT_MAX_DEPTH = 3
+DEFAULT_MAX_ITEMS = 50
+DEFAULT_MAX_BYTES = 16 * 1024
+MAX_STRING_CHARS = 1024
+
+TRUNCATED = "__truncated__"
+
+
+class PathNotFound(LookupError):
+    """No value exists at the requested variable path."""
+
+
+_TOKEN = re.compile(r"""\[(\d+)\]|\[(["'])(.*?)\2\]|\.?([^.\[\]]+)""")
+
+
+def parse_path(path):
+    """Split `locals.df.columns[3]` / `a["b.c"][0]` into keys and indexes."""
+    keys = []
+    position = 0
+    path = (path or "").strip()
+    while position < len(path):
+        match = _TOKEN.match(path, position)
+        if not match or match.end() == position:
+            raise ValueError(f"Invalid variable path: {path!r}")
+        index, _, quoted, name = match.groups()
+        keys.append(int(index) if index is not None else quoted if quoted is not None else name)
+        position = match.end()
+    return keys
+
+
+def resolve(root, path):
+    """The value at `path` inside `root`.
+
+    String keys also select list items by their `name` field, so DAP-shaped
+    payloads (`{"variables": [{"name": "x", ...}]}`) can be addressed as
+    `variables.x`. Raises PathNotFound naming the first missing segment.
+    """
+    value = root
+    walked = []
+    for key in parse_path(path):
+        walked.append(str(key))
+        value = _loaded(value)
+        if isinstance(value, dict) and key in value:
+            value = value[key]
+        elif isinstance(value, dict) and isinstance(key, int) and str(key) in value:
+            value = value[str(key)]
+        elif isinstance(value, list) and isinstance(key, int) and -len(value) <= key < len(value):
+            value = value[key]
+        elif isinstance(value, list) and isinstance(key, str):
+            named = [item for item in value if isinstance(item, dict) and item.get("name") == key]
+            if not named:
+                raise PathNotFound(".".join(walked))
+            value = named[0]
+        else:
+            raise PathNotFound(".".join(walked))
+    return _loaded(value)
+
+
+def _loaded(value):
+    """Spilled collections are read back whole; spilled strings stay
+    references so only the part shown is read."""
+    return blob_store.load(value) if isinstance(value, BlobRef) and value.kind == JSON else value
+
+
+class _Budget:
+    def __init__(self, max_bytes):
+        self.remaining = max_bytes if max_bytes else float("inf")
+        self.truncated = False
+
+    def take(self, size):
+        self.remaining -= size
+
+
+def _marker(reason, **details):
+    return {TRUNCATED: reason, **details}
+
+
+def _container_summary(value):
+    return {"type": type(value).__name__, "length": len(value)}
+
+
+def _bound(value, depth, max_depth, max_items, budget):
+    value = _loaded(value)
+    if isinstance(value, (dict, list)):
+        if max_depth is not None and depth >= max_depth and value:
+            budget.truncated = True
+            budget.take(48)
+            return _marker("depth", **_container_summary(value))
+        budget.take(2)
+        items = value.items() if isinstance(value, dict) else enumerate(value)
+        total = len(value)
+        shown = []
+        for count, (key, item) in enumerate(items):
+            if (max_items is not None and count >= max_items) or budget.remaining <= 0:
+                budget.truncated = True
+                break
+            if isinstance(value, dict):
+                budget.take(len(json.dumps(str(key))) + 2)
+            shown.append((key, _bound(item, depth + 1, max_depth, max_items, budget)))
+        omitted = total - len(shown)
+        if isinstance(value, dict):
+            result = dict(shown)
+            if omitted:
+                result[TRUNCATED] = {"reason": "items", "omitted": omitted, "length": total}
+        else:
+            result = [item for _, item in shown]
+            if omitted:
+                result.append(_marker("items", omitted=omitted, length=total))
+        return result
+
+    if isinstance(value, (str, BlobRef)):
+        limit = MAX_STRING_CHARS
+        if budget.remaining != float("inf"):
+            limit = min(limit, max(int(budget.remaining) - 2, 16))
+        length = value.length if isinstance(value, BlobRef) else len(value)
+        if length > limit:
+            budget.truncated = True
+            budget.take(limit + 32)
+            shown = blob_store.text(value, limit) if isinstance(value, BlobRef) else value[:limit]
+            return shown + f"... <{length - limit} more chars>"
+        if isinstance(value, BlobRef):
+            value = blob_store.text(value)
+    budget.take(len(json.dumps(value, default=str)) + 1)
+    return value
+
+
+def bounded_view(root, path="", max_depth=DEFAULT_MAX_DEPTH, max_items=DEFAULT_MAX_ITEMS,
+                 max_bytes=DEFAULT_MAX_BYTES):
+    """Render the value at `path`, capped by depth, items per container and bytes.
+
+    Containers cut short carry a `__truncated__` entry: in dicts a
+    `{"reason", "omitted", "length"}` value, in lists a trailing marker item,
+    and containers below `max_depth` are replaced by a marker with their type
+    and length. Long strings end in `... <N more chars>`. Drill into elided
+    parts with a longer `path`.
+    """
+    value = resolve(root, path)
+    budget = _Budget(max_bytes)
+    rendered = _bound(value, 0, max_depth, max_items, budget)
+    result = {"path": path or "", "value": rendered, "truncated": budget.truncated}
+    if isinstance(value, (dict, list)):
+        result.update(_container_summary(value))
+    return result